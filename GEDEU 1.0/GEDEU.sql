@@ -74,11 +74,46 @@ CREATE TABLE Documento (
     tipo_documento VARCHAR(50) NOT NULL,
     numero_documento VARCHAR(50) UNIQUE NOT NULL,
     arquivo_nome VARCHAR(255) NOT NULL, -- Nome original do arquivo
-    arquivo_conteudo BYTEA NOT NULL, -- Conteúdo do PDF armazenado como BLOB
+    arquivo_conteudo BYTEA, -- Conteúdo do PDF como BLOB (NULL quando o arquivo está em disco)
     arquivo_tamanho INTEGER, -- Tamanho do arquivo em bytes
-    data_upload TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- Data de upload
+    data_upload TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- Data de upload
+    arquivo_hash CHAR(64), -- SHA-256 do conteúdo (usado como ETag e como nome do arquivo em disco)
+    CHECK (arquivo_conteudo IS NOT NULL OR arquivo_hash IS NOT NULL)
 );
 
+-- PDFs já são comprimidos: guardar sem compressão permite ler fatias com substring()
+ALTER TABLE Documento ALTER COLUMN arquivo_conteudo SET STORAGE EXTERNAL;
+
+-- Arquivos de documentos armazenados em disco, endereçados pelo SHA-256.
+-- referencias conta quantos documentos apontam para cada arquivo;
+-- arquivos com zero referências são removidos por "flask gc-documents".
+CREATE TABLE Arquivo (
+    arquivo_hash CHAR(64) PRIMARY KEY,
+    arquivo_tamanho BIGINT NOT NULL,
+    referencias INTEGER NOT NULL DEFAULT 0
+);
+
+-- Um documento está em disco quando arquivo_conteudo é NULL e arquivo_hash está preenchido
+CREATE OR REPLACE FUNCTION documento_contar_referencias()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.arquivo_conteudo IS NULL AND OLD.arquivo_hash IS NOT NULL THEN
+        UPDATE Arquivo SET referencias = referencias - 1
+        WHERE arquivo_hash = OLD.arquivo_hash;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.arquivo_conteudo IS NULL AND NEW.arquivo_hash IS NOT NULL THEN
+        INSERT INTO Arquivo (arquivo_hash, arquivo_tamanho, referencias)
+        VALUES (NEW.arquivo_hash, COALESCE(NEW.arquivo_tamanho, 0), 1)
+        ON CONFLICT (arquivo_hash) DO UPDATE SET referencias = Arquivo.referencias + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER documento_referencias
+AFTER INSERT OR DELETE OR UPDATE OF arquivo_hash, arquivo_conteudo ON Documento
+FOR EACH ROW EXECUTE FUNCTION documento_contar_referencias();
+
 CREATE TABLE Atleta (
     id_atleta SERIAL PRIMARY KEY,
     nome_atleta VARCHAR(100) NOT NULL,
@@ -136,3 +171,30 @@ CREATE TABLE Presenca_Treinamento (
     FOREIGN KEY (cod_treinamento) REFERENCES Treinamento(cod_treinamento),
     FOREIGN KEY (id_atleta) REFERENCES Atleta(id_atleta)
 );
+
+-- Índices para os relatórios de presença por período (relatorio_presenca_equipe):
+-- treinamentos/partidas do período pela data, depois as presenças de cada um
+CREATE INDEX IF NOT EXISTS treinamento_data ON Treinamento (data_treinamento, cod_treinamento);
+CREATE INDEX IF NOT EXISTS partida_data ON Partida (data_partida, cod_partida);
+CREATE INDEX IF NOT EXISTS presenca_partida_partida ON Presenca_Partida (cod_partida, id_atleta) INCLUDE (presenca);
+CREATE INDEX IF NOT EXISTS presenca_treinamento_atleta ON Presenca_Treinamento (id_atleta, cod_treinamento) INCLUDE (presenca);
+CREATE INDEX IF NOT EXISTS atleta_equipe ON Atleta (cod_equipe, id_atleta);
+
+-- Índices das chaves estrangeiras: verificações de FK ao excluir, filtros e JOINs
+-- (Atleta.cod_equipe, Presenca_*.id_atleta/cod_partida e as chaves primárias
+-- compostas já cobrem o restante)
+CREATE INDEX IF NOT EXISTS evento_local ON Evento (cod_local);
+CREATE INDEX IF NOT EXISTS campeonato_modalidade ON Campeonato (cod_modalidade);
+CREATE INDEX IF NOT EXISTS campeonato_evento ON Campeonato (cod_evento);
+CREATE INDEX IF NOT EXISTS participacao_campeonato_campeonato ON Participacao_Campeonato (cod_campeonato, cod_equipe);
+CREATE INDEX IF NOT EXISTS partida_equipe_a ON Partida (cod_equipe_a);
+CREATE INDEX IF NOT EXISTS partida_equipe_b ON Partida (cod_equipe_b);
+CREATE INDEX IF NOT EXISTS partida_modalidade ON Partida (cod_modalidade);
+CREATE INDEX IF NOT EXISTS partida_local ON Partida (cod_local);
+CREATE INDEX IF NOT EXISTS partida_evento ON Partida (cod_evento);
+CREATE INDEX IF NOT EXISTS atleta_documento ON Atleta (cod_documento);
+CREATE INDEX IF NOT EXISTS treinador_equipe ON Treinador (cod_equipe, id_treinador);
+CREATE INDEX IF NOT EXISTS treinador_documento ON Treinador (cod_documento);
+CREATE INDEX IF NOT EXISTS treinamento_treinador ON Treinamento (id_treinador);
+CREATE INDEX IF NOT EXISTS treinamento_local ON Treinamento (cod_local);
+CREATE INDEX IF NOT EXISTS documento_no_banco ON Documento (cod_documento) WHERE arquivo_conteudo IS NOT NULL;
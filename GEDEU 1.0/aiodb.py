@@ -0,0 +1,256 @@
+"""Consultas independentes ao PostgreSQL executadas ao mesmo tempo (asyncio).
+
+Usa o modo assíncrono do próprio psycopg2 (``connect(async_=True)``): o
+loop de eventos aguarda cada conexão com add_reader/add_writer, sem uma
+thread por consulta. As conexões ficam em um pool próprio, separado do
+pool síncrono das rotas (database.py); conexões assíncronas estão sempre
+em autocommit, então servem apenas para leituras.
+
+Uma rota síncrona passa as consultas que não dependem umas das outras e
+recebe os resultados na mesma ordem::
+
+    atletas, equipes = aiodb.run(
+        ("SELECT id_atleta, nome_atleta FROM Atleta WHERE cod_equipe = %s", (cod_equipe,)),
+        ("SELECT cod_equipe, nome_equipe FROM Equipe WHERE cod_equipe = %s", (cod_equipe,)),
+    )
+
+Com DB_ASYNC_QUERIES = False, as mesmas consultas rodam uma após a outra
+na conexão da requisição. As consultas podem ser comandos registrados com
+database.prepared(), preparados uma vez em cada conexão assíncrona.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from flask import current_app
+
+import metrics
+from database import DB_CONFIG, PoolTimeout, PreparedStatement, execute, get_db, prepared_names, use_prepared
+
+ASYNC_POOL_DEFAULTS = {
+    'DB_ASYNC_QUERIES': True,         # consultas independentes ao mesmo tempo
+    'DB_ASYNC_POOL_MAXCONN': 10,      # conexões assíncronas por processo
+    'DB_ASYNC_POOL_TIMEOUT': 10.0,    # segundos esperando uma conexão livre
+}
+
+
+async def wait(conn):
+    """Aguarda a conexão concluir a operação em andamento (conexão, consulta)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        future = loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        fd = conn.fileno()
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, ready)
+            remove = loop.remove_reader
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, ready)
+            remove = loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"Estado inesperado da conexão: {state}")
+        try:
+            await future
+        finally:
+            remove(fd)
+
+
+class AsyncConnectionPool:
+    """Pool limitado de conexões psycopg2 assíncronas.
+
+    Não depende de um loop específico: cada rota roda suas consultas em um
+    loop próprio (asyncio.run), e a mesma conexão pode ser usada por loops
+    diferentes, um de cada vez.
+    """
+
+    def __init__(self, maxconn, timeout=10.0, **connect_kwargs):
+        if maxconn < 1:
+            raise ValueError("Limite do pool inválido")
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+        self._lock = threading.Lock()
+        self._idle = []
+        self._total = 0
+        self._checked_out = 0
+        self._created = 0
+        self._timeouts = 0
+        self._closed_pool = False
+
+    async def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                if self._closed_pool:
+                    raise PoolError("Pool de conexões fechado")
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._checked_out += 1
+                    if not conn.closed:
+                        return conn
+                    self._total -= 1
+                    self._checked_out -= 1
+                    continue
+                if self._total < self.maxconn:
+                    self._total += 1
+                    self._checked_out += 1
+                    break
+                if time.monotonic() >= deadline:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"Nenhuma conexão assíncrona livre após {self.timeout:.1f}s")
+            await asyncio.sleep(0.005)
+        try:
+            conn = psycopg2.connect(async_=True, **self.connect_kwargs)
+            await wait(conn)
+        except BaseException:
+            self._release_slot()
+            raise
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def _release_slot(self):
+        with self._lock:
+            self._total -= 1
+            self._checked_out -= 1
+
+    def putconn(self, conn, close=False):
+        if close or conn.closed or self._closed_pool:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            self._release_slot()
+            return
+        with self._lock:
+            self._checked_out -= 1
+            self._idle.append(conn)
+
+    def closeall(self):
+        with self._lock:
+            self._closed_pool = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max': self.maxconn,
+                'open': self._total,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'created': self._created,
+                'timeouts': self._timeouts,
+            }
+
+    async def fetchall(self, query, params=None):
+        conn = await self.getconn()
+        try:
+            cur = conn.cursor()
+            start = time.perf_counter()
+            if isinstance(query, PreparedStatement):
+                query = await self._prepare(conn, cur, query)
+            cur.execute(query, params)
+            await wait(conn)
+            rows = cur.fetchall() if cur.description else []
+            metrics.record_query(cur, time.perf_counter() - start)
+            metrics.record_rows(rows)
+            cur.close()
+        except BaseException:
+            # Erro ou cancelamento no meio da consulta: a conexão não é reaproveitada
+            self.putconn(conn, close=True)
+            raise
+        self.putconn(conn)
+        return rows
+
+    async def _prepare(self, conn, cur, statement):
+        """SQL a executar para ``statement``, preparando-o na conexão se preciso"""
+        if not use_prepared():
+            return statement.sql
+        names = prepared_names(conn)
+        if statement.name not in names:
+            cur.execute(statement.prepare_sql)
+            await wait(conn)
+            names.add(statement.name)
+        return statement.execute_sql
+
+    async def gather(self, *queries):
+        """Resultados (listas de linhas) de ``(consulta, parâmetros)``, executadas ao mesmo tempo"""
+        return await asyncio.gather(*(self.fetchall(query, params) for query, params in queries))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool assíncrono do processo, criado na primeira chamada."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = current_app.config
+                kwargs = dict(DB_CONFIG)
+                kwargs['connect_timeout'] = config['DB_CONNECT_TIMEOUT']
+                if config['DB_STATEMENT_TIMEOUT']:
+                    kwargs['options'] = f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT'])}"
+                _pool = AsyncConnectionPool(config['DB_ASYNC_POOL_MAXCONN'],
+                                            timeout=config['DB_ASYNC_POOL_TIMEOUT'], **kwargs)
+    return _pool
+
+
+def run(*queries):
+    """Executa ``(consulta, parâmetros)`` independentes e retorna as linhas de cada uma.
+
+    Chamada a partir de uma rota síncrona (sem loop de eventos na thread).
+    """
+    if len(queries) < 2 or not current_app.config['DB_ASYNC_QUERIES']:
+        cur = get_db().cursor()
+        results = []
+        for query, params in queries:
+            execute(cur, query, params)
+            results.append(cur.fetchall())
+        cur.close()
+        return results
+    return asyncio.run(get_pool().gather(*queries))
+
+
+def close_pool():
+    """Fecha as conexões assíncronas do processo (ver database.close_pool)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.closeall()
+
+
+_inherited_pools = []
+
+
+def _forget_pool_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+
+def init_app(app):
+    for name, value in ASYNC_POOL_DEFAULTS.items():
+        app.config.setdefault(name, value)
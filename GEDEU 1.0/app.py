@@ -1,28 +1,57 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, Response
+from flask import Flask, render_template, request, redirect, url_for, send_file, Response, stream_with_context, jsonify
+from datetime import date, datetime
+from decimal import Decimal
 import psycopg2
+from psycopg2.extras import execute_values
+from werkzeug.datastructures import ContentRange
 from werkzeug.utils import secure_filename
-import os
-import re
 import io
+import os
+import csv
+import json
+import time
+import hashlib
+import gzip
+import base64
+import threading
+import click
+import database
+import aiodb
+import cache
+import catalog
+import metrics
+import renderers
+from database import get_db
+from storage import (
+    get_storage, iter_blob_chunks, iter_pdf_upload, InvalidUpload, migrate_blobs, collect_garbage
+)
+from importer import FIELD_RULES, check_field, import_csv, InvalidImport
+
+try:
+    import brotli   # opcional: compressão br nas respostas da API
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+app.config['DOCUMENT_STORAGE'] = 'local'  # 'local' (disco, por hash) ou 'database' (BYTEA)
+app.config['MATERIALIZED_VIEW_MAX_AGE'] = 60  # segundos até uma view materializada pendente ser atualizada
+app.config['API_COMPRESS_MIN_SIZE'] = 1024  # bytes; respostas menores da API vão sem compressão
+# Qualquer chave pode vir do ambiente com o prefixo GEDEU_ (valor em JSON), ex.: GEDEU_PAGE_CACHE=null
+app.config.from_prefixed_env('GEDEU')
+database.init_app(app)
+aiodb.init_app(app)
+# dependent_pages é definida mais abaixo, junto das tabelas
+cache.init_app(app, page_dependents=lambda table: dependent_pages(table))
+metrics.init_app(app)
+catalog.init_app(app)
 
 ALLOWED_EXTENSIONS = {'pdf'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
 
-def get_db_connection():
-    return psycopg2.connect(
-        database="GEDEU",
-        host="localhost",
-        user="seu_usuario_aqui",
-        password="sua_senha_aqui",
-        port="5432"
-    )
-
 TABLES = [
     "Modalidade", "Local", "Evento", "Campeonato", "Equipe",
     "Participacao_Campeonato", "Partida", "Atleta", "Documento",
@@ -34,6 +63,11 @@ VIEWS = [
     "dashboard_equipes", "ranking_atletas"
 ]
 
+# Views lidas de uma view materializada (ver install_views.sql), paginadas por "posicao"
+MATERIALIZED_VIEWS = {
+    "ranking_atletas": "ranking_atletas_materializada"
+}
+
 DISPLAY_NAMES = {
     "Modalidade": "Modalidades",
     "Local": "Locais",
@@ -125,7 +159,8 @@ COLUMN_DISPLAY_NAMES = {
         "numero_documento": "Número do Documento",
         "arquivo_nome": "Nome do Arquivo",
         "arquivo_tamanho": "Tamanho (bytes)",
-        "data_upload": "Data de Upload"
+        "data_upload": "Data de Upload",
+        "arquivo_hash": "Hash (SHA-256)"
     },
     "Presenca_Partida": {
         "id_atleta": "Atleta",
@@ -200,39 +235,192 @@ FK_FIELDS = {
     }
 }
 
+# Tabelas aceitas por "flask import-csv": colunas que identificam uma linha já
+# cadastrada (atualizada pela importação em vez de duplicada); None = chave primária
+IMPORT_KEYS = {
+    "Atleta": ["matricula_unb"],
+    "Partida": ["data_partida", "hora_inicio", "cod_equipe_a", "cod_equipe_b"],
+    "Treinamento": ["data_treinamento", "hora_inicio", "id_treinador"],
+    "Participacao_Campeonato": None,
+    "Presenca_Partida": None,
+    "Presenca_Treinamento": None
+}
+
+# Colunas binárias grandes: coluna -> coluna que guarda o tamanho em bytes.
+# Listagens e formulários nunca trazem o conteúdo, apenas o tamanho.
+BLOB_COLUMNS = {
+    "Documento": {"arquivo_conteudo": "arquivo_tamanho"}
+}
+
+def get_table(table):
+    """Colunas, tipos e chaves de uma tabela ou view (catalog.py, lido uma vez por processo)"""
+    return catalog.get_catalog().table(table)
+
+def get_table_columns(table):
+    """Colunas da tabela na ordem do banco"""
+    return get_table(table).column_names
+
+def primary_key(table):
+    """Colunas da chave primária (tabelas associativas têm chave composta)"""
+    return get_table(table).primary_key
+
+def row_key(pk_values):
+    """Identificador de uma linha nas URLs: "valor1_valor2" em chaves compostas"""
+    return '_'.join(str(value) for value in pk_values)
+
+def parse_row_key(table, key):
+    """Valores da chave primária a partir de row_key(), ou None se não couberem na chave"""
+    pk_cols = primary_key(table)
+    values = key.split('_') if len(pk_cols) > 1 else [key]
+    return values if len(values) == len(pk_cols) else None
+
+_render_plans = {}
+
+def get_render_plan(table):
+    """Formatadores das colunas da listagem de ``table`` (montados de novo se as colunas mudarem)"""
+    columns = get_table_columns(table)
+    key = (table, tuple(columns))
+    if key not in _render_plans:
+        _render_plans[key] = renderers.RenderPlan(
+            table, columns, COLUMN_DISPLAY_NAMES.get(table, {}), FK_FIELDS.get(table, {})
+        )
+    return _render_plans[key]
+
+def listing_projection(table, columns=None):
+    """Lista de colunas do SELECT (todas, ou ``columns``) com cada BLOB trocado pelo seu tamanho"""
+    blobs = BLOB_COLUMNS.get(table, {})
+    return ', '.join(
+        f"COALESCE({blobs[col]}, octet_length({col})) AS {col}" if col in blobs else col
+        for col in (columns or get_table_columns(table))
+    )
+
+# Colunas lidas das tabelas referenciadas para exibir uma FK na listagem
+# (quando não é apenas a coluna de nome de FK_FIELDS)
+FK_LABEL_COLUMNS = {
+    "Documento": ("tipo_documento", "numero_documento")
+}
+
+def fk_joins(table, alias):
+    """LEFT JOINs que trazem os nomes das FKs de ``table`` (vista como ``alias``).
+
+    Retorna (expressões do SELECT, cláusulas JOIN, [(coluna, tabela referenciada, nº de colunas)]).
+    FKs cuja coluna de nome é a própria chave não precisam de JOIN.
+    """
+    selects, joins, specs = [], [], []
+    for i, (col, (ref_table, pk_col, name_col)) in enumerate(FK_FIELDS.get(table, {}).items()):
+        label_cols = FK_LABEL_COLUMNS.get(ref_table, (name_col,))
+        if label_cols == (pk_col,):
+            continue
+        ref_alias = f"fk{i}"
+        selects += [f"{ref_alias}.{label}" for label in label_cols]
+        joins.append(f"LEFT JOIN {ref_table} {ref_alias} ON {ref_alias}.{pk_col} = {alias}.{col}")
+        specs.append((col, ref_table, len(label_cols)))
+    return selects, ' '.join(joins), specs
+
+# Paginação das listagens
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200, 500]
+
+def encode_cursor(values):
+    """Serializa os valores da última linha de uma página para a URL"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, size):
+    """Lê um cursor da URL; retorna None se estiver ausente ou inválido"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def keyset_clause(sort_col, pk_cols, descending, cursor, backwards, alias=None):
+    """Monta o ORDER BY e o predicado de busca (seek) da paginação por chave.
+
+    A ordem é (sort_col, pk...) com NULLs no final. O cursor traz
+    [valor de sort_col, valores da pk...] da linha de referência; com
+    ``backwards`` a mesma ordem é percorrida ao contrário (página anterior).
+    Com ``alias`` as colunas são qualificadas (``alias.coluna``).
+    Retorna (order_by, predicado ou None, parâmetros).
+    """
+    if alias:
+        sort_col = f"{alias}.{sort_col}"
+        pk_cols = [f"{alias}.{col}" for col in pk_cols]
+    ascending = descending == backwards
+    direction = 'ASC' if ascending else 'DESC'
+    op = '>' if ascending else '<'
+    pk_expr = f"({', '.join(pk_cols)})"
+    pk_placeholders = f"({', '.join(['%s'] * len(pk_cols))})"
+    pk_order = ', '.join(f"{col} {direction}" for col in pk_cols)
+
+    if sort_col == pk_cols[0]:
+        if cursor is None:
+            return pk_order, None, []
+        return pk_order, f"{pk_expr} {op} {pk_placeholders}", cursor[1:]
+
+    order_by = f"{sort_col} {direction} NULLS {'FIRST' if backwards else 'LAST'}, {pk_order}"
+    if cursor is None:
+        return order_by, None, []
+    value, pk_values = cursor[0], cursor[1:]
+    if value is None:
+        predicate = f"({sort_col} IS NULL AND {pk_expr} {op} {pk_placeholders})"
+        if backwards:
+            predicate = f"({predicate} OR {sort_col} IS NOT NULL)"
+        return order_by, predicate, pk_values
+    predicate = f"{sort_col} {op} %s OR ({sort_col} = %s AND {pk_expr} {op} {pk_placeholders})"
+    if not backwards:
+        predicate += f" OR {sort_col} IS NULL"
+    return order_by, f"({predicate})", [value, value] + pk_values
+
+def estimate_row_count(cur, query, params):
+    """Estimativa de linhas do planejador (evita um COUNT(*) completo)"""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
 def get_fk_options(table):
     options = {}
     if table in FK_FIELDS:
-        conn = get_db_connection()
-        cur = conn.cursor()
         for col, (ref_table, pk_col, name_col) in FK_FIELDS[table].items():
             try:
-                cur.execute(f"SELECT {pk_col}, {name_col} FROM {ref_table}")
-                options[col] = cur.fetchall()
+                options[col] = cache.lookup(ref_table, (pk_col, name_col))
             except Exception:
                 options[col] = []
-        cur.close()
-        conn.close()
     return options
 
-@app.route('/')
-def index():
-    tables = [t for t in TABLES if t not in ["Participacao_Campeonato", "Presenca_Partida"]]
-    return render_template('index.html', tables=tables, display_names=DISPLAY_NAMES)
+def dependent_pages(table):
+    """Páginas em cache que mostram dados de ``table``.
 
-@app.route('/<table>')
-def show_table(table):
-    if table not in TABLES:
-        return "Tabela não encontrada", 404
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Construir query com filtros para Atleta e Treinador
-    query = f"SELECT * FROM {table}"
-    params = []
-    filters = []
-    
-    # Filtros específicos para Atleta e Treinador
+    A listagem da própria tabela, as listagens que exibem nomes dela (as que
+    a referenciam em FK_FIELDS: Equipe -> Atleta, Partida...) e as views que
+    a leem (API_DEPENDENCIES). Aceita o nome em minúsculas (NOTIFY).
+    """
+    table = next((t for t in TABLES if t.lower() == table.lower()), table)
+    pages = {table}
+    pages.update(referencing for referencing, fks in FK_FIELDS.items()
+                 if any(ref_table == table for ref_table, _, _ in fks.values()))
+    pages.update(view for view, tables in API_DEPENDENCIES.items() if table in tables)
+    return pages
+
+def invalidate_lookups(table):
+    """Descarta dos caches (consultas e páginas) o que uma escrita em ``table`` pode ter alterado"""
+    if table in ['Atleta', 'Treinador']:
+        cache.invalidate(table, 'Documento')
+    else:
+        cache.invalidate(table)
+
+def listing_filters(table):
+    """Filtros da listagem a partir de request.args (status e equipe, em Atleta e Treinador).
+
+    Retorna (condições do WHERE, parâmetros).
+    """
+    filters, params = [], []
     if table in ['Atleta', 'Treinador']:
         status_filter = request.args.get('status')
         equipe_filter = request.args.get('equipe')
@@ -246,79 +434,239 @@ def show_table(table):
         if equipe_filter:
             filters.append("cod_equipe = %s")
             params.append(equipe_filter)
-        
-        if filters:
-            query += " WHERE " + " AND ".join(filters)
+    return filters, params
+
+def listing_sort(table):
+    """Coluna de ordenação (sort) e direção (dir) pedidas, validadas"""
+    sort_col = request.args.get('sort')
+    if sort_col not in COLUMN_DISPLAY_NAMES.get(table, {}):
+        sort_col = primary_key(table)[0]
+    return sort_col, request.args.get('dir') == 'desc'
+
+@app.route('/')
+@cache.cached_page(lambda: 'index')
+def index():
+    tables = [t for t in TABLES if t not in ["Participacao_Campeonato", "Presenca_Partida"]]
+    return render_template('index.html', tables=tables, display_names=DISPLAY_NAMES)
+
+@app.route('/<table>')
+@cache.cached_page(lambda table: table if table in TABLES else None)
+def show_table(table):
+    if table not in TABLES:
+        return "Tabela não encontrada", 404
+    conn = get_db()
+    cur = conn.cursor()
     
-    if params:
-        cur.execute(query, params)
-    else:
-        cur.execute(query)
+    # Construir query com filtros para Atleta e Treinador
+    query = f"SELECT {listing_projection(table)} FROM {table}"
+    filters, params = listing_filters(table)
+    
+    # Ordenação e paginação por chave (keyset)
+    pk_cols = primary_key(table)
+    sort_col, descending = listing_sort(table)
+    page_size = request.args.get('page_size', PAGE_SIZE_DEFAULT, type=int)
+    page_size = max(1, min(page_size, PAGE_SIZE_MAX))
+    after = decode_cursor(request.args.get('after'), len(pk_cols) + 1)
+    before = decode_cursor(request.args.get('before'), len(pk_cols) + 1) if after is None else None
+    
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    
+    total_estimate = None
+    if request.args.get('count'):
+        total_estimate = estimate_row_count(cur, query, params)
+    
+    order_by, seek, seek_params = keyset_clause(
+        sort_col, pk_cols, descending, after or before, before is not None
+    )
+    if seek:
+        query += (" AND " if filters else " WHERE ") + seek
+    query += f" ORDER BY {order_by} LIMIT %s"
+    
+    # Nomes das FKs: JOIN só com as linhas da página, não com as tabelas inteiras
+    fk_selects, fk_join_sql, fk_specs = fk_joins(table, 'p')
+    if fk_specs:
+        outer_order = keyset_clause(sort_col, pk_cols, descending, None, before is not None, alias='p')[0]
+        query = (f"SELECT p.*, {', '.join(fk_selects)} FROM ({query}) p "
+                 f"{fk_join_sql} ORDER BY {outer_order}")
+    cur.execute(query, params + seek_params + [page_size + 1])
     
     rows = cur.fetchall()
-    colnames = [desc[0] for desc in cur.description]
-    equipe_nomes = {}
-    if any(col in colnames for col in ['cod_equipe', 'cod_equipe_a', 'cod_equipe_b']):
-        cur.execute("SELECT cod_equipe, nome_equipe FROM Equipe")
-        equipe_nomes = {row[0]: row[1] for row in cur.fetchall()}
-    documento_infos = {}
-    if 'cod_documento' in colnames:
-        cur.execute("SELECT cod_documento, tipo_documento, numero_documento FROM Documento")
-        documento_infos = {row[0]: {'tipo': row[1], 'numero': row[2]} for row in cur.fetchall()}
-    local_nomes = {}
-    treinador_nomes = {}
-    modalidade_nomes = {}
-    evento_nomes = {}
-    if table in ["Treinamento", "Evento", "Campeonato", "Partida"]:
-        cur.execute("SELECT cod_local, nome_local FROM Local")
-        local_nomes = {row[0]: row[1] for row in cur.fetchall()}
-    if table == "Treinamento":
-        cur.execute("SELECT id_treinador, nome_treinador FROM Treinador")
-        treinador_nomes = {row[0]: row[1] for row in cur.fetchall()}
-    if table in ["Campeonato", "Partida"]:
-        cur.execute("SELECT cod_modalidade, nome_modalidade FROM Modalidade")
-        modalidade_nomes = {row[0]: row[1] for row in cur.fetchall()}
-    if table in ["Campeonato", "Partida"]:
-        cur.execute("SELECT cod_evento, nome_evento FROM Evento")
-        evento_nomes = {row[0]: row[1] for row in cur.fetchall()}
+    colnames = get_table_columns(table)
+    
+    # Separa as colunas da tabela das colunas trazidas pelos JOINs
+    fk_labels = {}
+    if fk_specs:
+        base_count = len(colnames)
+        for row in rows:
+            pos = base_count
+            for col, ref_table, width in fk_specs:
+                key = row[colnames.index(col)]
+                if key is not None:
+                    fk_labels.setdefault(ref_table, {})[key] = row[pos:pos + width]
+                pos += width
+        rows = [row[:base_count] for row in rows]
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+    
+    # Links de navegação preservam filtros, ordenação e tamanho da página
+    key_idx = [colnames.index(sort_col)] + [colnames.index(col) for col in pk_cols]
+    base_args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    prev_url = next_url = None
+    if rows and has_prev:
+        prev_url = url_for('show_table', table=table, **base_args,
+                           before=encode_cursor([rows[0][i] for i in key_idx]))
+    if rows and has_next:
+        next_url = url_for('show_table', table=table, **base_args,
+                           after=encode_cursor([rows[-1][i] for i in key_idx]))
+    sort_args = {k: v for k, v in base_args.items() if k not in ('sort', 'dir')}
+    sort_urls = [
+        url_for('show_table', table=table, **sort_args, sort=col,
+                dir='desc' if col == sort_col and not descending else 'asc')
+        if col in COLUMN_DISPLAY_NAMES.get(table, {}) else None
+        for col in colnames
+    ]
+    page_size_urls = [
+        (size, url_for('show_table', table=table, **{**sort_args, 'sort': sort_col,
+                                                      'dir': 'desc' if descending else 'asc',
+                                                      'page_size': size}))
+        for size in PAGE_SIZE_OPTIONS
+    ]
+    count_url = url_for('show_table', table=table, **{**base_args, 'count': 1})
+    export_args = {**sort_args, 'sort': sort_col, 'dir': 'desc' if descending else 'asc'}
+    export_args.pop('page_size', None)
+    export_args.pop('count', None)
+    export_urls = [(fmt.upper(), url_for('export', name=table, fmt=fmt, **export_args)) for fmt in ('csv', 'json')]
     cur.close()
-    conn.close()
-    display_colnames = [COLUMN_DISPLAY_NAMES.get(table, {}).get(col, col) for col in colnames]
     
-    # Formatar dados BLOB para exibição amigável
-    rows = format_blob_data(rows, colnames, table)
+    # Células já formatadas, com os nomes das FKs das linhas exibidas
+    plan = get_render_plan(table)
+    headers = list(zip(colnames, plan.headers, sort_urls))
+    rendered_rows = plan.render_rows(rows, fk_labels)
+    pk_idx = [colnames.index(col) for col in pk_cols]
+    row_keys = [row_key([row[i] for i in pk_idx]) for row in rows]
     
     # Buscar equipes disponíveis para filtro (apenas para Atleta e Treinador)
     equipes_filtro = []
     if table in ['Atleta', 'Treinador']:
-        conn2 = get_db_connection()
-        cur2 = conn2.cursor()
-        cur2.execute("SELECT cod_equipe, nome_equipe FROM Equipe ORDER BY nome_equipe")
-        equipes_filtro = cur2.fetchall()
-        cur2.close()
-        conn2.close()
+        equipes_filtro = cache.lookup("Equipe", ("cod_equipe", "nome_equipe"), order_by="nome_equipe")
     
     return render_template(
         'table.html',
         table=table,
-        rows=rows,
-        colnames=colnames,
-        display_colnames=display_colnames,
+        rendered_rows=rendered_rows,
+        row_keys=row_keys,
+        headers=headers,
         display_names=DISPLAY_NAMES,
-        equipe_nomes=equipe_nomes,
-        documento_infos=documento_infos,
-        local_nomes=local_nomes,
-        treinador_nomes=treinador_nomes,
-        modalidade_nomes=modalidade_nomes,
-        evento_nomes=evento_nomes,
         equipes_filtro=equipes_filtro,
         status_filter=request.args.get('status'),
-        equipe_filter=request.args.get('equipe')
+        equipe_filter=request.args.get('equipe'),
+        sort_col=sort_col,
+        descending=descending,
+        page_size=page_size,
+        sort_urls=sort_urls,
+        prev_url=prev_url,
+        next_url=next_url,
+        page_size_urls=page_size_urls,
+        total_estimate=total_estimate,
+        count_url=count_url,
+        export_urls=export_urls
     )
 
+# Linhas lidas do banco por vez nas exportações
+EXPORT_FETCH_SIZE = 2000
+
+def view_column_label(col):
+    """Nome de coluna de view como exibido em view_table.html"""
+    return col.replace('_', ' ').title()
+
+def stream_export(query, params, fmt, headers=None, label=view_column_label):
+    """Gera o CSV/JSON de ``query`` em partes, lendo por um cursor no servidor.
+
+    A memória usada não depende do tamanho do resultado: cada parte tem
+    EXPORT_FETCH_SIZE linhas. Sem ``headers``, aplica ``label`` aos nomes
+    das colunas da consulta.
+    """
+    cur = get_db().cursor(name='exportacao')
+    cur.itersize = EXPORT_FETCH_SIZE
+    try:
+        cur.execute(query, params)
+        rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+        names = headers or [label(desc[0]) for desc in cur.description]
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            buffer.write('\ufeff')   # BOM: acentos corretos ao abrir no Excel
+            writer.writerow(names)
+            while rows:
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            yield buffer.getvalue()
+        else:
+            yield '['
+            separator = '\n'
+            while rows:
+                chunk = []
+                for row in rows:
+                    chunk.append(separator + json.dumps(dict(zip(names, row)), default=str, ensure_ascii=False))
+                    separator = ',\n'
+                yield ''.join(chunk)
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            yield '\n]\n'
+    finally:
+        cur.close()
+
+@app.route('/export/<name>.<any(csv, json):fmt>')
+def export(name, fmt):
+    """Exporta uma tabela (com os filtros e a ordenação da listagem) ou uma view inteira.
+
+    Os cabeçalhos usam os nomes exibidos nas páginas; com ``raw=1``, os nomes das colunas.
+    """
+    raw = bool(request.args.get('raw'))
+    if name in TABLES:
+        filters, params = listing_filters(name)
+        sort_col, descending = listing_sort(name)
+        query = f"SELECT {listing_projection(name)} FROM {name}"
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        order_by = keyset_clause(sort_col, primary_key(name), descending, None, False, alias='p')[0]
+        fk_selects, fk_join_sql, fk_specs = fk_joins(name, 'p')
+        query = (f"SELECT p.*{''.join(', ' + s for s in fk_selects)} FROM ({query}) p "
+                 f"{fk_join_sql} ORDER BY {order_by}")
+        display = COLUMN_DISPLAY_NAMES.get(name, {})
+        columns = get_table_columns(name)
+        headers = list(columns) if raw else [display.get(col, col) for col in columns]
+        for col, ref_table, _ in fk_specs:
+            ref_display = COLUMN_DISPLAY_NAMES.get(ref_table, {})
+            for label in FK_LABEL_COLUMNS.get(ref_table, (FK_FIELDS[name][col][2],)):
+                headers.append(f"{col}.{label}" if raw
+                               else f"{display.get(col, col)} ({ref_display.get(label, label)})")
+    elif name in VIEWS:
+        params, headers = [], None
+        query = f"SELECT * FROM {MATERIALIZED_VIEWS.get(name, name)}"
+        if name in MATERIALIZED_VIEWS:
+            query += " ORDER BY posicao"
+    else:
+        return "Tabela não encontrada", 404
+    
+    label = (lambda col: col) if raw else view_column_label
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    response = Response(stream_with_context(stream_export(query, params, fmt, headers, label)),
+                        mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
 @app.route('/participantes_campeonato/<cod_campeonato>', methods=['GET', 'POST'])
 def participantes_campeonato(cod_campeonato):
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     # Buscar nome do campeonato
     cur.execute("SELECT nome_campeonato FROM Campeonato WHERE cod_campeonato = %s", (cod_campeonato,))
@@ -348,9 +696,9 @@ def participantes_campeonato(cod_campeonato):
                 VALUES (%s, %s, %s)
             """, (cod_equipe, cod_campeonato, status_participacao))
             conn.commit()
+            invalidate_lookups('Participacao_Campeonato')
         return redirect(url_for('participantes_campeonato', cod_campeonato=cod_campeonato))
     cur.close()
-    conn.close()
     return render_template(
         'participantes_campeonato.html',
         cod_campeonato=cod_campeonato,
@@ -363,11 +711,11 @@ def participantes_campeonato(cod_campeonato):
 def add_row(table):
     if table not in TABLES:
         return "Tabela não encontrada", 404
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
-    cur.execute(f"SELECT * FROM {table} LIMIT 0")
-    colnames = [desc[0] for desc in cur.description]
-    insert_cols = colnames[1:]
+    # Colunas geradas pelo banco (SERIAL) e BLOBs não vêm do formulário
+    meta = get_table(table)
+    insert_cols = [col for col in meta.insertable if col not in meta.large_objects]
     fk_options = get_fk_options(table)
     doc_fields = []
     if table in ['Atleta', 'Treinador']:
@@ -382,45 +730,37 @@ def add_row(table):
             if not file or file.filename == '' or not allowed_file(file.filename):
                 return "Por favor, envie um arquivo PDF válido.", 400
             
-            # Lê o conteúdo do arquivo para armazenar como BLOB
-            file_content = file.read()
             filename = secure_filename(file.filename)
-            file_size = len(file_content)
             
             # Verifica unicidade do número do documento antes de inserir
-            conn2 = get_db_connection()
-            cur2 = conn2.cursor()
+            cur2 = conn.cursor()
             cur2.execute("SELECT 1 FROM Documento WHERE numero_documento = %s", (numero_documento,))
             if cur2.fetchone():
                 cur2.close()
-                conn2.close()
                 return "Já existe um documento cadastrado com este número.", 400
+            
+            # Grava o PDF no armazenamento de documentos (disco ou BLOB)
+            try:
+                file_content, file_hash, file_size = store_uploaded_document(file)
+            except InvalidUpload:
+                cur2.close()
+                return "Por favor, envie um arquivo PDF válido.", 400
             cur2.execute(
-                "INSERT INTO Documento (tipo_documento, numero_documento, arquivo_nome, arquivo_conteudo, arquivo_tamanho) VALUES (%s, %s, %s, %s, %s) RETURNING cod_documento",
-                (tipo_documento, numero_documento, filename, file_content, file_size)
+                "INSERT INTO Documento (tipo_documento, numero_documento, arquivo_nome, arquivo_conteudo, arquivo_tamanho, arquivo_hash) VALUES (%s, %s, %s, %s, %s, %s) RETURNING cod_documento",
+                (tipo_documento, numero_documento, filename, file_content, file_size, file_hash)
             )
+            # O commit do documento acontece junto com o do registro
             doc_cod = cur2.fetchone()[0]
-            conn2.commit()
             cur2.close()
-            conn2.close()
         for col in insert_cols:
             if col.startswith('status_'):
                 values.append(request.form.get(col) == 'on')
-            elif col == 'matricula_unb':
-                matricula = request.form.get(col)
-                if not matricula or not re.fullmatch(r'\d{9}', matricula):
-                    return "Matrícula deve conter exatamente 9 números.", 400
-                values.append(matricula)
-            elif col in ['email_atleta', 'email_treinador']:
-                email = request.form.get(col)
-                if not email or not re.fullmatch(r"[^@]+@[^@]+\.[^@]+", email):
-                    return "E-mail inválido.", 400
-                values.append(email)
-            elif col in ['telefone_atleta', 'telefone_treinador']:
-                telefone = request.form.get(col)
-                if not telefone or not re.fullmatch(r'\d{11}', telefone):
-                    return "Telefone deve conter exatamente 11 números.", 400
-                values.append(telefone)
+            elif col in FIELD_RULES:
+                value = request.form.get(col)
+                error = check_field(col, value)
+                if error:
+                    return error, 400
+                values.append(value)
             elif col == 'cod_documento' and table in ['Atleta', 'Treinador']:
                 values.append(doc_cod)
             elif table in FK_FIELDS and col in fk_options:
@@ -434,10 +774,9 @@ def add_row(table):
         )
         conn.commit()
         cur.close()
-        conn.close()
+        invalidate_lookups(table)
         return redirect(url_for('show_table', table=table))
     cur.close()
-    conn.close()
     return render_template(
         'add_edit.html',
         table=table,
@@ -453,38 +792,35 @@ def add_row(table):
 def edit_row(table, pk):
     if table not in TABLES:
         return "Tabela não encontrada", 404
-    conn = get_db_connection()
+    pk_values = parse_row_key(table, pk)
+    if pk_values is None:
+        return "Chave primária inválida para esta tabela", 400
+    conn = get_db()
     cur = conn.cursor()
-    cur.execute(f"SELECT * FROM {table} LIMIT 0")
-    colnames = [desc[0] for desc in cur.description]
-    pk_col = colnames[0]
-    cur.execute(f"SELECT * FROM {table} WHERE {pk_col} = %s", (pk,))
+    # Chave primária e colunas BLOB não são editáveis por este formulário
+    meta = get_table(table)
+    edit_cols = [col for col in meta.column_names
+                 if col not in meta.primary_key and col not in meta.large_objects]
+    where_clause = " AND ".join(f"{col} = %s" for col in meta.primary_key)
+    cur.execute(f"SELECT {', '.join(edit_cols)} FROM {table} WHERE {where_clause}", pk_values)
     row = cur.fetchone()
     if not row:
         cur.close()
-        conn.close()
         return "Registro não encontrado", 404
-    edit_cols = colnames[1:]
     fk_options = get_fk_options(table)  # <-- Certifique-se de definir fk_options antes do bloco POST
     doc_fields = []
     doc_row = None
     if table in ['Atleta', 'Treinador']:
         # Busca dados do documento relacionado
-        idx_cod_doc = edit_cols.index('cod_documento')
-        cod_doc = row[idx_cod_doc+1]
-        conn2 = get_db_connection()
-        cur2 = conn2.cursor()
-        cur2.execute("SELECT tipo_documento, numero_documento, arquivo FROM Documento WHERE cod_documento = %s", (cod_doc,))
+        cod_doc = row[edit_cols.index('cod_documento')]
+        cur2 = conn.cursor()
+        cur2.execute("SELECT tipo_documento, numero_documento, arquivo_nome FROM Documento WHERE cod_documento = %s", (cod_doc,))
         doc_row = cur2.fetchone()
         cur2.close()
-        conn2.close()
         doc_fields = ['tipo_documento', 'numero_documento', 'arquivo']
     
     # Criar um dicionário com os valores atuais para facilitar o acesso no template
-    current_values = {}
-    if row:
-        for i, col in enumerate(edit_cols):
-            current_values[col] = row[i + 1]  # row[i + 1] porque row[0] é a chave primária
+    current_values = dict(zip(edit_cols, row))
     
     if request.method == 'POST':
         values = []
@@ -493,76 +829,64 @@ def edit_row(table, pk):
             tipo_documento = request.form.get('tipo_documento')
             numero_documento = request.form.get('numero_documento')
             file = request.files.get('arquivo')
-            idx_cod_doc = edit_cols.index('cod_documento')
-            cod_doc = row[idx_cod_doc+1]
-            conn2 = get_db_connection()
-            cur2 = conn2.cursor()
+            cod_doc = current_values['cod_documento']
+            cur2 = conn.cursor()
             if file and file.filename != '':
                 if not allowed_file(file.filename):
                     cur2.close()
-                    conn2.close()
                     return "Por favor, envie um arquivo PDF válido.", 400
                 
-                # Lê o conteúdo do arquivo para armazenar como BLOB
-                file_content = file.read()
+                # Grava o PDF no armazenamento de documentos (disco ou BLOB)
                 filename = secure_filename(file.filename)
-                file_size = len(file_content)
+                try:
+                    file_content, file_hash, file_size = store_uploaded_document(file)
+                except InvalidUpload:
+                    cur2.close()
+                    return "Por favor, envie um arquivo PDF válido.", 400
                 
                 cur2.execute(
-                    "UPDATE Documento SET tipo_documento=%s, numero_documento=%s, arquivo_nome=%s, arquivo_conteudo=%s, arquivo_tamanho=%s WHERE cod_documento=%s",
-                    (tipo_documento, numero_documento, filename, file_content, file_size, cod_doc)
+                    "UPDATE Documento SET tipo_documento=%s, numero_documento=%s, arquivo_nome=%s, arquivo_conteudo=%s, arquivo_tamanho=%s, arquivo_hash=%s WHERE cod_documento=%s",
+                    (tipo_documento, numero_documento, filename, file_content, file_size, file_hash, cod_doc)
                 )
             else:
                 cur2.execute(
                     "UPDATE Documento SET tipo_documento=%s, numero_documento=%s WHERE cod_documento=%s",
                     (tipo_documento, numero_documento, cod_doc)
                 )
-            conn2.commit()
             cur2.close()
-            conn2.close()
-        for idx, col in enumerate(edit_cols):
+        for col in edit_cols:
             if col.startswith('status_'):
                 values.append(request.form.get(col) == 'on')
-            elif col == 'matricula_unb':
-                matricula = request.form.get(col)
-                if not matricula or not re.fullmatch(r'\d{9}', matricula):
-                    return "Matrícula deve conter exatamente 9 números.", 400
-                values.append(matricula)
-            elif col in ['email_atleta', 'email_treinador']:
-                email = request.form.get(col)
-                if not email or not re.fullmatch(r"[^@]+@[^@]+\.[^@]+", email):
-                    return "E-mail inválido.", 400
-                values.append(email)
-            elif col in ['telefone_atleta', 'telefone_treinador']:
-                telefone = request.form.get(col)
-                if not telefone or not re.fullmatch(r'\d{11}', telefone):
-                    return "Telefone deve conter exatamente 11 números.", 400
-                values.append(telefone)
+            elif col in FIELD_RULES:
+                value = request.form.get(col)
+                error = check_field(col, value)
+                if error:
+                    return error, 400
+                values.append(value)
             elif col == 'cod_documento' and table in ['Atleta', 'Treinador']:
                 # Para Atleta/Treinador, o cod_documento não deve ser alterado
                 # pois é gerenciado pelos campos de documento separados
-                values.append(current_values[col] if current_values and col in current_values else row[idx + 1])
+                values.append(current_values[col])
             elif table in FK_FIELDS and col in fk_options:
                 values.append(request.form.get(col))
             else:
                 values.append(request.form.get(col))
         set_clause = ','.join([f"{col}=%s" for col in edit_cols])
         cur.execute(
-            f"UPDATE {table} SET {set_clause} WHERE {pk_col} = %s",
-            values + [pk]
+            f"UPDATE {table} SET {set_clause} WHERE {where_clause}",
+            values + pk_values
         )
         conn.commit()
         cur.close()
-        conn.close()
+        invalidate_lookups(table)
         return redirect(url_for('show_table', table=table))
     cur.close()
-    conn.close()
     
     return render_template(
         'add_edit.html',
         table=table,
         colnames=edit_cols,
-        row=row[1:] if row else None,
+        row=row,
         current_values=current_values,
         COLUMN_DISPLAY_NAMES=COLUMN_DISPLAY_NAMES,
         fk_options=fk_options,
@@ -572,49 +896,50 @@ def edit_row(table, pk):
 
 @app.route('/edit_document/<table>/<pk>', methods=['GET', 'POST'])
 def edit_document(table, pk):
+    if table not in ['Atleta', 'Treinador']:
+        return "Tabela não encontrada", 404
     # Busca cod_documento
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
-    cur.execute(f"SELECT cod_documento FROM {table} WHERE {('id_atleta' if table=='Atleta' else 'id_treinador')} = %s", (pk,))
+    cur.execute(f"SELECT cod_documento FROM {table} WHERE {primary_key(table)[0]} = %s", (pk,))
     cod_doc = cur.fetchone()
     if not cod_doc:
         cur.close()
-        conn.close()
         return "Documento não encontrado", 404
     cod_doc = cod_doc[0]
-    cur.execute("SELECT tipo_documento, numero_documento, arquivo FROM Documento WHERE cod_documento = %s", (cod_doc,))
+    cur.execute("SELECT tipo_documento, numero_documento, arquivo_nome FROM Documento WHERE cod_documento = %s", (cod_doc,))
     doc_row = cur.fetchone()
     cur.close()
-    conn.close()
     if request.method == 'POST':
         tipo_documento = request.form.get('tipo_documento')
         numero_documento = request.form.get('numero_documento')
         file = request.files.get('arquivo')
-        conn2 = get_db_connection()
-        cur2 = conn2.cursor()
+        cur2 = conn.cursor()
         if file and file.filename != '':
             if not allowed_file(file.filename):
                 cur2.close()
-                conn2.close()
                 return "Por favor, envie um arquivo PDF válido.", 400
             
-            # Lê o conteúdo do arquivo para armazenar como BLOB
-            file_content = file.read()
+            # Grava o PDF no armazenamento de documentos (disco ou BLOB)
             filename = secure_filename(file.filename)
-            file_size = len(file_content)
+            try:
+                file_content, file_hash, file_size = store_uploaded_document(file)
+            except InvalidUpload:
+                cur2.close()
+                return "Por favor, envie um arquivo PDF válido.", 400
             
             cur2.execute(
-                "UPDATE Documento SET tipo_documento=%s, numero_documento=%s, arquivo_nome=%s, arquivo_conteudo=%s, arquivo_tamanho=%s WHERE cod_documento=%s",
-                (tipo_documento, numero_documento, filename, file_content, file_size, cod_doc)
+                "UPDATE Documento SET tipo_documento=%s, numero_documento=%s, arquivo_nome=%s, arquivo_conteudo=%s, arquivo_tamanho=%s, arquivo_hash=%s WHERE cod_documento=%s",
+                (tipo_documento, numero_documento, filename, file_content, file_size, file_hash, cod_doc)
             )
         else:
             cur2.execute(
                 "UPDATE Documento SET tipo_documento=%s, numero_documento=%s WHERE cod_documento=%s",
                 (tipo_documento, numero_documento, cod_doc)
             )
-        conn2.commit()
+        conn.commit()
         cur2.close()
-        conn2.close()
+        invalidate_lookups('Documento')
         return redirect(url_for('show_table', table=table))
     return render_template(
         'edit_document.html',
@@ -623,60 +948,118 @@ def edit_document(table, pk):
         doc_row=doc_row
     )
 
+def store_uploaded_document(file):
+    """Grava o PDF enviado no armazenamento configurado, lendo o upload em partes.
+
+    O cabeçalho de PDF é validado no primeiro bloco e o hash é calculado
+    durante a cópia (InvalidUpload se não for PDF). Retorna (valor de
+    arquivo_conteudo, hash, tamanho); o conteúdo é None quando o arquivo fica
+    em disco.
+    """
+    storage = get_storage()
+    chunks = iter_pdf_upload(file.stream)
+    if storage is None:
+        # O driver precisa do BLOB inteiro em um único parâmetro
+        digest = hashlib.sha256()
+        file_content = bytearray()
+        for chunk in chunks:
+            digest.update(chunk)
+            file_content += chunk
+        return file_content, digest.hexdigest(), len(file_content)
+    file_hash, file_size = storage.save(chunks)
+    return None, file_hash, file_size
+
 # Rota para servir arquivos PDF
 @app.route('/documento/<int:cod_documento>')
 def ver_documento(cod_documento):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT arquivo, tipo_documento, numero_documento FROM Documento WHERE cod_documento = %s", (cod_documento,))
-    doc = cur.fetchone()
-    cur.close()
-    conn.close()
-    
-    if not doc:
-        return "Documento não encontrado", 404
-    
-    arquivo_path, tipo_doc, numero_doc = doc
-    
-    # Verificar se o arquivo existe fisicamente
-    if not os.path.exists(arquivo_path):
-        return f"Arquivo PDF não encontrado no sistema de arquivos: {arquivo_path}", 404
-    
-    try:
-        return send_file(arquivo_path, as_attachment=False, download_name=f"{tipo_doc}_{numero_doc}.pdf")
-    except Exception as e:
-        return f"Erro ao abrir o arquivo: {str(e)}", 500
+    # Documentos em disco ou no banco são servidos pela mesma rota de download
+    return download_pdf(cod_documento)
+
+# Download de PDFs armazenados como BLOB
+PDF_CHUNK_SIZE = 256 * 1024
+
+# Documentos sem hash (anteriores à migração) têm o hash calculado no banco
+DOCUMENTO_META = database.prepared('documento_meta', """
+    SELECT arquivo_nome,
+           COALESCE(arquivo_hash, encode(sha256(arquivo_conteudo), 'hex')),
+           COALESCE(octet_length(arquivo_conteudo), arquivo_tamanho),
+           arquivo_conteudo IS NULL
+    FROM Documento WHERE cod_documento = %s
+""")
+
+def get_documento_meta(cod_documento):
+    """(arquivo_nome, arquivo_hash, tamanho, em_disco) de um documento, sem ler o conteúdo.
+
+    Fica no cache de registros (cache.cached_row), descartado a cada escrita
+    em Documento: pelo invalidate_lookups deste processo e, nos outros, pelo
+    NOTIFY. Um hash velho geraria 304 e tamanhos de Range errados.
+    """
+    def load():
+        cur = get_db().cursor()
+        database.execute(cur, DOCUMENTO_META, (cod_documento,))
+        meta = cur.fetchone()
+        cur.close()
+        return meta
+
+    return cache.cached_row('Documento', cod_documento, load)
 
 @app.route('/download_pdf/<int:cod_documento>')
 def download_pdf(cod_documento):
-    """Serve um PDF armazenado como BLOB no banco de dados"""
+    """Serve um PDF armazenado como BLOB no banco de dados, em partes, com Range e ETag"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT arquivo_nome, arquivo_conteudo FROM Documento WHERE cod_documento = %s",
-            (cod_documento,)
-        )
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if not result:
+        meta = get_documento_meta(cod_documento)
+        if not meta:
             return "Documento não encontrado", 404
         
-        filename, file_content = result
+        filename, file_hash, file_size, on_disk = meta
         
-        # Cria um objeto de arquivo em memória
-        file_obj = io.BytesIO(file_content)
+        # Revalidação: o navegador já tem esta versão, não toca no banco
+        if request.if_none_match.contains(file_hash):
+            response = Response(status=304)
+            response.set_etag(file_hash)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
         
-        return Response(
-            file_obj.getvalue(),
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
+        if on_disk:
+            # send_file trata Range e usa sendfile/X-Sendfile quando disponível
+            storage = get_storage()
+            if storage is None or not storage.exists(file_hash):
+                return "Arquivo PDF não encontrado no armazenamento de documentos", 404
+            response = send_file(storage.path(file_hash), mimetype='application/pdf',
+                                 as_attachment=False, download_name=filename,
+                                 conditional=True, etag=file_hash)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        start, stop, status = 0, file_size, 200
+        if_range = request.if_range
+        range_valid = (if_range.etag is None and if_range.date is None) or if_range.etag == file_hash
+        if request.range and len(request.range.ranges) == 1 and range_valid:
+            byte_range = request.range.range_for_length(file_size)
+            if byte_range is None:
+                response = Response("Intervalo inválido", status=416)
+                response.headers['Content-Range'] = f"bytes */{file_size}"
+                return response
+            start, stop = byte_range
+            status = 206
+        
+        def generate():
+            # Lê o BLOB em fatias com substring(), sem carregá-lo inteiro na memória
+            cur = get_db().cursor()
+            try:
+                yield from iter_blob_chunks(cur, cod_documento, start, stop, PDF_CHUNK_SIZE)
+            finally:
+                cur.close()
+        
+        response = Response(stream_with_context(generate()), status=status, mimetype='application/pdf')
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.accept_ranges = 'bytes'
+        response.content_length = stop - start
+        if status == 206:
+            response.content_range = ContentRange('bytes', start, stop, file_size)
+        response.set_etag(file_hash)
+        return response
         
     except Exception as e:
         return f"Erro ao baixar documento: {str(e)}", 500
@@ -687,65 +1070,192 @@ def basename_filter(path):
 
 @app.template_filter('telefone_format')
 def telefone_format_filter(value):
-    if not value or len(value) != 11 or not value.isdigit():
-        return value
-    return f"({value[:2]}) {value[2:7]}-{value[7:]}"
+    return renderers.format_phone(value)
+
+class InvalidRoster(ValueError):
+    """Chamada (lista de presenças) enviada em formato inválido."""
+
+def parse_roster():
+    """Linhas (id_atleta, presenca, obs) da chamada enviada, em JSON ou formulário.
+
+    JSON: {"presencas": [{"id_atleta": 1, "presenca": true, "obs": "..."}, ...]}.
+    Formulário: um campo ``chamada`` por atleta, com ``presenca_<id>`` e ``obs_<id>``.
+    """
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        items = payload.get('presencas') if isinstance(payload, dict) else None
+        if not isinstance(items, list):
+            raise InvalidRoster("Envie {\"presencas\": [...]}")
+        rows = []
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('presenca'), bool):
+                raise InvalidRoster("Cada presença precisa de id_atleta e presenca (true/false)")
+            rows.append((item.get('id_atleta'), item['presenca'], item.get('obs') or None))
+        return rows
+    return [
+        (id_atleta, request.form.get(f'presenca_{id_atleta}') == 'on',
+         request.form.get(f'obs_{id_atleta}') or None)
+        for id_atleta in request.form.getlist('chamada')
+    ]
+
+def save_roster(conn, table, activity_col, activity_id, roster_ids, rows):
+    """Grava a chamada inteira com um único INSERT ... ON CONFLICT, em uma transação.
+
+    Atletas fora de ``roster_ids`` ou repetidos são rejeitados; os demais são
+    inseridos ou, se já marcados, atualizados. Retorna o resumo por atleta.
+    """
+    results = []
+    values = {}
+    for id_atleta, presenca, obs in rows:
+        try:
+            id_atleta = int(id_atleta)
+        except (TypeError, ValueError):
+            results.append({'id_atleta': id_atleta, 'resultado': 'rejeitada', 'motivo': 'id_atleta inválido'})
+            continue
+        if id_atleta not in roster_ids:
+            results.append({'id_atleta': id_atleta, 'resultado': 'rejeitada', 'motivo': 'atleta fora da equipe'})
+        elif id_atleta in values:
+            results.append({'id_atleta': id_atleta, 'resultado': 'rejeitada', 'motivo': 'atleta repetido'})
+        else:
+            values[id_atleta] = (activity_id, id_atleta, presenca, obs)
+            results.append({'id_atleta': id_atleta, 'resultado': None})
+
+    written = {}
+    if values:
+        cur = conn.cursor()
+        # xmax = 0 só nas linhas recém-inseridas; nas atualizadas guarda a transação atual
+        written = dict(execute_values(cur, f"""
+            INSERT INTO {table} ({activity_col}, id_atleta, presenca, obs) VALUES %s
+            ON CONFLICT ({', '.join(primary_key(table))}) DO UPDATE
+            SET presenca = EXCLUDED.presenca, obs = EXCLUDED.obs
+            RETURNING id_atleta, xmax = 0
+        """, list(values.values()), page_size=len(values), fetch=True))
+        conn.commit()
+        cur.close()
+        invalidate_lookups(table)
+    for result in results:
+        if result['resultado'] is None:
+            result['resultado'] = 'inserida' if written[result['id_atleta']] else 'atualizada'
+
+    summary = {status: sum(1 for r in results if r['resultado'] == status)
+               for status in ('inserida', 'atualizada', 'rejeitada')}
+    return {'linhas': results, 'resumo': summary}
+
+# Consultas das telas de chamada, executadas a cada abertura: preparadas uma
+# vez por conexão (database.prepared) e executadas pelo nome
+TREINAMENTO_INFO = database.prepared('treinamento_info', """
+    SELECT t.data_treinamento, t.hora_inicio, t.hora_final, tr.nome_treinador, tr.cod_equipe
+    FROM Treinamento t
+    JOIN Treinador tr ON t.id_treinador = tr.id_treinador
+    WHERE t.cod_treinamento = %s
+""")
+
+ATLETAS_TREINAMENTO = database.prepared('atletas_treinamento', """
+    SELECT a.id_atleta, a.nome_atleta
+    FROM Treinamento t
+    JOIN Treinador tr ON t.id_treinador = tr.id_treinador
+    JOIN Atleta a ON a.cod_equipe = tr.cod_equipe
+    WHERE t.cod_treinamento = %s
+""")
+
+PRESENCAS_TREINAMENTO = database.prepared('presencas_treinamento', """
+    SELECT pt.id_atleta, a.nome_atleta, pt.presenca, pt.obs
+    FROM Presenca_Treinamento pt
+    JOIN Atleta a ON pt.id_atleta = a.id_atleta
+    WHERE pt.cod_treinamento = %s
+""")
+
+INSERIR_PRESENCA_TREINAMENTO = database.prepared('inserir_presenca_treinamento', """
+    INSERT INTO Presenca_Treinamento (cod_treinamento, id_atleta, presenca, obs)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (cod_treinamento, id_atleta) DO NOTHING
+""")
+
+PARTIDA_EQUIPES = database.prepared(
+    'partida_equipes', "SELECT cod_equipe_a, cod_equipe_b FROM Partida WHERE cod_partida = %s"
+)
+
+ATLETAS_PARTIDA = database.prepared('atletas_partida', """
+    SELECT a.id_atleta, a.nome_atleta, a.cod_equipe
+    FROM Partida p
+    JOIN Atleta a ON a.cod_equipe IN (p.cod_equipe_a, p.cod_equipe_b)
+    WHERE p.cod_partida = %s
+""")
+
+NOMES_EQUIPES_PARTIDA = database.prepared('nomes_equipes_partida', """
+    SELECT e.cod_equipe, e.nome_equipe
+    FROM Partida p
+    JOIN Equipe e ON e.cod_equipe IN (p.cod_equipe_a, p.cod_equipe_b)
+    WHERE p.cod_partida = %s
+""")
+
+PRESENCAS_PARTIDA = database.prepared('presencas_partida', """
+    SELECT pp.id_atleta, a.nome_atleta, a.cod_equipe, pp.presenca, pp.obs
+    FROM Presenca_Partida pp
+    JOIN Atleta a ON pp.id_atleta = a.id_atleta
+    WHERE pp.cod_partida = %s
+""")
+
+INSERIR_PRESENCA_PARTIDA = database.prepared('inserir_presenca_partida', """
+    INSERT INTO Presenca_Partida (id_atleta, cod_partida, presenca, obs)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (id_atleta, cod_partida) DO NOTHING
+""")
 
 @app.route('/presenca_treinamento/<cod_treinamento>', methods=['GET', 'POST'])
 def presenca_treinamento(cod_treinamento):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # Buscar dados do treinamento, treinador e equipe do treinador
-    cur.execute("""
-        SELECT t.data_treinamento, t.hora_inicio, t.hora_final, tr.nome_treinador, tr.cod_equipe
-        FROM Treinamento t
-        JOIN Treinador tr ON t.id_treinador = tr.id_treinador
-        WHERE t.cod_treinamento = %s
-    """, (cod_treinamento,))
-    treino_info = cur.fetchone()
+    # Dados do treinamento, atletas da equipe do treinador e, em um GET, as
+    # presenças já cadastradas: consultas independentes, executadas ao mesmo tempo
+    queries = [
+        (TREINAMENTO_INFO, (cod_treinamento,)),
+        (ATLETAS_TREINAMENTO, (cod_treinamento,)),
+    ]
+    if request.method == 'GET':
+        queries.append((PRESENCAS_TREINAMENTO, (cod_treinamento,)))
+    treino_info, atletas_equipe, *presencas = aiodb.run(*queries)
     if not treino_info:
-        cur.close()
-        conn.close()
         return "Treinamento não encontrado", 404
-    data_treinamento, hora_inicio, hora_final, nome_treinador, cod_equipe = treino_info
+    data_treinamento, hora_inicio, hora_final, nome_treinador, cod_equipe = treino_info[0]
+    conn = get_db()
+    cur = conn.cursor()
 
-    # Buscar atletas da mesma equipe do treinador
-    cur.execute("""
-        SELECT id_atleta, nome_atleta FROM Atleta
-        WHERE cod_equipe = %s
-    """, (cod_equipe,))
-    atletas_equipe = cur.fetchall()
+    # Chamada completa (JSON ou formulário com "chamada"): uma escrita para todos os atletas
+    resultado = None
+    if request.method == 'POST' and (request.is_json or 'chamada' in request.form):
+        try:
+            rows = parse_roster()
+        except InvalidRoster as e:
+            cur.close()
+            return jsonify({'erro': str(e)}), 400
+        resultado = save_roster(conn, 'Presenca_Treinamento', 'cod_treinamento', int(cod_treinamento),
+                                {a[0] for a in atletas_equipe}, rows)
+        if request.is_json:
+            cur.close()
+            return jsonify(resultado)
 
-    # Adicionar presença se POST
-    if request.method == 'POST':
+    # Adicionar presença se POST (um atleta; não altera uma presença já marcada)
+    elif request.method == 'POST':
         id_atleta = request.form.get('id_atleta')
         presenca = request.form.get('presenca') == 'on'
         obs = request.form.get('obs')
-        # Verifica se já existe presença para esse atleta/treinamento
-        cur.execute("""
-            SELECT 1 FROM Presenca_Treinamento WHERE cod_treinamento = %s AND id_atleta = %s
-        """, (cod_treinamento, id_atleta))
-        if not cur.fetchone():
-            cur.execute("""
-                INSERT INTO Presenca_Treinamento (cod_treinamento, id_atleta, presenca, obs)
-                VALUES (%s, %s, %s, %s)
-            """, (cod_treinamento, id_atleta, presenca, obs))
-            conn.commit()
+        database.execute(cur, INSERIR_PRESENCA_TREINAMENTO, (cod_treinamento, id_atleta, presenca, obs))
+        conn.commit()
+        if cur.rowcount:
+            invalidate_lookups('Presenca_Treinamento')
 
-    # Buscar presenças já cadastradas
-    cur.execute("""
-        SELECT pt.id_atleta, a.nome_atleta, pt.presenca, pt.obs
-        FROM Presenca_Treinamento pt
-        JOIN Atleta a ON pt.id_atleta = a.id_atleta
-        WHERE pt.cod_treinamento = %s
-    """, (cod_treinamento,))
-    presencas = cur.fetchall()
+    # Presenças já cadastradas (depois de um POST, relidas com a escrita)
+    if presencas:
+        presencas = presencas[0]
+    else:
+        database.execute(cur, PRESENCAS_TREINAMENTO, (cod_treinamento,))
+        presencas = cur.fetchall()
     cur.close()
-    conn.close()
     return render_template(
         'presenca_treinamento.html',
         cod_treinamento=cod_treinamento,
         presencas=presencas,
+        marcacoes={p[0]: (p[2], p[3]) for p in presencas},
+        resultado=resultado,
         atletas_equipe=atletas_equipe,
         nome_treinador=nome_treinador,
         data_treinamento=data_treinamento,
@@ -755,72 +1265,351 @@ def presenca_treinamento(cod_treinamento):
 
 @app.route('/presenca_partida/<cod_partida>', methods=['GET', 'POST'])
 def presenca_partida(cod_partida):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # Buscar dados da partida (equipes participantes)
-    cur.execute("""
-        SELECT cod_equipe_a, cod_equipe_b FROM Partida WHERE cod_partida = %s
-    """, (cod_partida,))
-    partida = cur.fetchone()
+    # Partida, atletas e nomes das equipes participantes e, em um GET, as
+    # presenças já cadastradas: consultas independentes, executadas ao mesmo tempo
+    queries = [
+        (PARTIDA_EQUIPES, (cod_partida,)),
+        (ATLETAS_PARTIDA, (cod_partida,)),
+        (NOMES_EQUIPES_PARTIDA, (cod_partida,)),
+    ]
+    if request.method == 'GET':
+        queries.append((PRESENCAS_PARTIDA, (cod_partida,)))
+    partida, atletas, equipes, *presencas = aiodb.run(*queries)
     if not partida:
-        cur.close()
-        conn.close()
         return "Partida não encontrada", 404
-    cod_equipe_a, cod_equipe_b = partida
-
-    # Buscar atletas das equipes participantes
-    cur.execute("""
-        SELECT id_atleta, nome_atleta, cod_equipe FROM Atleta
-        WHERE cod_equipe IN (%s, %s)
-    """, (cod_equipe_a, cod_equipe_b))
-    atletas = cur.fetchall()
+    equipe_nomes = dict(equipes)
+    conn = get_db()
+    cur = conn.cursor()
 
-    # Buscar nomes das equipes
-    cur.execute("SELECT cod_equipe, nome_equipe FROM Equipe WHERE cod_equipe IN (%s, %s)", (cod_equipe_a, cod_equipe_b))
-    equipe_nomes = {row[0]: row[1] for row in cur.fetchall()}
+    # Chamada completa (JSON ou formulário com "chamada"): uma escrita para todos os atletas
+    resultado = None
+    if request.method == 'POST' and (request.is_json or 'chamada' in request.form):
+        try:
+            rows = parse_roster()
+        except InvalidRoster as e:
+            cur.close()
+            return jsonify({'erro': str(e)}), 400
+        resultado = save_roster(conn, 'Presenca_Partida', 'cod_partida', int(cod_partida),
+                                {a[0] for a in atletas}, rows)
+        if request.is_json:
+            cur.close()
+            return jsonify(resultado)
 
-    # Adicionar presença se POST
-    if request.method == 'POST':
+    # Adicionar presença se POST (um atleta; não altera uma presença já marcada)
+    elif request.method == 'POST':
         id_atleta = request.form.get('id_atleta')
         presenca = request.form.get('presenca') == 'on'
         obs = request.form.get('obs')
-        # Verifica se já existe presença para esse atleta/partida
-        cur.execute("""
-            SELECT 1 FROM Presenca_Partida WHERE cod_partida = %s AND id_atleta = %s
-        """, (cod_partida, id_atleta))
-        if not cur.fetchone():
-            cur.execute("""
-                INSERT INTO Presenca_Partida (id_atleta, cod_partida, presenca, obs)
-                VALUES (%s, %s, %s, %s)
-            """, (id_atleta, cod_partida, presenca, obs))
-            conn.commit()
+        database.execute(cur, INSERIR_PRESENCA_PARTIDA, (id_atleta, cod_partida, presenca, obs))
+        conn.commit()
+        if cur.rowcount:
+            invalidate_lookups('Presenca_Partida')
 
-    # Buscar presenças já cadastradas
-    cur.execute("""
-        SELECT pp.id_atleta, a.nome_atleta, a.cod_equipe, pp.presenca, pp.obs
-        FROM Presenca_Partida pp
-        JOIN Atleta a ON pp.id_atleta = a.id_atleta
-        WHERE pp.cod_partida = %s
-    """, (cod_partida,))
-    presencas = cur.fetchall()
+    # Presenças já cadastradas (depois de um POST, relidas com a escrita)
+    if presencas:
+        presencas = presencas[0]
+    else:
+        database.execute(cur, PRESENCAS_PARTIDA, (cod_partida,))
+        presencas = cur.fetchall()
     cur.close()
-    conn.close()
     return render_template(
         'presenca_partida.html',
         cod_partida=cod_partida,
         presencas=presencas,
+        marcacoes={p[0]: (p[3], p[4]) for p in presencas},
+        resultado=resultado,
         atletas=atletas,
         equipe_nomes=equipe_nomes
     )
 
+# API JSON (somente leitura) para placares e clientes móveis. As respostas
+# levam ETag e Last-Modified calculados pelos contadores de Versao_Tabela
+# (install_procedures.sql): um cliente que repete a consulta recebe 304 sem
+# que os dados sejam relidos.
+
+# Tabelas lidas por cada view e função da API, além das próprias tabelas
+API_DEPENDENCIES = {
+    "dashboard_equipes": ["Equipe", "Atleta", "Treinador", "Participacao_Campeonato",
+                          "Presenca_Treinamento", "Presenca_Partida"],
+    # Lida de ranking_atletas_materializada, que muda a cada REFRESH
+    "ranking_atletas": ["Visao_Materializada"],
+    "relatorio_presenca_equipe": ["Atleta", "Estatistica_Atleta", "Treinamento", "Partida",
+                                  "Presenca_Treinamento", "Presenca_Partida"],
+    "estatisticas_atleta": ["Atleta", "Equipe", "Estatistica_Atleta"],
+}
+
+class InvalidApiRequest(ValueError):
+    """Parâmetros inválidos em uma requisição da API."""
+
+@app.errorhandler(InvalidApiRequest)
+def invalid_api_request(e):
+    return jsonify({'erro': str(e)}), 400
+
+VERSOES_TABELAS = database.prepared(
+    'versoes_tabelas',
+    """
+    SELECT nome_tabela, SUM(versao)::BIGINT, MAX(alterada_em) FROM Versao_Tabela
+    WHERE nome_tabela = ANY(%s) GROUP BY nome_tabela
+    """
+)
+
+RELATORIO_PRESENCA_EQUIPE = database.prepared(
+    'relatorio_presenca_equipe', "SELECT * FROM relatorio_presenca_equipe(%s::INTEGER, %s::DATE, %s::DATE)"
+)
+
+ESTATISTICAS_ATLETA = database.prepared(
+    'estatisticas_atleta', "SELECT * FROM estatisticas_atleta(%s::INTEGER)"
+)
+
+def api_versions(tables):
+    """(ETag, Last-Modified) da requisição atual a partir das versões de ``tables``.
+
+    Lido antes dos dados: uma escrita concluída entre as duas consultas só
+    faz o próximo pedido do cliente trazer os dados de novo.
+    """
+    cur = get_db().cursor()
+    database.execute(cur, VERSOES_TABELAS, ([table.lower() for table in tables],))
+    versions = sorted(cur.fetchall())
+    cur.close()
+    token = ','.join(f"{name}:{version}" for name, version, _ in versions)
+    etag = hashlib.sha1(f"{request.full_path}|{token}".encode()).hexdigest()[:20]
+    return etag, max((changed for _, _, changed in versions), default=None)
+
+def api_not_modified(etag, last_modified):
+    """Resposta 304 se a cópia do cliente (If-None-Match/If-Modified-Since) ainda vale"""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = (request.if_modified_since is not None and last_modified is not None
+                 and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if not fresh:
+        return None
+    response = Response(status=304)
+    api_cache_headers(response, etag, last_modified)
+    return response
+
+def api_cache_headers(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'   # guarda, mas revalida a cada uso
+    response.vary.add('Accept-Encoding')
+
+def api_json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+def compress_body(body):
+    """(corpo, Content-Encoding) conforme o Accept-Encoding: br se disponível, senão gzip"""
+    if len(body) < app.config['API_COMPRESS_MIN_SIZE']:
+        return body, None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return brotli.compress(body, quality=5), 'br'
+    if accepted['gzip']:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+def api_response(payload, etag, last_modified):
+    body = json.dumps(payload, default=api_json_value, ensure_ascii=False).encode()
+    body, encoding = compress_body(body)
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    api_cache_headers(response, etag, last_modified)
+    return response
+
+def api_fields(available):
+    """Campos pedidos em ``fields`` (separados por vírgula), na ordem pedida; todos se ausente"""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    fields = list(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise InvalidApiRequest(f"Campos desconhecidos: {', '.join(unknown)}. "
+                                f"Disponíveis: {', '.join(available)}")
+    return fields or list(available)
+
+def api_page_size():
+    page_size = request.args.get('limit', PAGE_SIZE_DEFAULT, type=int)
+    return max(1, min(page_size, PAGE_SIZE_MAX))
+
+def api_page(rows, names, fields, page_size, key_idx, endpoint, **url_args):
+    """Corpo de uma página: linhas com os campos pedidos e o cursor da próxima"""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    positions = [names.index(field) for field in fields]
+    payload = {'data': [{field: row[i] for field, i in zip(fields, positions)} for row in rows],
+               'next_cursor': None, 'next': None}
+    if has_more:
+        cursor = encode_cursor([rows[-1][i] for i in key_idx])
+        args = {k: v for k, v in request.args.items() if k != 'after'}
+        payload['next_cursor'] = cursor
+        payload['next'] = url_for(endpoint, **{**args, **url_args, 'after': cursor})
+    return payload
+
+@app.route('/api/<name>')
+def api_table(name):
+    """Linhas de uma tabela, com os filtros e a ordenação da listagem e paginação por cursor.
+
+    ``fields`` escolhe as colunas; ``coluna.nome`` traz o nome do registro
+    referenciado por uma chave estrangeira (como na exportação com raw=1).
+    """
+    if name not in TABLES:
+        return jsonify({'erro': "Tabela não encontrada"}), 404
+    columns = get_table_columns(name)
+    # Campos das FKs: "coluna.rótulo" -> (coluna, tabela, chave, rótulo)
+    fk_fields = {}
+    for col, (ref_table, pk_col, name_col) in FK_FIELDS.get(name, {}).items():
+        for label in FK_LABEL_COLUMNS.get(ref_table, (name_col,)):
+            if label != pk_col:
+                fk_fields[f"{col}.{label}"] = (col, ref_table, pk_col, label)
+    fields = api_fields(columns + list(fk_fields))
+    used_fks = [fk_fields[field] for field in fields if field in fk_fields]
+    
+    etag, last_modified = api_versions([name] + [ref_table for _, ref_table, _, _ in used_fks])
+    not_modified = api_not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    pk_cols = primary_key(name)
+    sort_col, descending = listing_sort(name)
+    page_size = api_page_size()
+    after = decode_cursor(request.args.get('after'), len(pk_cols) + 1)
+    if request.args.get('after') and after is None:
+        raise InvalidApiRequest("Cursor inválido")
+    
+    # Só as colunas pedidas, mais as da ordenação e das FKs pedidas
+    needed = [col for col in columns
+              if col in fields or col == sort_col or col in pk_cols
+              or any(col == fk_col for fk_col, _, _, _ in used_fks)]
+    filters, params = listing_filters(name)
+    order_by, seek, seek_params = keyset_clause(sort_col, pk_cols, descending, after, False)
+    if seek:
+        filters.append(seek)
+    query = f"SELECT {listing_projection(name, needed)} FROM {name}"
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += f" ORDER BY {order_by} LIMIT %s"
+    names = list(needed)
+    if used_fks:
+        selects, joins = [], []
+        for i, (col, ref_table, pk_col, label) in enumerate(used_fks):
+            selects.append(f"fk{i}.{label}")
+            joins.append(f"LEFT JOIN {ref_table} fk{i} ON fk{i}.{pk_col} = p.{col}")
+            names.append(f"{col}.{label}")
+        outer_order = keyset_clause(sort_col, pk_cols, descending, None, False, alias='p')[0]
+        query = (f"SELECT p.*, {', '.join(selects)} FROM ({query}) p "
+                 f"{' '.join(joins)} ORDER BY {outer_order}")
+    cur = get_db().cursor()
+    cur.execute(query, params + seek_params + [page_size + 1])
+    rows = cur.fetchall()
+    cur.close()
+    
+    key_idx = [names.index(sort_col)] + [names.index(col) for col in pk_cols]
+    payload = api_page(rows, names, fields, page_size, key_idx, 'api_table', name=name)
+    return api_response(payload, etag, last_modified)
+
+@app.route('/api/view/<view_name>')
+def api_view(view_name):
+    """Linhas de uma view; o ranking materializado é paginado pela posição"""
+    if view_name not in VIEWS:
+        return jsonify({'erro': "View não encontrada"}), 404
+    matview = MATERIALIZED_VIEWS.get(view_name)
+    columns = get_table_columns(matview or view_name)
+    fields = api_fields(columns)
+    
+    etag, last_modified = api_versions(API_DEPENDENCIES[view_name])
+    not_modified = api_not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    cur = get_db().cursor()
+    if not matview:
+        cur.execute(f"SELECT {', '.join(fields)} FROM {view_name}")
+        payload = {'data': [dict(zip(fields, row)) for row in cur.fetchall()]}
+        cur.close()
+        return api_response(payload, etag, last_modified)
+    
+    page_size = api_page_size()
+    after = decode_cursor(request.args.get('after'), 2)
+    if request.args.get('after') and after is None:
+        raise InvalidApiRequest("Cursor inválido")
+    order_by, seek, seek_params = keyset_clause('posicao', ['posicao'], False, after, False)
+    needed = [col for col in columns if col in fields or col == 'posicao']
+    query = f"SELECT {', '.join(needed)} FROM {matview}"
+    if seek:
+        query += f" WHERE {seek}"
+    cur.execute(query + f" ORDER BY {order_by} LIMIT %s", seek_params + [page_size + 1])
+    rows = cur.fetchall()
+    cur.execute("SELECT pendente, now() - atualizada_em FROM estado_visao_materializada WHERE nome_visao = %s",
+                (matview,))
+    pending, age = cur.fetchone() or (False, None)
+    cur.close()
+    refresh_if_stale(matview, pending, age)
+    
+    position = needed.index('posicao')
+    payload = api_page(rows, needed, fields, page_size, [position, position],
+                       'api_view', view_name=view_name)
+    return api_response(payload, etag, last_modified)
+
+def api_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidApiRequest(f"{name}: data inválida (use AAAA-MM-DD)") from None
+
+@app.route('/api/relatorio_presenca_equipe/<int:cod_equipe>')
+def api_relatorio_presenca_equipe(cod_equipe):
+    """relatorio_presenca_equipe(equipe, data_inicio, data_fim); datas opcionais"""
+    data_inicio, data_fim = api_date_arg('data_inicio'), api_date_arg('data_fim')
+    etag, last_modified = api_versions(API_DEPENDENCIES['relatorio_presenca_equipe'])
+    not_modified = api_not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    cur = get_db().cursor()
+    database.execute(cur, RELATORIO_PRESENCA_EQUIPE, (cod_equipe, data_inicio, data_fim))
+    rows = cur.fetchall()
+    names = [desc[0] for desc in cur.description]
+    cur.close()
+    fields = api_fields(names)
+    positions = [names.index(field) for field in fields]
+    payload = {'data': [{field: row[i] for field, i in zip(fields, positions)} for row in rows]}
+    return api_response(payload, etag, last_modified)
+
+@app.route('/api/estatisticas_atleta/<int:id_atleta>')
+def api_estatisticas_atleta(id_atleta):
+    etag, last_modified = api_versions(API_DEPENDENCIES['estatisticas_atleta'])
+    not_modified = api_not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    cur = get_db().cursor()
+    database.execute(cur, ESTATISTICAS_ATLETA, (id_atleta,))
+    row = cur.fetchone()
+    names = [desc[0] for desc in cur.description]
+    cur.close()
+    if row is None:
+        return jsonify({'erro': "Atleta não encontrado"}), 404
+    fields = api_fields(names)
+    return api_response({'data': {field: row[names.index(field)] for field in fields}},
+                        etag, last_modified)
+
 @app.route('/relatorio_presenca_equipe', methods=['GET', 'POST'])
 def relatorio_presenca_equipe():
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     
     # Buscar todas as equipes para o dropdown
-    cur.execute("SELECT cod_equipe, nome_equipe FROM Equipe ORDER BY nome_equipe")
-    equipes = cur.fetchall()
+    equipes = cache.lookup("Equipe", ("cod_equipe", "nome_equipe"), order_by="nome_equipe")
     
     relatorio_data = []
     equipe_selecionada = None
@@ -834,23 +1623,12 @@ def relatorio_presenca_equipe():
         
         if cod_equipe:
             equipe_selecionada = cod_equipe
-            # Chamar a procedure com conversão explícita de tipos
-            if data_inicio and data_fim:
-                cur.execute("SELECT * FROM relatorio_presenca_equipe(%s::INTEGER, %s::DATE, %s::DATE)", 
-                           (cod_equipe, data_inicio, data_fim))
-            elif data_inicio:
-                cur.execute("SELECT * FROM relatorio_presenca_equipe(%s::INTEGER, %s::DATE, NULL)", 
-                           (cod_equipe, data_inicio))
-            elif data_fim:
-                cur.execute("SELECT * FROM relatorio_presenca_equipe(%s::INTEGER, NULL, %s::DATE)", 
-                           (cod_equipe, data_fim))
-            else:
-                cur.execute("SELECT * FROM relatorio_presenca_equipe(%s::INTEGER)", (cod_equipe,))
+            # Chamar a procedure com conversão explícita de tipos (data vazia = sem limite)
+            database.execute(cur, RELATORIO_PRESENCA_EQUIPE, (cod_equipe, data_inicio, data_fim))
             
             relatorio_data = cur.fetchall()
     
     cur.close()
-    conn.close()
     
     return render_template('relatorio_presenca_equipe.html', 
                          equipes=equipes, 
@@ -861,12 +1639,12 @@ def relatorio_presenca_equipe():
 
 @app.route('/estatisticas_atleta', methods=['GET', 'POST'])
 def estatisticas_atleta():
-    conn = get_db_connection()
+    conn = get_db()
     cur = conn.cursor()
     
     # Buscar todos os atletas para o dropdown
-    cur.execute("SELECT id_atleta, nome_atleta FROM Atleta WHERE status_ativo = TRUE ORDER BY nome_atleta")
-    atletas = cur.fetchall()
+    atletas = cache.lookup("Atleta", ("id_atleta", "nome_atleta"),
+                           where="status_ativo = TRUE", order_by="nome_atleta")
     
     estatisticas = None
     atleta_selecionado = None
@@ -876,30 +1654,36 @@ def estatisticas_atleta():
         
         if id_atleta:
             atleta_selecionado = id_atleta
-            # Chamar a procedure com conversão explícita de tipo
-            cur.execute("SELECT * FROM estatisticas_atleta(%s::INTEGER)", (id_atleta,))
-            estatisticas = cur.fetchone()
+            # Chamar a procedure com conversão explícita de tipo (lê uma linha de Estatistica_Atleta)
+            database.execute(cur, ESTATISTICAS_ATLETA, (id_atleta,))
+            row = cur.fetchone()
+            if row:
+                estatisticas = dict(zip([desc[0] for desc in cur.description], row))
     
     cur.close()
-    conn.close()
     
     return render_template('estatisticas_atleta.html', 
                          atletas=atletas, 
                          estatisticas=estatisticas,
                          atleta_selecionado=atleta_selecionado)
 
+# Views materializadas não entram no cache: a página mostra se o ranking está
+# pendente e dispara a atualização
 @app.route('/view/<view_name>')
+@cache.cached_page(lambda view_name: view_name if view_name in VIEWS and view_name not in MATERIALIZED_VIEWS else None)
 def show_view(view_name):
     if view_name not in VIEWS:
         return "View não encontrada", 404
     
-    conn = get_db_connection()
+    if view_name in MATERIALIZED_VIEWS:
+        return show_materialized_view(view_name, MATERIALIZED_VIEWS[view_name])
+    
+    conn = get_db()
     cur = conn.cursor()
     cur.execute(f"SELECT * FROM {view_name}")
     rows = cur.fetchall()
     colnames = [desc[0] for desc in cur.description]
     cur.close()
-    conn.close()
     
     return render_template('view_table.html', 
                          view_name=view_name,
@@ -907,36 +1691,138 @@ def show_view(view_name):
                          colnames=colnames,
                          display_name=DISPLAY_NAMES.get(view_name, view_name))
 
-def format_blob_data(rows, colnames, table):
-    """Formata dados BLOB para exibição mais amigável"""
-    if table != 'Documento':
-        return rows
+def show_materialized_view(view_name, matview):
+    """Página de uma view materializada, paginada pela posição no ranking"""
+    page_size = request.args.get('page_size', PAGE_SIZE_DEFAULT, type=int)
+    page_size = max(1, min(page_size, PAGE_SIZE_MAX))
+    after = decode_cursor(request.args.get('after'), 2)
+    before = decode_cursor(request.args.get('before'), 2) if after is None else None
+    order_by, seek, seek_params = keyset_clause(
+        'posicao', ['posicao'], False, after or before, before is not None
+    )
     
-    # Encontrar índice da coluna arquivo_conteudo
-    blob_col_index = None
-    try:
-        blob_col_index = colnames.index('arquivo_conteudo')
-    except ValueError:
-        return rows  # Coluna não existe
+    conn = get_db()
+    cur = conn.cursor()
+    query = f"SELECT * FROM {matview}"
+    if seek:
+        query += f" WHERE {seek}"
+    cur.execute(query + f" ORDER BY {order_by} LIMIT %s", seek_params + [page_size + 1])
+    rows = cur.fetchall()
+    colnames = [desc[0] for desc in cur.description]
+    cur.execute(
+        "SELECT atualizada_em, pendente, now() - atualizada_em FROM estado_visao_materializada WHERE nome_visao = %s",
+        (matview,)
+    )
+    refreshed_at, pending, age = cur.fetchone() or (None, False, None)
+    cur.close()
     
-    # Processar cada linha
-    formatted_rows = []
-    for row in rows:
-        row_list = list(row)
-        
-        # Formatar coluna BLOB
-        if blob_col_index < len(row_list) and row_list[blob_col_index] is not None:
-            blob_data = row_list[blob_col_index]
-            # Converter para indicador amigável
-            if isinstance(blob_data, (bytes, memoryview)):
-                size = len(blob_data)
-                row_list[blob_col_index] = f"BLOB ({size:,} bytes)"
-            else:
-                row_list[blob_col_index] = "BLOB (dados binários)"
-        
-        formatted_rows.append(tuple(row_list))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+    
+    refresh_if_stale(matview, pending, age)
     
-    return formatted_rows
+    base_args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    prev_url = next_url = None
+    if rows and has_prev:
+        prev_url = url_for('show_view', view_name=view_name, **base_args,
+                           before=encode_cursor([rows[0][0], rows[0][0]]))
+    if rows and has_next:
+        next_url = url_for('show_view', view_name=view_name, **base_args,
+                           after=encode_cursor([rows[-1][0], rows[-1][0]]))
+    page_size_urls = [
+        (size, url_for('show_view', view_name=view_name, **{**base_args, 'page_size': size}))
+        for size in PAGE_SIZE_OPTIONS
+    ]
+    
+    return render_template('view_table.html',
+                         view_name=view_name,
+                         rows=rows,
+                         colnames=colnames,
+                         display_name=DISPLAY_NAMES.get(view_name, view_name),
+                         paginated=True,
+                         page_size=page_size,
+                         prev_url=prev_url,
+                         next_url=next_url,
+                         page_size_urls=page_size_urls,
+                         refreshed_at=refreshed_at,
+                         pending=pending)
+
+def refresh_materialized_view(conn, matview):
+    """REFRESH MATERIALIZED VIEW CONCURRENTLY (não bloqueia leituras).
+
+    Um advisory lock garante uma única atualização por vez entre todos os
+    processos; retorna False se outra já estiver em andamento.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (matview,))
+    locked = cur.fetchone()[0]
+    conn.commit()
+    if not locked:
+        cur.close()
+        return False
+    try:
+        # Versões das tabelas de origem lidas antes do REFRESH: alterações
+        # confirmadas durante a atualização deixam a view pendente de novo
+        cur.execute("SELECT versao_atual FROM estado_visao_materializada WHERE nome_visao = %s", (matview,))
+        version = cur.fetchone()[0]
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {matview}")
+        cur.execute("UPDATE Visao_Materializada SET versao_fontes = %s, atualizada_em = now() WHERE nome_visao = %s",
+                    (version, matview))
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (matview,))
+        conn.commit()
+        cur.close()
+    return True
+
+# No máximo uma atualização em segundo plano por processo: o REFRESH demora e,
+# enquanto isso, cada requisição ainda vê o ranking pendente
+_refresh_running = threading.Lock()
+
+def refresh_if_stale(matview, pending, age):
+    """Ranking desatualizado: atualiza em segundo plano, sem atrasar a resposta"""
+    if pending and age is not None and age.total_seconds() > app.config['MATERIALIZED_VIEW_MAX_AGE']:
+        if not _refresh_running.acquire(blocking=False):
+            return
+        try:
+            pool = database.get_pool()
+            threading.Thread(target=refresh_in_background, args=(pool, matview), daemon=True).start()
+        except Exception:
+            _refresh_running.release()
+            raise
+
+def refresh_in_background(pool, matview):
+    conn = None
+    try:
+        conn = pool.getconn()
+        refresh_materialized_view(conn, matview)
+    except (psycopg2.Error, database.PoolTimeout) as e:
+        app.logger.warning("Falha ao atualizar %s: %s", matview, e)
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
+        _refresh_running.release()
+
+@app.route('/database_status')
+def database_status():
+    """Métricas do pool de conexões, do catálogo do schema e dos caches de consultas e de páginas"""
+    page_cache = cache.get_page_cache()
+    catalog.get_catalog()
+    return render_template('database_status.html', pool_stats=database.get_pool().stats(),
+                           catalog_stats=catalog.stats(),
+                           cache_stats=cache.get_cache().stats(),
+                           row_cache_stats=cache.get_row_cache().stats(),
+                           cache_status=cache.status(),
+                           page_cache_stats=page_cache.stats() if page_cache else None,
+                           page_cache_backend=app.config['PAGE_CACHE'])
 
 @app.route('/<table>/delete/<pk>', methods=['POST'])
 def delete_record(table, pk):
@@ -944,59 +1830,27 @@ def delete_record(table, pk):
     if table not in TABLES:
         return "Tabela não encontrada", 404
     
-    # Mapeamento das chaves primárias para cada tabela
-    primary_keys = {
-        "Modalidade": "cod_modalidade",
-        "Local": "cod_local", 
-        "Evento": "cod_evento",
-        "Campeonato": "cod_campeonato",
-        "Equipe": "cod_equipe",
-        "Partida": "cod_partida",
-        "Atleta": "id_atleta",
-        "Documento": "cod_documento",
-        "Treinador": "id_treinador",
-        "Treinamento": "cod_treinamento"
-    }
-    
-    # Mapeamento para tabelas com chaves compostas
-    composite_keys = {
-        "Participacao_Campeonato": ["cod_equipe", "cod_campeonato"],
-        "Presenca_Partida": ["id_atleta", "cod_partida"],
-        "Presenca_Treinamento": ["cod_treinamento", "id_atleta"]
-    }
-    
+    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        # Para chaves compostas, pk vem no formato "valor1_valor2" (row_key)
+        pk_values = parse_row_key(table, pk)
+        if pk_values is None:
+            return "Chave primária inválida para esta tabela", 400
         
-        if table in composite_keys:
-            # Para chaves compostas, pk deve ser no formato "valor1_valor2"
-            pk_values = pk.split('_')
-            if len(pk_values) != len(composite_keys[table]):
-                return "Chave primária inválida para esta tabela", 400
-            
-            where_clause = " AND ".join([f"{key} = %s" for key in composite_keys[table]])
-            query = f"DELETE FROM {table} WHERE {where_clause}"
-            cur.execute(query, pk_values)
-        else:
-            # Para chaves simples
-            if table not in primary_keys:
-                return "Chave primária não definida para esta tabela", 400
-            
-            pk_column = primary_keys[table]
-            query = f"DELETE FROM {table} WHERE {pk_column} = %s"
-            cur.execute(query, (pk,))
+        conn = get_db()
+        cur = conn.cursor()
+        where_clause = " AND ".join([f"{key} = %s" for key in primary_key(table)])
+        cur.execute(f"DELETE FROM {table} WHERE {where_clause}", pk_values)
         
         conn.commit()
         cur.close()
-        conn.close()
+        invalidate_lookups(table)
         
         return redirect(url_for('show_table', table=table))
         
     except psycopg2.Error as e:
         if conn:
             conn.rollback()
-            conn.close()
         
         # Tratar erros específicos
         if "foreign key constraint" in str(e).lower():
@@ -1010,5 +1864,82 @@ def delete_record(table, pk):
     except Exception as e:
         return f"Erro inesperado: {str(e)}", 500
 
+@app.cli.command('migrate-documents')
+@click.option('--batch-size', default=50, show_default=True, help='Documentos por transação')
+def migrate_documents_command(batch_size):
+    """Move os PDFs guardados como BLOB para o armazenamento em disco"""
+    storage = get_storage()
+    if storage is None:
+        raise click.ClickException("DOCUMENT_STORAGE está configurado como 'database'")
+    migrate_blobs(get_db(), storage, batch_size, log=click.echo)
+
+@app.cli.command('gc-documents')
+@click.option('--grace', default=3600, show_default=True, help='Idade mínima (segundos) dos arquivos removidos')
+def gc_documents_command(grace):
+    """Remove do disco os PDFs que nenhum documento referencia"""
+    storage = get_storage()
+    if storage is None:
+        raise click.ClickException("DOCUMENT_STORAGE está configurado como 'database'")
+    collect_garbage(get_db(), storage, grace, log=click.echo)
+
+@app.cli.command('import-csv')
+@click.argument('table', type=click.Choice(sorted(IMPORT_KEYS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='CSV com as linhas rejeitadas e os motivos')
+@click.option('--delimiter', default=',', show_default=True, help='Separador de colunas')
+@click.option('--batch-size', default=1000, show_default=True, help='Linhas validadas por lote')
+@click.option('--dry-run', is_flag=True, help='Valida e mostra o resultado sem gravar')
+def import_csv_command(table, path, errors_path, delimiter, batch_size, dry_run):
+    """Importa um CSV (cabeçalho com os nomes das colunas) para TABLE.
+
+    Chaves estrangeiras aceitam o nome (nome_equipe, nome_local...) ou o código.
+    """
+    if path == '-':
+        source = io.TextIOWrapper(click.get_binary_stream('stdin'), encoding='utf-8-sig', newline='')
+    else:
+        source = open(path, encoding='utf-8-sig', newline='')
+    report = open(errors_path, 'w', encoding='utf-8', newline='') if errors_path else None
+    try:
+        stats = import_csv(get_db(), table, source, FK_FIELDS.get(table, {}), IMPORT_KEYS[table] or primary_key(table),
+                           report=report, delimiter=delimiter, batch_size=batch_size, dry_run=dry_run)
+    except InvalidImport as e:
+        raise click.ClickException(str(e))
+    finally:
+        source.close()
+        if report:
+            report.close()
+    if not dry_run:
+        invalidate_lookups(table)
+    click.echo(f"{stats['lidas']} linhas lidas: {stats['inseridas']} inseridas, "
+               f"{stats['atualizadas']} atualizadas, {stats['rejeitadas']} rejeitadas"
+               + (" (simulação, nada foi gravado)" if dry_run else ""))
+    if stats['rejeitadas'] and not errors_path:
+        click.echo("Use --errors para gravar as linhas rejeitadas e os motivos")
+
+@app.cli.command('refresh-ranking')
+@click.option('--interval', default=0, show_default=True,
+              help='Segundos entre verificações (0 = atualiza uma vez e sai)')
+def refresh_ranking_command(interval):
+    """Atualiza as views materializadas (o ranking de atletas)"""
+    conn = get_db()
+    while True:
+        for matview in MATERIALIZED_VIEWS.values():
+            cur = conn.cursor()
+            cur.execute("SELECT pendente FROM estado_visao_materializada WHERE nome_visao = %s", (matview,))
+            pending = cur.fetchone()
+            cur.close()
+            conn.commit()
+            # No modo contínuo só atualiza o que foi alterado
+            if interval and pending and not pending[0]:
+                continue
+            if refresh_materialized_view(conn, matview):
+                click.echo(f"{matview} atualizada")
+            else:
+                click.echo(f"{matview} já está sendo atualizada por outro processo")
+        if not interval:
+            break
+        time.sleep(interval)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,16 @@
+"""Ponto de entrada ASGI do app.
+
+O Flask continua síncrono; o adaptador WsgiToAsgi executa cada requisição
+em uma thread, e o servidor ASGI cuida das conexões HTTP no loop de eventos.
+Clientes lentos (upload de PDF, redes móveis) ficam no loop, sem prender uma
+thread ou processo enquanto enviam ou recebem os dados; dentro da rota, as
+consultas independentes rodam ao mesmo tempo (aiodb.run).
+
+    pip install asgiref uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+application = WsgiToAsgi(app)
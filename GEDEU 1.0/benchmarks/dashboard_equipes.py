@@ -0,0 +1,111 @@
+"""Benchmark da view dashboard_equipes: JOIN direto x agregados por equipe.
+
+Cria as tabelas do GEDEU em um schema temporário, gera dados sintéticos com
+cardinalidades realistas e mede a versão antiga da view (todas as tabelas em
+um único JOIN) contra a atual de install_views.sql. Tudo roda em uma
+transação desfeita no final: o banco não é alterado.
+
+Uso (a partir de "GEDEU 1.0/"):
+    python benchmarks/dashboard_equipes.py --equipes 20 --atletas 20 --repeat 5
+"""
+import argparse
+import re
+import statistics
+import time
+
+import psycopg2
+
+from synthetic import DB_CONFIG, add_arguments, populate, read_sql
+
+SCHEMA = 'benchmark_dashboard'
+
+# Versão anterior da view: um único JOIN de todas as tabelas relacionadas
+OLD_QUERY = """
+SELECT
+    e.cod_equipe,
+    e.nome_equipe,
+    e.ano_fundacao,
+    e.status_ativa,
+    COUNT(DISTINCT a.id_atleta) as total_atletas,
+    COUNT(DISTINCT CASE WHEN t.status_ativo = true THEN t.id_treinador END) as total_treinadores,
+    COUNT(DISTINCT pc.cod_campeonato) as total_campeonatos,
+    COUNT(DISTINCT pt.cod_treinamento) as total_treinamentos,
+    COALESCE(
+        ROUND(
+            (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 /
+             NULLIF(COUNT(pt.presenca), 0)), 2
+        ), 0
+    ) as percentual_presenca_treinamentos,
+    COUNT(DISTINCT pp.cod_partida) as total_partidas,
+    COALESCE(
+        ROUND(
+            (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 /
+             NULLIF(COUNT(pp.presenca), 0)), 2
+        ), 0
+    ) as percentual_presenca_partidas
+FROM Equipe e
+LEFT JOIN Atleta a ON e.cod_equipe = a.cod_equipe
+LEFT JOIN Treinador t ON e.cod_equipe = t.cod_equipe
+LEFT JOIN Participacao_Campeonato pc ON e.cod_equipe = pc.cod_equipe
+LEFT JOIN Presenca_Treinamento pt ON a.id_atleta = pt.id_atleta
+LEFT JOIN Presenca_Partida pp ON a.id_atleta = pp.id_atleta
+GROUP BY e.cod_equipe, e.nome_equipe, e.ano_fundacao, e.status_ativa
+ORDER BY e.cod_equipe
+"""
+
+
+def current_view_query():
+    """SELECT da view dashboard_equipes em install_views.sql"""
+    match = re.search(r"CREATE OR REPLACE VIEW dashboard_equipes AS(.*?);",
+                      read_sql('install_views.sql'), re.S)
+    return match.group(1)
+
+
+def timed(cur, query, repeat):
+    """Resultado e tempos (em ms) de ``repeat`` execuções da consulta"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(query)
+        rows = cur.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    return rows, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sem-antiga', action='store_true', help="não executa a versão antiga")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET LOCAL search_path TO {SCHEMA}")
+        cur.execute(read_sql('GEDEU.sql'))
+        populate(cur, args)
+        for table in ('Atleta', 'Presenca_Treinamento', 'Presenca_Partida'):
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            print(f"{table}: {cur.fetchone()[0]} linhas")
+
+        new_rows, new_times = timed(cur, current_view_query(), args.repeat)
+        print(f"dashboard_equipes (agregados):  mediana {statistics.median(new_times):9.1f} ms")
+        if not args.sem_antiga:
+            old_rows, old_times = timed(cur, OLD_QUERY, args.repeat)
+            print(f"dashboard_equipes (JOIN direto): mediana {statistics.median(old_times):9.1f} ms")
+            # As contagens devem coincidir; só os percentuais mudam (eram distorcidos)
+            counts = [row[:8] + row[9:10] for row in new_rows]
+            old_counts = [row[:8] + row[9:10] for row in old_rows]
+            print("contagens iguais:", counts == old_counts)
+            changed = sum(1 for new, old in zip(new_rows, old_rows)
+                          if (new[8], new[10]) != (old[8], old[10]))
+            print(f"equipes com percentual corrigido: {changed} de {len(new_rows)}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
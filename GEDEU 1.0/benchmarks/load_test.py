@@ -0,0 +1,321 @@
+"""Teste de carga: clientes HTTP simultâneos contra o servidor de produção.
+
+Gera um banco <banco>_carga com os dados de synthetic.py (ou reaproveita o
+de uma execução anterior com --reusar, se os tamanhos e a semente forem os
+mesmos), sobe serve.py apontando para ele e dispara --clientes clientes
+simultâneos durante --duracao segundos. Cada cliente sorteia as rotas de
+ROUTES (pelos pesos) com uma semente derivada de --seed.
+
+Ao final mostra, por rota e no total, as latências (p50/p95/p99), a vazão e
+as consultas SQL por requisição (contadas no próprio processo, com o test
+client, antes da carga), e grava tudo em JSON (--saida). Com --comparar, o
+resultado é comparado a um JSON anterior (outro commit, outra configuração).
+
+Uso (a partir de "GEDEU 1.0/"):
+    python benchmarks/load_test.py --escala producao --reusar --manter
+    python benchmarks/load_test.py --escala producao --reusar --manter --comparar benchmarks/resultados/antes.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+import psycopg2
+from psycopg2 import extensions
+
+from synthetic import (ROOT, DB_CONFIG, add_arguments, create_database, dataset_params,
+                       drop_database, existing_database)
+
+# Rotas sorteadas pelos clientes: (nome, peso, requisição). A requisição
+# recebe o gerador aleatório do cliente e os tamanhos do banco e retorna
+# (método, URL, formulário).
+ROUTES = [
+    ('listagem_atletas', 3,
+     lambda rng, n: ('GET', f"/Atleta?equipe={rng.randint(1, n['equipes'])}", None)),
+    ('listagem_presencas', 2,
+     lambda rng, n: ('GET', "/Presenca_Treinamento", None)),
+    ('listagem_partidas', 1,
+     lambda rng, n: ('GET', "/Partida?sort=data_partida&dir=desc", None)),
+    ('dashboard_equipes', 1,
+     lambda rng, n: ('GET', "/view/dashboard_equipes", None)),
+    ('ranking_atletas', 1,
+     lambda rng, n: ('GET', "/view/ranking_atletas", None)),
+    ('presenca_partida', 3,
+     lambda rng, n: ('GET', f"/presenca_partida/{rng.randint(1, n['equipes'] * n['partidas'])}", None)),
+    ('presenca_treinamento', 3,
+     lambda rng, n: ('GET', f"/presenca_treinamento/{rng.randint(1, n['equipes'] * n['treinamentos'])}", None)),
+    ('relatorio_presenca_equipe', 1,
+     lambda rng, n: ('POST', "/relatorio_presenca_equipe",
+                     {'cod_equipe': rng.randint(1, n['equipes']),
+                      'data_inicio': '2025-03-01', 'data_fim': '2025-03-31'})),
+    ('estatisticas_atleta', 1,
+     lambda rng, n: ('POST', "/estatisticas_atleta",
+                     {'id_atleta': rng.randint(1, n['equipes'] * n['atletas'])})),
+    ('api_atletas', 2,
+     lambda rng, n: ('GET', f"/api/Atleta?equipe={rng.randint(1, n['equipes'])}"
+                            "&fields=nome_atleta,cod_equipe.nome_equipe", None)),
+]
+
+PAGE_CACHES = {'none': None, 'memory': 'memory', 'disk': 'disk'}
+
+TABLES = ('Equipe', 'Atleta', 'Treinador', 'Treinamento', 'Partida', 'Documento',
+          'Presenca_Treinamento', 'Presenca_Partida')
+
+statements = []
+
+
+class CountingCursor(extensions.cursor):
+    """Cursor que conta os comandos enviados (consultas por requisição)."""
+
+    def execute(self, query, vars=None):
+        statements.append(None)
+        return super().execute(query, vars)
+
+
+def request_for(route, rng, sizes):
+    method, url, form = route[2](rng, sizes)
+    return method, url, {key: str(value) for key, value in form.items()} if form else None
+
+
+def queries_per_request(dbname, routes, sizes, args):
+    """Média de comandos SQL por requisição de cada rota, com o app no próprio processo"""
+    DB_CONFIG['database'] = dbname
+    DB_CONFIG['cursor_factory'] = CountingCursor
+    import app as gedeu
+    import aiodb
+    import database
+    gedeu.app.config['PAGE_CACHE'] = PAGE_CACHES[args.cache]
+    client = gedeu.app.test_client()
+    rng = random.Random(args.seed)
+    counts = {}
+    for route in routes:
+        before = len(statements)
+        for _ in range(args.amostra):
+            method, url, form = request_for(route, rng, sizes)
+            response = client.open(url, method=method, data=form)
+            if response.status_code != 200:
+                raise SystemExit(f"{method} {url}: HTTP {response.status_code}")
+        counts[route[0]] = (len(statements) - before) / args.amostra
+    database.close_pool()
+    aiodb.close_pool()
+    del DB_CONFIG['cursor_factory']
+    return counts
+
+
+def table_sizes(dbname):
+    conn = psycopg2.connect(**{**DB_CONFIG, 'database': dbname})
+    cur = conn.cursor()
+    sizes = {}
+    for table in TABLES:
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        sizes[table] = cur.fetchone()[0]
+    conn.close()
+    return sizes
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(dbname, port, args, log):
+    env = dict(os.environ, GEDEU_DB_NAME=dbname, GEDEU_PAGE_CACHE=json.dumps(PAGE_CACHES[args.cache]))
+    command = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--threads', str(args.threads)]
+    if args.asgi:
+        command.append('--asgi')
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"serve.py terminou com código {server.returncode} (ver {log.name})")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"serve.py não respondeu em 30 s (ver {log.name})")
+
+
+def run_client(number, port, routes, sizes, args, warm_until, deadline, results):
+    """Um cliente com conexão keep-alive; grava (rota, segundos, status, acerto do cache)"""
+    rng = random.Random(f"{args.seed}-{number}")
+    weights = [route[1] for route in routes]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        route = rng.choices(routes, weights)[0]
+        method, url, form = request_for(route, rng, sizes)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        try:
+            conn.request(method, url, body=urlencode(form) if form else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status, hit = response.status, response.getheader('X-Cache') == 'HIT'
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            status, hit = None, False
+        if start >= warm_until:
+            results.append((route[0], time.perf_counter() - start, status, hit))
+    conn.close()
+
+
+def percentile(values, fraction):
+    """Percentil pelo posto mais próximo (``values`` ordenados)"""
+    return values[max(0, math.ceil(len(values) * fraction) - 1)] if values else None
+
+
+def summarize(samples, duration, queries=None):
+    times = sorted(elapsed * 1000 for _, elapsed, _, _ in samples)
+    summary = {
+        'requisicoes': len(samples),
+        'erros': sum(1 for _, _, status, _ in samples if status is None or status >= 400),
+        'acertos_cache': sum(1 for _, _, _, hit in samples if hit),
+        'req_por_s': round(len(samples) / duration, 1),
+        'media_ms': round(sum(times) / len(times), 2) if times else None,
+    }
+    for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        value = percentile(times, fraction)
+        summary[name] = round(value, 2) if value is not None else None
+    if queries is not None:
+        summary['consultas_por_req'] = queries
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(result, previous=None):
+    header = f"{'rota':28} {'req':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL/req':>8} {'erros':>6}"
+    print(header)
+    rows = list(result['rotas'].items()) + [('TOTAL', result['total'])]
+    for name, stats in rows:
+        queries = stats.get('consultas_por_req')
+        print(f"{name:28} {stats['requisicoes']:7} {stats['req_por_s']:8.1f} {stats['p50_ms'] or 0:8.1f} "
+              f"{stats['p95_ms'] or 0:8.1f} {stats['p99_ms'] or 0:8.1f} "
+              f"{'' if queries is None else f'{queries:.1f}':>8} {stats['erros']:6}")
+        if previous is not None:
+            before = previous['total'] if name == 'TOTAL' else previous['rotas'].get(name)
+            if before and before.get('p95_ms') and stats['p95_ms']:
+                change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+                print(f"{'  antes (' + str(previous.get('commit')) + ')':28} {before['requisicoes']:7} "
+                      f"{before['req_por_s']:8.1f} {before['p50_ms']:8.1f} {before['p95_ms']:8.1f} "
+                      f"{before['p99_ms']:8.1f}   p95 {change:+.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--clientes', type=int, default=16, help="clientes simultâneos")
+    parser.add_argument('--duracao', type=float, default=30, help="segundos medidos")
+    parser.add_argument('--aquecimento', type=float, default=5, help="segundos de carga antes da medição")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processos do serve.py")
+    parser.add_argument('--threads', type=int, default=4, help="threads por processo do serve.py")
+    parser.add_argument('--asgi', action='store_true', help="serve.py --asgi (workers uvicorn)")
+    parser.add_argument('--cache', choices=PAGE_CACHES, default='none',
+                        help="PAGE_CACHE do servidor (padrão: none, mede as consultas)")
+    parser.add_argument('--rotas', help="nomes das rotas, separados por vírgula (padrão: todas)")
+    parser.add_argument('--amostra', type=int, default=10,
+                        help="requisições por rota na contagem de consultas")
+    parser.add_argument('--reusar', action='store_true',
+                        help="usa o banco de uma execução anterior, se gerado com os mesmos parâmetros")
+    parser.add_argument('--manter', action='store_true', help="não remove o banco ao final")
+    parser.add_argument('--saida', help="arquivo JSON do resultado (padrão: benchmarks/resultados/)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    routes = ROUTES
+    if args.rotas:
+        names = args.rotas.split(',')
+        routes = [route for route in ROUTES if route[0] in names]
+        if len(routes) != len(names):
+            parser.error(f"rotas: escolha entre {', '.join(route[0] for route in ROUTES)}")
+    previous = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    dbname = f"{DB_CONFIG['database']}_carga"
+    params = dataset_params(args)
+    if args.reusar and existing_database(dbname, args):
+        print(f"Reaproveitando {dbname}")
+    else:
+        print(f"Gerando {dbname}...")
+        create_database(dbname, args)
+    server = None
+    try:
+        rows = table_sizes(dbname)
+        print(', '.join(f"{table}: {count}" for table, count in rows.items()))
+        queries = queries_per_request(dbname, routes, params, args)
+
+        log_path = os.path.join(ROOT, 'instance', 'load_test_server.log')
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, 'w') as log:
+            port = free_port()
+            server = start_server(dbname, port, args, log)
+            results = []
+            warm_until = time.perf_counter() + args.aquecimento
+            deadline = warm_until + args.duracao
+            clients = [threading.Thread(target=run_client,
+                                        args=(number, port, routes, params, args, warm_until, deadline, results))
+                       for number in range(args.clientes)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if not args.manter:
+            drop_database(dbname)
+
+    result = {
+        'commit': git_revision(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'dados': {**params, 'linhas': rows},
+        'servidor': {'workers': args.workers, 'threads': args.threads, 'asgi': args.asgi, 'cache': args.cache},
+        'clientes': args.clientes,
+        'duracao': args.duracao,
+        'rotas': {route[0]: summarize([r for r in results if r[0] == route[0]], args.duracao, queries[route[0]])
+                  for route in routes},
+    }
+    # Consultas por requisição no total: média ponderada pelo número de requisições de cada rota
+    total_queries = sum(stats['consultas_por_req'] * stats['requisicoes'] for stats in result['rotas'].values())
+    result['total'] = summarize(results, args.duracao, round(total_queries / len(results), 2) if results else None)
+    print_summary(result, previous)
+
+    output = args.saida or os.path.join(
+        ROOT, 'benchmarks', 'resultados',
+        f"carga-{result['commit'] or 'sem-git'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultado em {output}")
+    sys.exit(1 if result['total']['erros'] else 0)
+
+
+if __name__ == '__main__':
+    main()
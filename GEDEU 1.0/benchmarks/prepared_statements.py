@@ -0,0 +1,160 @@
+"""Benchmark dos comandos preparados: cur.execute do SQL x PREPARE/EXECUTE.
+
+Gera um banco <banco>_preparados com os dados de synthetic.py (ou
+reaproveita o de uma execução anterior com --reusar) e, para cada comando
+de leitura registrado pelo app com database.prepared(), executa as mesmas
+--chamadas chamadas (parâmetros sorteados com --seed) de duas formas:
+
+- ad hoc: ``cur.execute(sql, parâmetros)``, como antes do registro;
+- preparado: um PREPARE na conexão e depois ``EXECUTE nome (parâmetros)``.
+
+Mostra o tempo por chamada visto pelo cliente (mediana de --repeat rodadas)
+e, com EXPLAIN ANALYZE sobre --explicar chamadas, o tempo médio de
+planejamento e de execução no servidor em cada forma.
+
+Uso (a partir de "GEDEU 1.0/"):
+    python benchmarks/prepared_statements.py --escala producao --reusar --manter
+    python benchmarks/prepared_statements.py --comandos presencas_partida,documento_meta
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import psycopg2
+
+from synthetic import DB_CONFIG, add_arguments, create_database, drop_database, existing_database
+
+import app as gedeu  # noqa: F401  (registra os comandos preparados)
+from database import PREPARED_STATEMENTS
+
+# Parâmetros de cada comando: recebem o gerador aleatório e o maior código de
+# cada tabela (LIMITS). Comandos sem entrada aqui (escritas) ficam de fora.
+SAMPLES = {
+    'treinamento_info': lambda rng, n: (rng.randint(1, n['treinamento']),),
+    'atletas_treinamento': lambda rng, n: (rng.randint(1, n['treinamento']),),
+    'presencas_treinamento': lambda rng, n: (rng.randint(1, n['treinamento']),),
+    'partida_equipes': lambda rng, n: (rng.randint(1, n['partida']),),
+    'atletas_partida': lambda rng, n: (rng.randint(1, n['partida']),),
+    'nomes_equipes_partida': lambda rng, n: (rng.randint(1, n['partida']),),
+    'presencas_partida': lambda rng, n: (rng.randint(1, n['partida']),),
+    'documento_meta': lambda rng, n: (rng.randint(1, n['documento']),),
+    'documento_blob_chunk': lambda rng, n: (1, 1024, rng.randint(1, n['documento'])),
+    'versoes_tabelas': lambda rng, n: (['atleta', 'equipe'],),
+    'estatisticas_atleta': lambda rng, n: (rng.randint(1, n['atleta']),),
+    'relatorio_presenca_equipe': lambda rng, n: (rng.randint(1, n['equipe']), '2025-03-01', '2025-03-31'),
+}
+
+LIMITS = {
+    'equipe': "SELECT max(cod_equipe) FROM Equipe",
+    'atleta': "SELECT max(id_atleta) FROM Atleta",
+    'treinamento': "SELECT max(cod_treinamento) FROM Treinamento",
+    'partida': "SELECT max(cod_partida) FROM Partida",
+    'documento': "SELECT max(cod_documento) FROM Documento",
+}
+
+
+def limits(cur):
+    found = {}
+    for name, sql in LIMITS.items():
+        cur.execute(sql)
+        found[name] = cur.fetchone()[0] or 1
+    return found
+
+
+def run_calls(cur, sql, calls):
+    """Segundos por chamada de ``sql`` com cada tupla de ``calls`` (lendo as linhas)"""
+    start = time.perf_counter()
+    for params in calls:
+        cur.execute(sql, params)
+        cur.fetchall()
+    return (time.perf_counter() - start) / len(calls)
+
+
+def explain_times(cur, sql, calls):
+    """(planejamento, execução) médios em milissegundos, pelo EXPLAIN ANALYZE"""
+    planning, execution = [], []
+    for params in calls:
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        planning.append(plan[0].get('Planning Time', 0.0))
+        execution.append(plan[0]['Execution Time'])
+    return statistics.mean(planning), statistics.mean(execution)
+
+
+def benchmark(conn, statement, calls, args):
+    cur = conn.cursor()
+    cur.execute(statement.prepare_sql)
+    adhoc, prepared = [], []
+    for _ in range(args.repeat):
+        adhoc.append(run_calls(cur, statement.sql, calls))
+        prepared.append(run_calls(cur, statement.execute_sql, calls))
+    sample = calls[:args.explicar]
+    result = {
+        'adhoc_ms': statistics.median(adhoc) * 1000,
+        'preparado_ms': statistics.median(prepared) * 1000,
+        'adhoc_plan_exec_ms': explain_times(cur, statement.sql, sample),
+        'preparado_plan_exec_ms': explain_times(cur, statement.execute_sql, sample),
+    }
+    cur.execute(f"DEALLOCATE {statement.name}")
+    cur.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--chamadas', type=int, default=500, help="chamadas por comando em cada rodada")
+    parser.add_argument('--repeat', type=int, default=5, help="rodadas (mostra a mediana)")
+    parser.add_argument('--explicar', type=int, default=50, help="chamadas medidas com EXPLAIN ANALYZE")
+    parser.add_argument('--comandos', help="nomes dos comandos, separados por vírgula (padrão: todos)")
+    parser.add_argument('--reusar', action='store_true',
+                        help="usa o banco de uma execução anterior, se gerado com os mesmos parâmetros")
+    parser.add_argument('--manter', action='store_true', help="não remove o banco ao final")
+    args = parser.parse_args()
+
+    names = [name for name in PREPARED_STATEMENTS if name in SAMPLES]
+    if args.comandos:
+        names = args.comandos.split(',')
+        unknown = [name for name in names if name not in SAMPLES or name not in PREPARED_STATEMENTS]
+        if unknown:
+            parser.error(f"comandos: escolha entre {', '.join(n for n in PREPARED_STATEMENTS if n in SAMPLES)}")
+
+    dbname = f"{DB_CONFIG['database']}_preparados"
+    if args.reusar and existing_database(dbname, args):
+        print(f"Reaproveitando {dbname}")
+    else:
+        print(f"Gerando {dbname}...")
+        create_database(dbname, args)
+    try:
+        conn = psycopg2.connect(**{**DB_CONFIG, 'database': dbname})
+        conn.autocommit = True
+        n = limits(conn.cursor())
+        rng = random.Random(args.seed)
+        print(f"{args.chamadas} chamadas x {args.repeat} rodadas por comando (mediana por chamada, ms); "
+              f"plano/execução no servidor em {args.explicar} chamadas\n")
+        print(f"{'comando':28} {'ad hoc':>8} {'preparado':>10} {'ganho':>6}   "
+              f"{'plano ad hoc':>12} {'plano prep.':>11}   {'exec ad hoc':>11} {'exec prep.':>10}")
+        total_adhoc = total_prepared = 0.0
+        for name in names:
+            calls = [SAMPLES[name](rng, n) for _ in range(args.chamadas)]
+            result = benchmark(conn, PREPARED_STATEMENTS[name], calls, args)
+            total_adhoc += result['adhoc_ms']
+            total_prepared += result['preparado_ms']
+            (adhoc_plan, adhoc_exec), (prep_plan, prep_exec) = (result['adhoc_plan_exec_ms'],
+                                                                result['preparado_plan_exec_ms'])
+            print(f"{name:28} {result['adhoc_ms']:8.3f} {result['preparado_ms']:10.3f} "
+                  f"{result['adhoc_ms'] / result['preparado_ms']:5.2f}x   "
+                  f"{adhoc_plan:12.3f} {prep_plan:11.3f}   {adhoc_exec:11.3f} {prep_exec:10.3f}")
+        print(f"\n{'soma':28} {total_adhoc:8.3f} {total_prepared:10.3f} {total_adhoc / total_prepared:5.2f}x")
+        conn.close()
+    finally:
+        if not args.manter:
+            drop_database(dbname)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Regressão de planos: nenhuma consulta do GEDEU deve varrer uma tabela grande.
+
+Cria um banco temporário (<banco>_planos) com GEDEU.sql, as views e as
+procedures, gera dados sintéticos (ver synthetic.py), executa VACUUM ANALYZE
+e então:
+
+- percorre as páginas do app com o test client do Flask, registrando cada
+  SELECT/UPDATE/DELETE enviado ao banco e cada EXECUTE de um comando
+  preparado (database.prepared), avaliado pelo plano genérico;
+- extrai o RETURN QUERY das funções de install_procedures.sql;
+- monta as consultas que o PostgreSQL faz ao excluir uma linha referenciada
+  (uma por chave estrangeira).
+
+Cada consulta passa por EXPLAIN; uma Seq Scan em tabela com pelo menos
+--min-linhas linhas é uma falha (código de saída 1). Consultas que leem a
+tabela inteira por definição (dashboard_equipes, listas dos formulários)
+ficam em ALLOWED. O banco temporário é removido no final.
+
+Uso (a partir de "GEDEU 1.0/"):
+    python benchmarks/query_plans.py --min-linhas 10000
+"""
+import argparse
+import json
+import re
+import sys
+
+import psycopg2
+from psycopg2 import extensions
+
+from synthetic import DB_CONFIG, add_arguments, create_database, drop_database
+
+# Consultas que leem a tabela inteira de propósito
+ALLOWED = [
+    re.compile(r"FROM dashboard_equipes\b"),
+    # Opções dos <select> (cache.lookup): todas as linhas da tabela referenciada
+    re.compile(r"^SELECT \w+, \w+ FROM \w+( WHERE \w+ = TRUE)?( ORDER BY \w+)?$"),
+]
+
+# Páginas visitadas; os códigos são os primeiros de cada tabela no banco gerado
+PAGES = [
+    ('GET', '/Atleta', None),
+    ('GET', '/Atleta?equipe=1', None),
+    ('GET', '/Atleta?status=ativo&equipe=1', None),
+    ('GET', '/Treinador?equipe=1', None),
+    ('GET', '/Treinamento', None),
+    ('GET', '/Partida', None),
+    ('GET', '/Presenca_Treinamento', None),
+    ('GET', '/Presenca_Partida', None),
+    ('GET', '/Participacao_Campeonato', None),
+    ('GET', '/Atleta/add', None),
+    ('GET', '/Partida/add', None),
+    ('GET', '/Atleta/edit/1', None),
+    ('GET', '/Treinamento/edit/1', None),
+    ('GET', '/Partida/edit/1', None),
+    ('GET', '/presenca_treinamento/1', None),
+    ('GET', '/presenca_partida/1', None),
+    ('GET', '/participantes_campeonato/1', None),
+    ('GET', '/relatorio_presenca_equipe', None),
+    ('POST', '/relatorio_presenca_equipe', {'cod_equipe': '1'}),
+    ('POST', '/relatorio_presenca_equipe',
+     {'cod_equipe': '1', 'data_inicio': '2025-03-01', 'data_fim': '2025-03-31'}),
+    ('GET', '/estatisticas_atleta', None),
+    ('POST', '/estatisticas_atleta', {'id_atleta': '1'}),
+    ('GET', '/view/dashboard_equipes', None),
+    ('GET', '/view/ranking_atletas', None),
+    ('GET', '/api/Atleta?equipe=1&fields=nome_atleta,cod_equipe.nome_equipe', None),
+    ('GET', '/api/Partida?sort=data_partida&dir=desc', None),
+    ('GET', '/api/view/ranking_atletas', None),
+    ('GET', '/api/relatorio_presenca_equipe/1?data_inicio=2025-03-01&data_fim=2025-03-31', None),
+    ('GET', '/api/estatisticas_atleta/1', None),
+]
+
+# Argumentos de exemplo para as funções, por tipo (na ordem dos parâmetros)
+SAMPLE_ARGS = {
+    'integer': ["1"],
+    'date': ["'2025-03-01'", "'2025-03-31'"],
+}
+
+recorded = []
+
+
+class RecordingCursor(extensions.cursor):
+    """Cursor que guarda as consultas já com os parâmetros (mogrify)."""
+
+    def execute(self, query, vars=None):
+        result = super().execute(query, vars)
+        sql = ' '.join(self.query.decode(self.connection.encoding).split())
+        if (re.match(r"EXECUTE\b", sql, re.I)
+                or re.match(r"(SELECT|WITH|UPDATE|DELETE)\b", sql, re.I) and ' FROM ' in sql.upper()):
+            recorded.append(sql)
+        return result
+
+
+def seq_scans(plan, sizes, min_rows):
+    """(tabela, linhas) de cada Seq Scan do plano em tabela grande"""
+    found = []
+    if plan.get('Node Type') in ('Seq Scan', 'Parallel Seq Scan'):
+        rows = sizes.get(plan['Relation Name'], 0)
+        if rows >= min_rows:
+            found.append((plan['Relation Name'], rows))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child, sizes, min_rows))
+    return found
+
+
+def explain(cur, sql, generic=False):
+    """Plano de ``sql``; com ``generic`` o EXECUTE usa o plano genérico (sem os valores)"""
+    cur.execute("SET plan_cache_mode = %s", ('force_generic_plan' if generic else 'auto',))
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def app_queries(dbname):
+    """Consultas enviadas pelo app ao visitar PAGES"""
+    DB_CONFIG['database'] = dbname
+    DB_CONFIG['cursor_factory'] = RecordingCursor
+    import app as gedeu
+    client = gedeu.app.test_client()
+    for method, url, data in PAGES:
+        response = client.open(url, method=method, data=data)
+        if response.status_code != 200:
+            raise SystemExit(f"{method} {url}: HTTP {response.status_code}")
+    for module in ('database', 'aiodb'):
+        pool = sys.modules[module]._pool
+        if pool is not None:
+            pool.closeall()
+    return list(dict.fromkeys(recorded))
+
+
+def prepare_app_statements(cur):
+    """Prepara na conexão do EXPLAIN os comandos registrados pelo app"""
+    for statement in sys.modules['database'].PREPARED_STATEMENTS.values():
+        cur.execute(statement.prepare_sql)
+
+
+def function_queries(cur):
+    """Cada RETURN QUERY das funções, preparado: os argumentos viram $1, $2..."""
+    cur.execute("""SELECT p.proname, p.prosrc,
+                          pg_get_function_identity_arguments(p.oid)
+                   FROM pg_proc p JOIN pg_namespace n ON n.oid = p.pronamespace
+                   WHERE n.nspname = 'public' AND p.prosrc LIKE '%%RETURN QUERY%%'
+                   ORDER BY p.proname, p.pronargs""")
+    queries = []
+    for name, source, arguments in cur.fetchall():
+        args = [arg.split(' ', 1) for arg in arguments.split(', ')] if arguments else []
+        types = [arg_type for _, arg_type in args]
+        used = {}
+        values = []
+        for arg_type in types:
+            samples = SAMPLE_ARGS[arg_type]
+            values.append(samples[used.get(arg_type, 0) % len(samples)])
+            used[arg_type] = used.get(arg_type, 0) + 1
+        for number, body in enumerate(re.findall(r"RETURN QUERY(.*?);", source, re.S), 1):
+            for position, (arg_name, _) in enumerate(args, 1):
+                body = re.sub(rf"(?<![\w.]){arg_name}\b", f"${position}", body)
+            statement = f"plano_{len(queries)}"
+            cur.execute(f"PREPARE {statement} ({', '.join(types)}) AS {body}")
+            queries.append((f"{name}({', '.join(values)}), RETURN QUERY {number}",
+                            f"EXECUTE {statement} ({', '.join(values)})", False))
+    return queries
+
+
+def foreign_key_queries(cur):
+    """Verificações que o PostgreSQL faz ao excluir/alterar uma linha referenciada.
+
+    Como nos triggers de integridade, a consulta é preparada uma vez e
+    avaliada pelo plano genérico, válido para qualquer valor da chave.
+    """
+    cur.execute("""SELECT c.conname, c.conrelid::regclass::text,
+                          array_agg(a.attname ORDER BY k.ord),
+                          array_agg(format_type(a.atttypid, a.atttypmod) ORDER BY k.ord)
+                   FROM pg_constraint c
+                   CROSS JOIN unnest(c.conkey) WITH ORDINALITY k(attnum, ord)
+                   JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+                   WHERE c.contype = 'f' AND c.connamespace = 'public'::regnamespace
+                   GROUP BY c.conname, c.conrelid
+                   ORDER BY 2, 1""")
+    queries = []
+    for constraint, table, columns, types in cur.fetchall():
+        where = ' AND '.join(f"x.{col} = ${n}" for n, col in enumerate(columns, 1))
+        cur.execute(f"PREPARE plano_{constraint} ({', '.join(types)}) AS "
+                    f"SELECT 1 FROM ONLY {table} x WHERE {where} FOR KEY SHARE OF x")
+        queries.append((f"FK {constraint}",
+                        f"EXECUTE plano_{constraint} ({', '.join(['1'] * len(columns))})", True))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser, equipes=100, atletas=30, campeonatos=10, treinamentos=150, partidas=40)
+    parser.add_argument('--min-linhas', type=int, default=10000,
+                        help="tamanho a partir do qual uma Seq Scan é falha")
+    parser.add_argument('--manter', action='store_true', help="não remove o banco temporário")
+    parser.add_argument('-v', '--verbose', action='store_true', help="mostra também as consultas aprovadas")
+    args = parser.parse_args()
+
+    dbname = f"{DB_CONFIG['database']}_planos"
+    create_database(dbname, args)
+    failures = 0
+    try:
+        queries = [(sql, sql, sql.startswith('EXECUTE ')) for sql in app_queries(dbname)]
+        conn = psycopg2.connect(**{**DB_CONFIG, 'database': dbname,
+                                   'cursor_factory': extensions.cursor})
+        cur = conn.cursor()
+        prepare_app_statements(cur)
+        queries += function_queries(cur) + foreign_key_queries(cur)
+        cur.execute("""SELECT c.relname, c.reltuples::bigint FROM pg_class c
+                       WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'm')""")
+        sizes = dict(cur.fetchall())
+
+        for label, sql, generic in queries:
+            allowed = any(pattern.search(sql) for pattern in ALLOWED)
+            scans = seq_scans(explain(cur, sql, generic), sizes, args.min_linhas)
+            if scans and not allowed:
+                failures += 1
+                tables = ', '.join(f"{table} ({rows} linhas)" for table, rows in scans)
+                print(f"FALHA  Seq Scan em {tables}\n       {label}")
+            elif args.verbose:
+                print(f"{'livre' if allowed else 'ok':6} {label}")
+        conn.rollback()
+        conn.close()
+        print(f"{len(queries)} consultas, {failures} com Seq Scan em tabela com "
+              f"{args.min_linhas} linhas ou mais")
+    finally:
+        if not args.manter:
+            drop_database(dbname)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
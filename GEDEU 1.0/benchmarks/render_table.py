@@ -0,0 +1,252 @@
+"""Benchmark da listagem (table.html): cadeia de if/elif x plano de exibição.
+
+Renderiza as células de N linhas sintéticas de uma tabela de duas formas: com
+o trecho anterior do template, que testa tabela e coluna a cada célula, e
+com renderers.RenderPlan, que escolhe o formatador de cada coluna uma vez
+por processo. Não usa o banco: as linhas e os nomes das FKs são gerados
+aqui. Confere também se as duas versões produzem o mesmo HTML (ignorando
+espaços em branco).
+
+Uso (a partir de "GEDEU 1.0/"):
+    python benchmarks/render_table.py --tabela Partida --linhas 10000 --repeat 5
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import date, time as clock, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as gedeu  # noqa: E402
+import renderers  # noqa: E402
+
+# Versão anterior de table.html (apenas as células; a coluna de ações não mudou)
+OLD_CELLS = """
+{% for row in rows %}
+<tr>
+    {% for cell in row %}
+        {# Partida: mostrar nomes relacionados #}
+        {% if table == 'Partida' and colnames[loop.index0] == 'cod_modalidade' %}
+            <td>
+                {{ modalidade_nomes[cell] if modalidade_nomes and cell in modalidade_nomes else cell }}
+            </td>
+        {% elif table == 'Partida' and colnames[loop.index0] == 'cod_local' %}
+            <td>
+                {{ local_nomes[cell] if local_nomes and cell in local_nomes else cell }}
+            </td>
+        {% elif table == 'Partida' and colnames[loop.index0] == 'cod_evento' %}
+            <td>
+                {{ evento_nomes[cell] if evento_nomes and cell in evento_nomes else cell }}
+            </td>
+        {% elif table == 'Partida' and colnames[loop.index0] == 'placar' %}
+            <td>
+                {{ cell if cell else 's/Registro' }}
+            </td>
+        {# Campeonato: mostrar apenas o nome da modalidade #}
+        {% elif table == 'Campeonato' and colnames[loop.index0] == 'cod_modalidade' %}
+            <td>
+                {{ modalidade_nomes[cell] if modalidade_nomes and cell in modalidade_nomes else cell }}
+            </td>
+        {% elif table == 'Campeonato' and colnames[loop.index0] == 'categoria' %}
+            {# não mostrar a coluna categoria separada #}
+        {% elif table == 'Campeonato' and colnames[loop.index0] == 'cod_evento' %}
+            <td>
+                {{ evento_nomes[cell] if evento_nomes and cell in evento_nomes else cell }}
+            </td>
+        {# Evento: mostrar nome do local #}
+        {% elif table == 'Evento' and colnames[loop.index0] == 'cod_local' %}
+            <td>
+                {{ local_nomes[cell] if local_nomes and cell in local_nomes else cell }}
+            </td>
+        {# Equipe: mostrar código na tabela Equipe, nome nas outras tabelas #}
+        {% elif colnames[loop.index0] == 'cod_equipe' and table == 'Equipe' %}
+            <td>{{ cell }}</td>
+        {% elif colnames[loop.index0] in ['cod_equipe', 'cod_equipe_a', 'cod_equipe_b'] %}
+            <td>
+                {{ equipe_nomes[cell] if equipe_nomes and cell in equipe_nomes else cell }}
+            </td>
+        {% elif colnames[loop.index0] == 'cod_documento' %}
+            <td>
+                {% set doc = documento_infos[cell] if documento_infos and cell in documento_infos else None %}
+                {% if doc %}
+                    <a href="{{ url_for('ver_documento', cod_documento=cell) }}" 
+                       class="doc-btn" target="_blank" 
+                       title="Clique para visualizar o PDF">
+                        📄 {{ doc.tipo }} - {{ doc.numero }}
+                    </a>
+                {% else %}
+                    <span style="color: #888;">Sem documento</span>
+                {% endif %}
+            </td>
+        {% elif colnames[loop.index0] == 'status_ativa' or colnames[loop.index0] == 'status_ativo' %}
+            <td>
+                {% if cell %}
+                    <span class="status-ativa">Ativa</span>
+                {% else %}
+                    <span class="status-inativa">Inativa</span>
+                {% endif %}
+            </td>
+        {% elif colnames[loop.index0] in ['telefone_atleta', 'telefone_treinador'] %}
+            <td>{{ cell|telefone_format }}</td>
+        {% elif table == 'Local' and colnames[loop.index0] in ['arquibancada', 'coberto'] %}
+            <td>
+                {% if cell %}
+                    <span class="bool-sim">Sim</span>
+                {% else %}
+                    <span class="bool-nao">Não</span>
+                {% endif %}
+            </td>
+        {% elif table == 'Treinamento' and colnames[loop.index0] == 'cod_local' %}
+            <td>
+                {{ local_nomes[cell] if local_nomes and cell in local_nomes else cell }}
+            </td>
+        {% elif table == 'Treinamento' and colnames[loop.index0] == 'id_treinador' %}
+            <td>
+                {{ treinador_nomes[cell] if treinador_nomes and cell in treinador_nomes else cell }}
+            </td>
+        {% elif table == 'Documento' and colnames[loop.index0] == 'arquivo_conteudo' %}
+            <td class="blob-cell">
+                {% if cell and cell != 'None' %}
+                    {% if cell.startswith('BLOB') %}
+                        <div class="blob-info">
+                            <span class="blob-indicator">🗂️ {{ cell }}</span>
+                            <a href="{{ url_for('download_pdf', cod_documento=row[0]) }}" 
+                               class="doc-btn" target="_blank" title="Visualizar PDF">
+                                📄 Visualizar PDF
+                            </a>
+                        </div>
+                    {% else %}
+                        <div class="blob-info">
+                            <span class="blob-indicator">🗂️ BLOB</span>
+                            <a href="{{ url_for('download_pdf', cod_documento=row[0]) }}" 
+                               class="doc-btn" target="_blank" title="Visualizar PDF">
+                                📄 Visualizar PDF
+                            </a>
+                        </div>
+                    {% endif %}
+                {% else %}
+                    <span class="no-blob">Sem arquivo</span>
+                {% endif %}
+            </td>
+        {% elif table == 'Documento' and colnames[loop.index0] == 'arquivo_tamanho' %}
+            <td>
+                {% if cell %}
+                    {{ "%.2f"|format(cell/1024) }} KB
+                {% else %}
+                    N/A
+                {% endif %}
+            </td>
+        {% else %}
+            <td>{{ cell }}</td>
+        {% endif %}
+    {% endfor %}
+</tr>
+{% endfor %}
+"""
+
+NEW_CELLS = """
+{% for row, cells in rendered_rows %}
+<tr>
+    {{ cells }}
+</tr>
+{% endfor %}
+"""
+
+EQUIPES = 20
+
+# Colunas (na ordem do banco) e gerador de linhas de cada tabela
+SAMPLES = {
+    "Partida": (
+        ["cod_partida", "data_partida", "hora_inicio", "placar", "cod_equipe_a", "cod_equipe_b",
+         "cod_modalidade", "cod_local", "cod_evento"],
+        lambda i: (i, date(2025, 3, 1) + timedelta(days=i % 240), clock(8 + i % 12, 30),
+                   None if i % 4 == 0 else f"{i % 5} x {i % 3}", i % EQUIPES + 1,
+                   (i + 1) % EQUIPES + 1, i % 4 + 1, i % 10 + 1, i % 4 + 1),
+    ),
+    "Atleta": (
+        ["id_atleta", "nome_atleta", "matricula_unb", "curso", "email_atleta", "telefone_atleta",
+         "data_nascimento", "status_ativo", "cod_equipe", "cod_documento"],
+        lambda i: (i, f"Atleta {i}", f"{200000000 + i}", "Engenharia", f"atleta{i}@aluno.unb.br",
+                   f"619{i:08d}", date(1998, 1, 1) + timedelta(days=i % 3000), i % 5 != 0,
+                   i % EQUIPES + 1, i if i % 3 else None),
+    ),
+}
+
+
+def fk_labels(rows_count):
+    """Nomes das FKs como show_table os monta: tabela referenciada -> {chave: rótulos}"""
+    return {
+        "Equipe": {k: (f"Equipe {k}",) for k in range(1, EQUIPES + 1)},
+        "Modalidade": {k: (f"Modalidade {k}",) for k in range(1, 5)},
+        "Local": {k: (f"Ginásio {k}",) for k in range(1, 11)},
+        "Evento": {k: (f"Evento {k}",) for k in range(1, 5)},
+        "Documento": {k: ("RG", f"{k:09d}") for k in range(1, rows_count + 1) if k % 3},
+    }
+
+
+def old_context(table, colnames, rows, labels):
+    """Variáveis que a versão anterior de show_table passava ao template"""
+    def nomes(ref_table):
+        return {key: names[0] for key, names in labels.get(ref_table, {}).items()}
+    return {
+        'table': table, 'colnames': colnames, 'rows': rows,
+        'equipe_nomes': nomes("Equipe"), 'local_nomes': nomes("Local"),
+        'treinador_nomes': nomes("Treinador"), 'modalidade_nomes': nomes("Modalidade"),
+        'evento_nomes': nomes("Evento"),
+        'documento_infos': {key: {'tipo': tipo, 'numero': numero}
+                            for key, (tipo, numero) in labels.get("Documento", {}).items()},
+    }
+
+
+def normalize(html):
+    return re.sub(r">\s+|\s+<", lambda m: m.group(0).strip(), re.sub(r"\s+", " ", html)).strip()
+
+
+def timed(render, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        html = render()
+        times.append((time.perf_counter() - start) * 1000)
+    return html, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tabela', choices=sorted(SAMPLES), default='Partida')
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    colnames, make_row = SAMPLES[args.tabela]
+    rows = [make_row(i) for i in range(1, args.linhas + 1)]
+    labels = fk_labels(args.linhas)
+    env = gedeu.app.jinja_env
+    old_template = env.from_string(OLD_CELLS)
+    new_template = env.from_string(NEW_CELLS)
+
+    with gedeu.app.test_request_context():
+        context = old_context(args.tabela, colnames, rows, labels)
+        old_html, old_times = timed(lambda: old_template.render(**context), args.repeat)
+
+        def render_new():
+            # O plano é montado uma vez por processo em get_render_plan; aqui, a cada
+            # repetição, para medir o pior caso (primeira requisição)
+            plan = renderers.RenderPlan(args.tabela, colnames, gedeu.COLUMN_DISPLAY_NAMES[args.tabela],
+                                        gedeu.FK_FIELDS.get(args.tabela, {}))
+            return new_template.render(rendered_rows=plan.render_rows(rows, labels))
+        new_html, new_times = timed(render_new, args.repeat)
+
+    old_ms, new_ms = statistics.median(old_times), statistics.median(new_times)
+    print(f"{args.tabela}: {args.linhas} linhas x {len(colnames)} colunas")
+    print(f"if/elif no template:  mediana {old_ms:9.1f} ms")
+    print(f"plano de exibição:    mediana {new_ms:9.1f} ms  ({old_ms / new_ms:.1f}x)")
+    print("mesmo HTML:", normalize(old_html) == normalize(new_html))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Dados sintéticos para os scripts de benchmarks/.
+
+Preenche todas as tabelas de GEDEU.sql (modalidades, locais, eventos,
+campeonatos, equipes, documentos, atletas, treinadores, treinamentos,
+partidas e presenças) com cardinalidades parecidas com as de uma temporada
+real, direto no banco (generate_series), sem passar pelo app. Arquivo é
+preenchida pelo trigger de Documento apenas para PDFs em disco; os
+documentos gerados ficam no banco (BYTEA).
+
+Os valores aleatórios vêm de random() após setseed(--seed): a mesma
+semente e os mesmos tamanhos geram o mesmo banco.
+"""
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import DB_CONFIG  # noqa: E402
+
+# Tabelas de apoio, com poucas linhas em qualquer tamanho de banco
+MODALIDADES = 4
+LOCAIS = 10
+EVENTOS = 4
+
+SIZES = ('equipes', 'atletas', 'treinadores', 'campeonatos', 'treinamentos', 'partidas')
+
+# Tamanhos prontos (--escala); "producao" é uma temporada cheia: 50 equipes,
+# 5 mil atletas, 23 mil treinamentos e cerca de 2 milhões de presenças
+SCALES = {
+    'pequena': {'equipes': 20, 'atletas': 20, 'treinadores': 2, 'campeonatos': 4,
+                'treinamentos': 60, 'partidas': 15},
+    'media': {'equipes': 30, 'atletas': 50, 'treinadores': 2, 'campeonatos': 6,
+              'treinamentos': 150, 'partidas': 25},
+    'producao': {'equipes': 50, 'atletas': 100, 'treinadores': 2, 'campeonatos': 10,
+                 'treinamentos': 460, 'partidas': 40},
+}
+
+CURSOS = ['Educação Física', 'Engenharia', 'Direito', 'Medicina', 'Computação', 'Administração']
+
+# Conteúdo dos documentos gerados (um PDF mínimo, do tamanho de um RG digitalizado pequeno)
+PDF_CONTENT = b"%PDF-1.4\n" + b"0" * 4000 + b"\n%%EOF\n"
+
+
+def read_sql(name):
+    with open(os.path.join(ROOT, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def add_arguments(parser, **defaults):
+    """Opções de tamanho do conjunto de dados (padrões sobrescritos por ``defaults``).
+
+    --escala troca os padrões por um dos tamanhos de SCALES; as opções
+    passadas explicitamente continuam valendo.
+    """
+    sizes = dict(SCALES['pequena'])
+    sizes.update(defaults)
+    scale, _ = argparse_scale().parse_known_args()
+    if scale.escala:
+        sizes.update(SCALES[scale.escala])
+    parser.add_argument('--escala', choices=SCALES, help="tamanho pronto do conjunto de dados")
+    parser.add_argument('--equipes', type=int, default=sizes['equipes'])
+    parser.add_argument('--atletas', type=int, default=sizes['atletas'], help="atletas por equipe")
+    parser.add_argument('--treinadores', type=int, default=sizes['treinadores'], help="treinadores por equipe")
+    parser.add_argument('--campeonatos', type=int, default=sizes['campeonatos'],
+                        help="campeonatos (todas as equipes participam)")
+    parser.add_argument('--treinamentos', type=int, default=sizes['treinamentos'], help="treinamentos por equipe")
+    parser.add_argument('--partidas', type=int, default=sizes['partidas'], help="partidas por equipe")
+    parser.add_argument('--seed', type=int, default=1, help="semente do gerador (mesma semente, mesmos dados)")
+
+
+def argparse_scale():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--escala', choices=SCALES)
+    return parser
+
+
+def dataset_params(args):
+    """Tamanhos e semente que identificam um conjunto de dados gerado"""
+    return {name: getattr(args, name) for name in SIZES + ('seed',)}
+
+
+def populate(cur, args):
+    """Dados sintéticos; cada atleta é convocado para parte dos treinos e partidas da equipe"""
+    cur.execute("SELECT setseed(%s)", ((args.seed % 2 ** 31) / 2 ** 31,))
+    cur.execute("""INSERT INTO Modalidade (nome_modalidade, desc_regras, categoria)
+                   SELECT 'Modalidade ' || g, 'Regras oficiais da federação',
+                          (ARRAY['Masculino', 'Feminino', 'Misto'])[g %% 3 + 1]
+                   FROM generate_series(1, %s) g""", (MODALIDADES,))
+    cur.execute("""INSERT INTO Local (nome_local, endereco, arquibancada, coberto)
+                   SELECT 'Local ' || g, 'Campus Darcy Ribeiro, bloco ' || g, g %% 2 = 0, g %% 3 = 0
+                   FROM generate_series(1, %s) g""", (LOCAIS,))
+    cur.execute("""INSERT INTO Evento (nome_evento, data_inicio, data_fim, desc_evento,
+                                       organizador_evento, cod_local)
+                   SELECT 'Evento ' || g, '2025-01-01', '2025-12-31', 'Temporada universitária',
+                          'Diretoria de Esporte', g %% %s + 1
+                   FROM generate_series(1, %s) g""", (LOCAIS, EVENTOS))
+    cur.execute("""INSERT INTO Equipe (nome_equipe, ano_fundacao, status_ativa)
+                   SELECT 'Equipe ' || g, 1990 + g %% 30, g %% 10 <> 0
+                   FROM generate_series(1, %s) g""", (args.equipes,))
+    cur.execute("""INSERT INTO Campeonato (nome_campeonato, ano_campeonato, desc_campeonato,
+                                           organizador_campeonato, cod_modalidade, cod_evento)
+                   SELECT 'Campeonato ' || g, 2025, 'Fase de grupos e eliminatórias',
+                          'Federação Universitária', g %% %s + 1, g %% %s + 1
+                   FROM generate_series(1, %s) g""",
+                (MODALIDADES, EVENTOS, args.campeonatos))
+    cur.execute("""INSERT INTO Participacao_Campeonato (cod_equipe, cod_campeonato, status_participacao)
+                   SELECT e.cod_equipe, c.cod_campeonato,
+                          (ARRAY['Inscrita', 'Confirmada', 'Eliminada'])[(e.cod_equipe + c.cod_campeonato) % 3 + 1]
+                   FROM Equipe e CROSS JOIN Campeonato c""")
+    # Um documento para cada terceiro atleta e para cada treinador
+    atletas_com_documento = args.equipes * args.atletas // 3
+    cur.execute("""INSERT INTO Documento (tipo_documento, numero_documento, arquivo_nome,
+                                          arquivo_conteudo, arquivo_tamanho)
+                   SELECT (ARRAY['RG', 'Atestado médico', 'Termo de responsabilidade'])[g %% 3 + 1],
+                          'DOC' || lpad(g::text, 9, '0'), 'documento_' || g || '.pdf', %s, %s
+                   FROM generate_series(1, %s) g""",
+                (psycopg2.Binary(PDF_CONTENT), len(PDF_CONTENT),
+                 atletas_com_documento + args.equipes * args.treinadores))
+    cur.execute("""INSERT INTO Atleta (nome_atleta, matricula_unb, curso, email_atleta, telefone_atleta,
+                                       data_nascimento, status_ativo, cod_equipe)
+                   SELECT 'Atleta ' || e.cod_equipe || '-' || g, lpad((e.cod_equipe * 10000 + g)::text, 9, '0'),
+                          (%s::text[])[(e.cod_equipe + g) %% %s + 1],
+                          'atleta' || e.cod_equipe || '.' || g || '@aluno.unb.br',
+                          '619' || lpad((e.cod_equipe * 1000 + g)::text, 8, '0'),
+                          DATE '1996-01-01' + (random() * 3000)::int, g %% 8 <> 0, e.cod_equipe
+                   FROM Equipe e CROSS JOIN generate_series(1, %s) g""",
+                (CURSOS, len(CURSOS), args.atletas))
+    cur.execute("UPDATE Atleta SET cod_documento = id_atleta / 3 WHERE id_atleta %% 3 = 0 AND id_atleta / 3 <= %s",
+                (atletas_com_documento,))
+    cur.execute("""INSERT INTO Treinador (nome_treinador, email_treinador, telefone_treinador,
+                                          status_ativo, cod_equipe)
+                   SELECT 'Treinador ' || e.cod_equipe || '-' || g,
+                          'treinador' || e.cod_equipe || '.' || g || '@unb.br',
+                          '619' || lpad((e.cod_equipe * 100 + g)::text, 8, '0'), g = 1, e.cod_equipe
+                   FROM Equipe e CROSS JOIN generate_series(1, %s) g""", (args.treinadores,))
+    cur.execute("UPDATE Treinador SET cod_documento = %s + id_treinador", (atletas_com_documento,))
+    cur.execute("""INSERT INTO Treinamento (data_treinamento, hora_inicio, hora_final, cod_local, id_treinador)
+                   SELECT DATE '2025-01-01' + g %% 365, '08:00', '10:00',
+                          (t.id_treinador + g) %% %s + 1, t.id_treinador
+                   FROM Treinador t CROSS JOIN generate_series(1, %s) g
+                   WHERE t.status_ativo""", (LOCAIS, args.treinamentos))
+    cur.execute("""INSERT INTO Presenca_Treinamento (cod_treinamento, id_atleta, presenca, obs)
+                   SELECT cod_treinamento, id_atleta, presente,
+                          CASE WHEN NOT presente AND random() < 0.2 THEN 'Atestado médico' END
+                   FROM (SELECT tr.cod_treinamento, a.id_atleta, random() < 0.8 AS presente
+                         FROM Treinamento tr
+                         JOIN Treinador t ON t.id_treinador = tr.id_treinador
+                         JOIN Atleta a ON a.cod_equipe = t.cod_equipe
+                         WHERE random() < 0.85) convocados""")
+    cur.execute("""INSERT INTO Partida (data_partida, hora_inicio, placar, cod_equipe_a, cod_equipe_b,
+                                        cod_modalidade, cod_local, cod_evento)
+                   SELECT DATE '2025-01-01' + g %% 365, '15:00',
+                          CASE WHEN g %% 365 < 200 THEN (random() * 5)::int || 'x' || (random() * 5)::int END,
+                          e.cod_equipe, e.cod_equipe %% %s + 1, e.cod_equipe %% %s + 1, g %% %s + 1, g %% %s + 1
+                   FROM Equipe e CROSS JOIN generate_series(1, %s) g""",
+                (args.equipes, MODALIDADES, LOCAIS, EVENTOS, args.partidas))
+    cur.execute("""INSERT INTO Presenca_Partida (id_atleta, cod_partida, presenca)
+                   SELECT a.id_atleta, p.cod_partida, random() < 0.9
+                   FROM Partida p JOIN Atleta a ON a.cod_equipe = p.cod_equipe_a
+                   WHERE random() < 0.6""")
+    cur.execute("ANALYZE")
+
+
+def create_database(dbname, args):
+    """Banco ``dbname`` novo, com GEDEU.sql, views, procedures e os dados sintéticos"""
+    admin = psycopg2.connect(**{**DB_CONFIG, 'database': 'postgres'})
+    admin.autocommit = True
+    admin.cursor().execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+    admin.cursor().execute(f'CREATE DATABASE "{dbname}"')
+    admin.close()
+
+    conn = psycopg2.connect(**{**DB_CONFIG, 'database': dbname})
+    cur = conn.cursor()
+    for name in ('GEDEU.sql', 'install_views.sql', 'install_procedures.sql'):
+        cur.execute(read_sql(name))
+    populate(cur, args)
+    # Ranking materializado já atualizado, como em produção
+    cur.execute("SELECT nome_visao FROM Visao_Materializada")
+    for (matview,) in cur.fetchall():
+        cur.execute(f"REFRESH MATERIALIZED VIEW {matview}")
+    cur.execute("""
+        UPDATE Visao_Materializada m SET versao_fontes = e.versao_atual, atualizada_em = now()
+        FROM estado_visao_materializada e WHERE e.nome_visao = m.nome_visao
+    """)
+    # Identifica o conjunto de dados (ver existing_database)
+    cur.execute(f'COMMENT ON DATABASE "{dbname}" IS %s', (json.dumps(dataset_params(args)),))
+    conn.commit()
+    conn.autocommit = True
+    cur.execute("VACUUM ANALYZE")
+    conn.close()
+
+
+def existing_database(dbname, args):
+    """True se ``dbname`` já existe e foi gerado com os mesmos tamanhos e semente"""
+    admin = psycopg2.connect(**{**DB_CONFIG, 'database': 'postgres'})
+    cur = admin.cursor()
+    cur.execute("""SELECT shobj_description(oid, 'pg_database') FROM pg_database
+                   WHERE datname = %s""", (dbname,))
+    row = cur.fetchone()
+    admin.close()
+    if not row or not row[0]:
+        return False
+    try:
+        return json.loads(row[0]) == dataset_params(args)
+    except ValueError:
+        return False
+
+
+def drop_database(dbname):
+    admin = psycopg2.connect(**{**DB_CONFIG, 'database': 'postgres'})
+    admin.autocommit = True
+    admin.cursor().execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+    admin.close()
@@ -0,0 +1,543 @@
+"""Caches das consultas de apoio e das páginas de leitura.
+
+Equipe, Local, Modalidade, Evento etc. mudam pouco, mas eram relidas
+inteiras a cada página. As consultas ficam em um cache LRU com TTL,
+agrupadas pela tabela consultada, e são invalidadas pelas rotas de escrita
+do próprio app e, opcionalmente, por LISTEN/NOTIFY do PostgreSQL (ver
+install_triggers.sql), o que cobre outros processos e alterações externas.
+
+Registros lidos por chave (os metadados dos PDFs em download_pdf) ficam em
+um terceiro cache, também agrupado pela tabela (ver cached_row).
+
+As páginas de leitura (listagens, views, menu) vão para um segundo cache,
+em memória ou em disco, agrupadas pela tabela ou view exibida. Uma escrita
+em uma tabela descarta as páginas que dependem dela (ver cached_page).
+
+Com mais de um processo (SERVER_WORKERS > 1), a invalidação feita por um
+processo não chega aos caches em memória dos outros. Nesse caso o LISTEN
+é ligado por padrão e, enquanto ele não estiver ativo (conexão caída ou
+triggers de install_triggers.sql ausentes), os caches em memória são
+ignorados: as consultas vão ao banco. O cache em disco é compartilhado e
+continua valendo.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import select
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import psycopg2
+from flask import current_app, request
+
+from database import get_db, DB_CONFIG
+
+NOTIFY_CHANNEL = 'gedeu_alteracoes'
+
+# Triggers que enviam o NOTIFY (install_triggers.sql)
+NOTIFY_TRIGGERS = """
+    SELECT EXISTS (SELECT 1 FROM pg_trigger t JOIN pg_proc p ON p.oid = t.tgfoid
+                   WHERE p.proname = 'notificar_alteracao' AND NOT t.tgisinternal)
+"""
+
+CACHE_DEFAULTS = {
+    # processos que atendem o app (serve.py informa o --workers; uvicorn e
+    # gunicorn iniciados à mão informam WEB_CONCURRENCY)
+    'SERVER_WORKERS': int(os.environ.get('WEB_CONCURRENCY', 1)),
+    'LOOKUP_CACHE_MAXSIZE': 128,    # consultas guardadas
+    'LOOKUP_CACHE_TTL': 300.0,      # segundos
+    'LOOKUP_CACHE_LISTEN': None,    # LISTEN/NOTIFY (também das páginas); None: com SERVER_WORKERS > 1
+    'ROW_CACHE_MAXSIZE': 1024,      # registros guardados por cached_row
+    'ROW_CACHE_TTL': 60.0,          # segundos
+    'PAGE_CACHE': 'memory',         # 'memory', 'disk' ou None (desligado)
+    'PAGE_CACHE_MAXSIZE': 256,      # páginas guardadas
+    'PAGE_CACHE_TTL': 60.0,         # segundos
+    'PAGE_CACHE_DIR': None,         # backend 'disk' (padrão: <instance>/page_cache)
+}
+
+# Ausência de valor em lookup(); None e () são valores válidos
+MISSING = object()
+
+
+class LookupCache:
+    """Cache LRU com TTL em memória cujas chaves começam pelo nome da tabela."""
+
+    def __init__(self, maxsize=128, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # chave -> (instante da carga, valor)
+        self._generations = {}          # tabela -> contador de invalidações
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, loader):
+        """Valor em cache para ``key``, carregado com ``loader()`` se ausente ou expirado."""
+        generation = self.generation(key[0])
+        value = self.lookup(key)
+        if value is MISSING:
+            value = loader()
+            self.store(key, value, generation)
+        return value
+
+    def generation(self, table):
+        """Contador de invalidações de ``table``; passado a store() depois da carga"""
+        with self._lock:
+            return self._generations.get(table, 0)
+
+    def lookup(self, key):
+        """Valor em cache para ``key``, ou MISSING se ausente ou expirado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return MISSING
+
+    def store(self, key, value, generation):
+        with self._lock:
+            # Se a tabela foi alterada durante a carga, o valor já nasce velho
+            if self._generations.get(key[0], 0) == generation:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, table):
+        table = table.lower()
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for table in {k[0] for k in self._entries}:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class DiskCache:
+    """Cache LRU com TTL em arquivos: um diretório por tabela, um arquivo por chave.
+
+    Os processos da mesma máquina compartilham as entradas, e invalidar uma
+    tabela apaga o diretório dela para todos. A geração de cada tabela
+    também é compartilhada: uma marca aleatória gravada no diretório, que
+    some com ele. O TTL conta da gravação (mtime); o último acesso (atime,
+    atualizado a cada acerto) ordena os descartes quando há mais de
+    ``maxsize`` arquivos.
+    """
+
+    PRUNE_EVERY = 32   # gravações entre verificações do limite de arquivos
+    GENERATION_FILE = '.geracao'
+
+    def __init__(self, directory, maxsize=256, ttl=60.0):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key[1:]).encode()).hexdigest()
+        return os.path.join(self.directory, key[0], digest)
+
+    def _read_generation(self, table):
+        try:
+            with open(os.path.join(self.directory, table, self.GENERATION_FILE)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def generation(self, table):
+        """Marca do diretório de ``table``, criada se ainda não existir"""
+        current = self._read_generation(table)
+        if current is not None:
+            return current
+        token = uuid.uuid4().hex
+        try:
+            os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+            fd = os.open(os.path.join(self.directory, table, self.GENERATION_FILE),
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            # Criada ao mesmo tempo por outro processo
+            return self._read_generation(table)
+        except OSError:
+            return None
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        return token
+
+    def lookup(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime < self.ttl:
+                # Arquivos gravados apenas por store(), no diretório do próprio app
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                os.utime(path, (time.time(), stat.st_mtime))
+                with self._lock:
+                    self.hits += 1
+                return value
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    def store(self, key, value, generation):
+        if generation is None:
+            return
+        with self._lock:
+            self._stores += 1
+            prune = self._stores % self.PRUNE_EVERY == 0
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            # O diretório é criado por generation(); se sumiu, houve invalidação
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Tabela invalidada durante a carga, por este ou outro processo: não guarda
+            if self._read_generation(key[0]) != generation:
+                raise OSError
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        if prune:
+            self._prune()
+
+    def _files(self):
+        """(atime, mtime, caminho) de cada entrada"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp') or name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_atime, stat.st_mtime, path))
+        return files
+
+    def _prune(self):
+        """Apaga as entradas expiradas e as menos usadas acima de ``maxsize``"""
+        now = time.time()
+        files = []
+        for atime, mtime, path in self._files():
+            if now - mtime >= self.ttl:
+                self._remove(path)
+            else:
+                files.append((atime, path))
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.maxsize)]:
+            if self._remove(path):
+                with self._lock:
+                    self.evictions += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _drop_directory(self, name):
+        # Renomeia antes de apagar: novas gravações já caem em um diretório vazio
+        path = os.path.join(self.directory, name)
+        trash = os.path.join(self.directory, f".{name}.{uuid.uuid4().hex}")
+        try:
+            os.rename(path, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def invalidate(self, table):
+        with self._lock:
+            self.invalidations += 1
+        self._drop_directory(table.lower())
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if not name.startswith('.'):
+                self._drop_directory(name)
+
+    def stats(self):
+        entries = len(self._files())
+        with self._lock:
+            return {
+                'entries': entries,
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def _invalidate_state(state, table):
+    """Descarta as consultas e os registros de ``table`` e as páginas que dependem dela"""
+    state['cache'].invalidate(table)
+    state['rows'].invalidate(table)
+    if state['pages'] is not None:
+        for page in state['page_dependents'](table):
+            state['pages'].invalidate(page)
+
+
+def _listen(state, logger):
+    """Invalida os caches a cada NOTIFY recebido (payload = nome da tabela).
+
+    ``state['listening']`` só é ligado depois do LISTEN e da verificação dos
+    triggers; sem eles nenhum NOTIFY chegaria e os caches ficariam velhos.
+    """
+    listening = state['listening']
+    warned = False
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while True:
+                if not listening.is_set():
+                    cur.execute(NOTIFY_TRIGGERS)
+                    if cur.fetchone()[0]:
+                        # Notificações perdidas antes do LISTEN ou enquanto desconectado
+                        _clear_state(state)
+                        listening.set()
+                    elif not warned:
+                        warned = True
+                        logger.error("LISTEN %s sem os triggers de install_triggers.sql: "
+                                     "caches em memória ignorados até a instalação", NOTIFY_CHANNEL)
+                timeout = 60 if listening.is_set() else 10
+                if select.select([conn], [], [], timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _invalidate_state(state, conn.notifies.pop(0).payload)
+        except psycopg2.Error as e:
+            listening.clear()
+            logger.warning("LISTEN %s interrompido (%s): caches em memória ignorados até reconectar",
+                           NOTIFY_CHANNEL, e)
+            if conn is not None:
+                conn.close()
+            time.sleep(5)
+
+
+def _clear_state(state):
+    state['cache'].clear()
+    state['rows'].clear()
+    if state['pages'] is not None:
+        state['pages'].clear()
+
+
+def listen_enabled(config):
+    """LOOKUP_CACHE_LISTEN, ou, se None, se há mais de um processo atendendo o app"""
+    listen = config['LOOKUP_CACHE_LISTEN']
+    return config['SERVER_WORKERS'] > 1 if listen is None else bool(listen)
+
+
+def _state():
+    """Estado dos caches no app; inicia o listener na primeira chamada de cada processo."""
+    state = current_app.extensions['lookup_cache']
+    if state['pages'] is MISSING:
+        state['pages'] = _create_page_cache(current_app)
+    if state['pid'] != os.getpid():
+        state['pid'] = os.getpid()
+        # Após o fork, o processo filho ainda não escuta nada
+        state['listening'] = threading.Event()
+        if listen_enabled(current_app.config):
+            threading.Thread(target=_listen, args=(state, current_app.logger),
+                             name='gedeu-lookup-listener', daemon=True).start()
+        elif current_app.config['SERVER_WORKERS'] > 1:
+            current_app.logger.warning(
+                "LOOKUP_CACHE_LISTEN desligado com %d processos: caches em memória ignorados",
+                current_app.config['SERVER_WORKERS'])
+    return state
+
+
+def _coherent(state):
+    """Os caches em memória do processo valem: ele é o único ou o LISTEN está ativo"""
+    return current_app.config['SERVER_WORKERS'] <= 1 or state['listening'].is_set()
+
+
+def coherent():
+    """Se as invalidações dos outros processos chegam aos caches em memória deste"""
+    return _coherent(_state())
+
+
+def status():
+    """Processos, LISTEN configurado e ativo, e se os caches em memória estão em uso"""
+    state = _state()
+    return {
+        'workers': current_app.config['SERVER_WORKERS'],
+        'listen': listen_enabled(current_app.config),
+        'listening': state['listening'].is_set(),
+        'coherent': _coherent(state),
+    }
+
+
+def get_cache():
+    """Cache de consultas do processo."""
+    return _state()['cache']
+
+
+def get_row_cache():
+    """Cache de registros do processo (cached_row)."""
+    return _state()['rows']
+
+
+def get_page_cache():
+    """Cache de páginas do processo, ou None se PAGE_CACHE estiver desligado.
+
+    O backend 'memory' também fica de fora enquanto as invalidações dos
+    outros processos não chegam a este (ver coherent()).
+    """
+    state = _state()
+    pages = state['pages']
+    if isinstance(pages, LookupCache) and not _coherent(state):
+        return None
+    return pages
+
+
+def _create_page_cache(app):
+    backend = app.config['PAGE_CACHE']
+    maxsize, ttl = app.config['PAGE_CACHE_MAXSIZE'], app.config['PAGE_CACHE_TTL']
+    if backend == 'memory':
+        return LookupCache(maxsize, ttl)
+    if backend == 'disk':
+        directory = app.config['PAGE_CACHE_DIR'] or os.path.join(app.instance_path, 'page_cache')
+        return DiskCache(directory, maxsize, ttl)
+    if backend:
+        raise ValueError(f"PAGE_CACHE inválido: {backend!r} (use 'memory', 'disk' ou None)")
+    return None
+
+
+def lookup(table, columns, where=None, order_by=None):
+    """Linhas de ``SELECT columns FROM table [WHERE] [ORDER BY]``, via cache.
+
+    Os argumentos são sempre constantes do código, nunca entrada do usuário.
+    """
+    key = (table.lower(), tuple(columns), where, order_by)
+
+    def load():
+        query = f"SELECT {', '.join(columns)} FROM {table}"
+        if where:
+            query += f" WHERE {where}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        cur = get_db().cursor()
+        cur.execute(query)
+        rows = tuple(cur.fetchall())
+        cur.close()
+        return rows
+
+    state = _state()
+    if not _coherent(state):
+        return load()
+    return state['cache'].get(key, load)
+
+
+def cached_row(table, key, loader):
+    """Registro de ``table`` com a chave ``key``, lido com ``loader()`` se não estiver em cache.
+
+    É descartado com a tabela: pelas rotas de escrita do app e, nos outros
+    processos, pelo NOTIFY. Registros ausentes (None) não são guardados.
+    """
+    state = _state()
+    if not _coherent(state):
+        return loader()
+    rows = state['rows']
+    cache_key = (table.lower(), key)
+    generation = rows.generation(cache_key[0])
+    value = rows.lookup(cache_key)
+    if value is MISSING:
+        value = loader()
+        if value is not None:
+            rows.store(cache_key, value, generation)
+    return value
+
+
+def cached_page(page_for):
+    """Guarda as respostas 200 da rota no cache de páginas.
+
+    ``page_for(**argumentos da rota)`` diz a tabela ou view exibida (ou None
+    para não guardar); a chave é essa página mais o caminho e os parâmetros
+    da URL. Só respostas a GET são guardadas, sem os cabeçalhos.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            page = page_for(**kwargs)
+            pages = get_page_cache()
+            if page is None or pages is None or request.method != 'GET':
+                return view(**kwargs)
+            key = (page.lower(), request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = pages.lookup(key)
+            if entry is not MISSING:
+                body, mimetype = entry
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            generation = pages.generation(key[0])
+            response = current_app.make_response(view(**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                pages.store(key, (response.get_data(), response.mimetype), generation)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*tables):
+    """Descarta as consultas de ``tables`` e as páginas que dependem delas"""
+    state = _state()
+    for table in tables:
+        _invalidate_state(state, table)
+
+
+def init_app(app, page_dependents=None):
+    """``page_dependents(tabela)``: páginas a descartar quando a tabela muda (padrão: ela mesma)"""
+    for name, value in CACHE_DEFAULTS.items():
+        app.config.setdefault(name, value)
+    app.extensions['lookup_cache'] = {
+        'cache': LookupCache(app.config['LOOKUP_CACHE_MAXSIZE'], app.config['LOOKUP_CACHE_TTL']),
+        'rows': LookupCache(app.config['ROW_CACHE_MAXSIZE'], app.config['ROW_CACHE_TTL']),
+        'pages': MISSING,   # criado no primeiro uso, com a configuração da época
+        'page_dependents': page_dependents or (lambda table: [table]),
+        'pid': None,        # processo em que o listener foi iniciado
+        'listening': threading.Event(),
+    }
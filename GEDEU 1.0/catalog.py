@@ -0,0 +1,211 @@
+"""Catálogo do schema: colunas, tipos e chaves de cada tabela, lidos do pg_catalog.
+
+As rotas genéricas (listagem, inclusão, edição, exclusão, API) precisam das
+colunas e da chave primária de cada tabela. Em vez de um ``SELECT * ... LIMIT 0``
+por requisição e de dicionários mantidos à mão, o catálogo é lido uma vez
+por processo (no master, com serve.py) e consultado em memória.
+
+A versão do schema (quantidade e xmin das linhas de pg_attribute e de
+pg_constraint das tabelas do schema) é conferida a cada SCHEMA_CATALOG_CHECK
+segundos; se mudou, por um ALTER TABLE ou uma migração, o catálogo é relido.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from database import get_db
+
+CATALOG_DEFAULTS = {
+    'SCHEMA_CATALOG_CHECK': 30.0,   # segundos entre verificações da versão (None desativa)
+}
+
+# Tipos cujo conteúdo não é exibido nem editado pelos formulários
+LARGE_OBJECT_TYPES = {'bytea', 'oid'}
+
+SCHEMA_VERSION = """
+    SELECT concat_ws('/',
+        (SELECT count(*) || '.' || coalesce(max(a.xmin::text::bigint), 0)
+         FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid
+         WHERE c.relnamespace = current_schema()::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm')),
+        (SELECT count(*) || '.' || coalesce(max(xmin::text::bigint), 0)
+         FROM pg_constraint WHERE connamespace = current_schema()::regnamespace))
+"""
+
+COLUMNS = """
+    SELECT c.relname, c.relkind, a.attname, format_type(a.atttypid, a.atttypmod), t.typname,
+           CASE WHEN a.atttypmod > 4 AND t.typname IN ('varchar', 'bpchar') THEN a.atttypmod - 4 END,
+           a.attnotnull, a.atthasdef,
+           a.attidentity <> '' OR a.attgenerated <> ''
+               OR coalesce(pg_get_expr(d.adbin, d.adrelid), '') LIKE 'nextval(%'
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE c.relnamespace = current_schema()::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm')
+    ORDER BY c.relname, a.attnum
+"""
+
+CONSTRAINTS = """
+    SELECT c.relname, con.contype,
+           ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord),
+           r.relname,
+           ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord)
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    LEFT JOIN pg_class r ON r.oid = con.confrelid
+    WHERE con.connamespace = current_schema()::regnamespace AND con.contype IN ('p', 'f')
+    ORDER BY c.relname, con.conname
+"""
+
+KINDS = {'r': 'table', 'p': 'table', 'v': 'view', 'm': 'matview'}
+
+
+class Column:
+    """Uma coluna: tipo, tamanho máximo (varchar/char) e se é obrigatória."""
+
+    __slots__ = ('name', 'type', 'type_name', 'max_length', 'not_null', 'has_default', 'generated')
+
+    def __init__(self, name, type, type_name, max_length, not_null, has_default, generated):
+        self.name = name
+        self.type = type                # como em format_type(): 'character varying(100)'
+        self.type_name = type_name      # nome do tipo: 'varchar'
+        self.max_length = max_length
+        self.not_null = not_null
+        self.has_default = has_default
+        self.generated = generated      # SERIAL, IDENTITY ou GENERATED: preenchida pelo banco
+
+    @property
+    def required(self):
+        return self.not_null and not self.has_default and not self.generated
+
+    @property
+    def large_object(self):
+        return self.type_name in LARGE_OBJECT_TYPES
+
+    def __repr__(self):
+        return f"<Column {self.name} {self.type}>"
+
+
+class Table:
+    """Tabela ou view do schema, com colunas na ordem do banco e chaves."""
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind                # 'table', 'view' ou 'matview'
+        self.columns = {}               # nome -> Column, na ordem do banco
+        self.primary_key = []
+        self.foreign_keys = {}          # coluna -> (tabela referenciada, coluna referenciada)
+
+    @property
+    def column_names(self):
+        return list(self.columns)
+
+    @property
+    def large_objects(self):
+        return [name for name, column in self.columns.items() if column.large_object]
+
+    @property
+    def insertable(self):
+        """Colunas informadas em um INSERT (as geradas pelo banco ficam de fora)"""
+        return [name for name, column in self.columns.items() if not column.generated]
+
+    def __repr__(self):
+        return f"<Table {self.name} {self.column_names}>"
+
+
+class Catalog:
+    """Tabelas e views do schema atual; nomes sem diferença de maiúsculas."""
+
+    def __init__(self, tables, version):
+        self.tables = tables            # nome em minúsculas -> Table
+        self.version = version
+        self.loaded_at = time.time()
+
+    def table(self, name):
+        try:
+            return self.tables[name.lower()]
+        except KeyError:
+            raise KeyError(f"Tabela ou view fora do catálogo: {name}") from None
+
+    def __contains__(self, name):
+        return name.lower() in self.tables
+
+
+def schema_version(cur):
+    cur.execute(SCHEMA_VERSION)
+    return cur.fetchone()[0]
+
+
+def load_catalog(cur):
+    """Lê o catálogo do schema atual (três consultas ao pg_catalog)"""
+    version = schema_version(cur)
+    tables = {}
+    cur.execute(COLUMNS)
+    for relname, relkind, name, type_, type_name, max_length, not_null, has_default, generated in cur.fetchall():
+        table = tables.get(relname)
+        if table is None:
+            table = tables[relname] = Table(relname, KINDS[relkind])
+        table.columns[name] = Column(name, type_, type_name, max_length, not_null, has_default, generated)
+    cur.execute(CONSTRAINTS)
+    for relname, contype, columns, ref_table, ref_columns in cur.fetchall():
+        table = tables[relname]
+        if contype == 'p':
+            table.primary_key = columns
+        elif len(columns) == 1:
+            table.foreign_keys[columns[0]] = (ref_table, ref_columns[0])
+    return Catalog(tables, version)
+
+
+def get_catalog():
+    """Catálogo do processo, lido na primeira chamada e relido se o schema mudar"""
+    state = current_app.extensions['schema_catalog']
+    interval = current_app.config['SCHEMA_CATALOG_CHECK']
+
+    def fresh():
+        return state['catalog'] is not None and (
+            interval is None or time.monotonic() - state['checked_at'] < interval)
+
+    if fresh():
+        return state['catalog']
+    with state['lock']:
+        if fresh():
+            return state['catalog']
+        catalog = state['catalog']
+        now = time.monotonic()
+        cur = get_db().cursor()
+        if catalog is None or schema_version(cur) != catalog.version:
+            if catalog is not None:
+                current_app.logger.info("Schema alterado: relendo o catálogo")
+                state['reloads'] += 1
+            state['catalog'] = load_catalog(cur)
+        state['checked_at'] = now
+        cur.close()
+        return state['catalog']
+
+
+def stats():
+    """Versão e idade do catálogo do processo"""
+    state = current_app.extensions['schema_catalog']
+    catalog = state['catalog']
+    return {
+        'tables': len(catalog.tables) if catalog else 0,
+        'version': catalog.version if catalog else None,
+        'age': round(time.time() - catalog.loaded_at) if catalog else None,
+        'reloads': state['reloads'],
+    }
+
+
+def init_app(app):
+    for name, value in CATALOG_DEFAULTS.items():
+        app.config.setdefault(name, value)
+    app.extensions['schema_catalog'] = {
+        'catalog': None,
+        'checked_at': 0.0,
+        'reloads': 0,
+        'lock': threading.Lock(),
+    }
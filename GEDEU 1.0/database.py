@@ -0,0 +1,358 @@
+"""Pool de conexões PostgreSQL compartilhado pelas rotas do GEDEU.
+
+Cada requisição pega no máximo uma conexão do pool (guardada em ``flask.g``)
+e a devolve automaticamente no teardown do app context.
+"""
+import os
+import threading
+import time
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from flask import g, current_app, has_app_context
+
+from metrics import InstrumentedCursor
+
+# Parâmetros de conexão (podem ser sobrescritos por variáveis de ambiente)
+DB_CONFIG = {
+    'database': os.environ.get('GEDEU_DB_NAME', 'GEDEU'),
+    'host': os.environ.get('GEDEU_DB_HOST', 'localhost'),
+    'user': os.environ.get('GEDEU_DB_USER', 'seu_usuario_aqui'),
+    'password': os.environ.get('GEDEU_DB_PASSWORD', 'sua_senha_aqui'),
+    'port': os.environ.get('GEDEU_DB_PORT', '5432'),
+}
+
+# Valores padrão do pool (sobrescritos por app.config)
+POOL_DEFAULTS = {
+    'DB_POOL_MINCONN': 2,
+    'DB_POOL_MAXCONN': 10,
+    'DB_POOL_TIMEOUT': 10.0,          # segundos esperando uma conexão livre
+    'DB_POOL_HEALTH_CHECK': 30.0,     # segundos ociosa antes de testar com SELECT 1
+    'DB_POOL_MAX_IDLE': 600.0,        # segundos ociosa antes de ser fechada (acima do mínimo)
+    'DB_CONNECT_TIMEOUT': 5,          # segundos para abrir a conexão TCP
+    'DB_STATEMENT_TIMEOUT': 30000,    # milissegundos por comando (0 = sem limite)
+    'DB_PREPARED_STATEMENTS': True,   # PREPARE/EXECUTE dos comandos registrados com prepared()
+}
+
+
+class PoolTimeout(PoolError):
+    """Nenhuma conexão ficou livre dentro do tempo limite."""
+
+
+class ConnectionPool:
+    """Pool limitado de conexões psycopg2 com espera, health check e métricas."""
+
+    def __init__(self, minconn, maxconn, timeout=10.0, health_check=30.0,
+                 max_idle=600.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Limites do pool inválidos")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check = health_check
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # pilha de (conexão, instante da devolução)
+        self._total = 0          # conexões abertas (ociosas + emprestadas)
+        self._checked_out = 0
+        self._waiting = 0
+        self._created = 0
+        self._closed = 0
+        self._timeouts = 0
+        self._failed_checks = 0
+        self._closed_pool = False
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+            self._total += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._closed += 1
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        """Empresta uma conexão, esperando até ``timeout`` segundos se o pool estiver cheio."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed_pool:
+                    raise PoolError("Pool de conexões fechado")
+                while not self._idle and self._total >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Nenhuma conexão livre após {timeout:.1f}s "
+                            f"({self._checked_out}/{self.maxconn} em uso)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    conn, returned_at = None, None
+                    self._total += 1
+                self._checked_out += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except psycopg2.Error:
+                    self._release_slot()
+                    raise
+            if self._is_healthy(conn, time.monotonic() - returned_at):
+                return conn
+            # Conexão quebrada: descarta e tenta de novo
+            with self._cond:
+                self._failed_checks += 1
+            self._discard(conn)
+            self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._total -= 1
+            self._checked_out -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, close=False):
+        """Devolve uma conexão ao pool, desfazendo transações pendentes."""
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        if close or conn.closed or self._closed_pool:
+            self._discard(conn)
+            self._release_slot()
+            return
+        with self._cond:
+            self._checked_out -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        self._prune_idle()
+
+    def _prune_idle(self):
+        """Fecha conexões ociosas há mais de ``max_idle`` mantendo o mínimo."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            while (self._idle and self._total > self.minconn
+                   and now - self._idle[0][1] > self.max_idle):
+                expired.append(self._idle.pop(0)[0])
+                self._total -= 1
+        for conn in expired:
+            self._discard(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed_pool = True
+            idle = [conn for conn, _ in self._idle]
+            self._total -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Métricas instantâneas do pool."""
+        with self._cond:
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'open': self._total,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'waiting': self._waiting,
+                'created': self._created,
+                'closed': self._closed,
+                'timeouts': self._timeouts,
+                'failed_health_checks': self._failed_checks,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_setting(name):
+    return current_app.config.get(name, POOL_DEFAULTS[name])
+
+
+def get_pool():
+    """Retorna o pool do processo, criando-o na primeira chamada."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                kwargs = dict(DB_CONFIG)
+                kwargs['connect_timeout'] = _pool_setting('DB_CONNECT_TIMEOUT')
+                # Consultas, tempo e linhas por requisição (metrics.py)
+                kwargs.setdefault('cursor_factory', InstrumentedCursor)
+                statement_timeout = _pool_setting('DB_STATEMENT_TIMEOUT')
+                if statement_timeout:
+                    kwargs['options'] = f"-c statement_timeout={int(statement_timeout)}"
+                _pool = ConnectionPool(
+                    _pool_setting('DB_POOL_MINCONN'),
+                    _pool_setting('DB_POOL_MAXCONN'),
+                    timeout=_pool_setting('DB_POOL_TIMEOUT'),
+                    health_check=_pool_setting('DB_POOL_HEALTH_CHECK'),
+                    max_idle=_pool_setting('DB_POOL_MAX_IDLE'),
+                    **kwargs
+                )
+    return _pool
+
+
+def get_db():
+    """Conexão da requisição atual (emprestada do pool na primeira chamada)."""
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().getconn()
+    return g.db_conn
+
+
+def release_db(exc=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().putconn(conn)
+
+
+def close_pool():
+    """Fecha as conexões do processo; o próximo get_pool cria um pool novo.
+
+    Usada pelo servidor de produção (serve.py) antes do fork dos workers.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.closeall()
+
+
+# Pools herdados por um processo filho (fork). O socket das conexões é o
+# mesmo do processo pai: o filho não pode usá-las nem fechá-las (o
+# encerramento derrubaria a sessão do pai), então as mantém referenciadas.
+_inherited_pools = []
+
+
+def _forget_pool_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+
+class PreparedStatement:
+    """Comando parametrizado preparado uma vez por conexão e executado pelo nome.
+
+    ``sql`` usa os marcadores do psycopg2 (``%s``), trocados por ``$1..$n``
+    no PREPARE. O PostgreSQL infere o tipo de cada parâmetro pelo contexto;
+    onde ele não for óbvio, use um cast (``%s::INTEGER``). Não use ``%s``
+    dentro de literais.
+    """
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        parts = sql.split('%s')
+        self.param_count = len(parts) - 1
+        numbered = ''.join(f"{part}${i}" for i, part in enumerate(parts[:-1], 1)) + parts[-1]
+        self.prepare_sql = f"PREPARE {name} AS {numbered}"
+        args = ', '.join(['%s'] * self.param_count)
+        self.execute_sql = f"EXECUTE {name} ({args})" if args else f"EXECUTE {name}"
+
+    def __repr__(self):
+        return f"<PreparedStatement {self.name}>"
+
+
+# Comandos registrados, por nome (a ferramenta de planos os prepara também)
+PREPARED_STATEMENTS = {}
+
+# Conexão -> nomes já preparados nela. Um PREPARE vale para a sessão inteira,
+# inclusive depois de um rollback; a entrada some junto com a conexão.
+_prepared_on = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def prepared(name, sql):
+    """Registra um comando para PREPARE/EXECUTE; ``name`` é único no processo"""
+    if name in PREPARED_STATEMENTS:
+        raise ValueError(f"Comando preparado duplicado: {name}")
+    statement = PREPARED_STATEMENTS[name] = PreparedStatement(name, sql)
+    return statement
+
+
+def prepared_names(conn):
+    """Nomes dos comandos já preparados na conexão (conjunto mutável)"""
+    with _prepared_lock:
+        names = _prepared_on.get(conn)
+        if names is None:
+            names = _prepared_on[conn] = set()
+        return names
+
+
+def use_prepared():
+    if has_app_context():
+        return current_app.config.get('DB_PREPARED_STATEMENTS', POOL_DEFAULTS['DB_PREPARED_STATEMENTS'])
+    return POOL_DEFAULTS['DB_PREPARED_STATEMENTS']
+
+
+def execute(cur, statement, params=None):
+    """``cur.execute`` de um SQL ou de um PreparedStatement
+
+    Na primeira vez em cada conexão o comando é preparado; depois só o
+    EXECUTE (com os parâmetros) vai ao servidor, que reaproveita a análise
+    e, após algumas execuções, o plano. Com DB_PREPARED_STATEMENTS = False
+    o SQL do comando é executado diretamente.
+    """
+    if not isinstance(statement, PreparedStatement):
+        return cur.execute(statement, params)
+    if not use_prepared():
+        return cur.execute(statement.sql, params)
+    names = prepared_names(cur.connection)
+    if statement.name not in names:
+        cur.execute(statement.prepare_sql)
+        names.add(statement.name)
+    return cur.execute(statement.execute_sql, params)
+
+
+def init_app(app):
+    for name, value in POOL_DEFAULTS.items():
+        app.config.setdefault(name, value)
+    app.teardown_appcontext(release_db)
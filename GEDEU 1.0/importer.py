@@ -0,0 +1,324 @@
+"""Importação em lote de arquivos CSV (atletas, partidas, presenças...).
+
+O arquivo é lido em lotes e validado coluna a coluna com as mesmas regras
+dos formulários (FIELD_RULES) e com os tipos das colunas no banco. As linhas
+válidas seguem por COPY FROM STDIN para uma tabela temporária; lá os nomes
+das chaves estrangeiras viram códigos (via FK_FIELDS) e o conteúdo é
+mesclado na tabela de destino em uma única transação. As linhas rejeitadas,
+com os motivos, vão para um relatório CSV.
+"""
+import csv
+import io
+import re
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+# Regras dos campos de texto: coluna -> (expressão regular, mensagem de erro).
+# Usadas pelos formulários de inclusão/edição e pela importação.
+FIELD_RULES = {
+    'matricula_unb': (r'\d{9}', "Matrícula deve conter exatamente 9 números."),
+    'email_atleta': (r"[^@]+@[^@]+\.[^@]+", "E-mail inválido."),
+    'email_treinador': (r"[^@]+@[^@]+\.[^@]+", "E-mail inválido."),
+    'telefone_atleta': (r'\d{11}', "Telefone deve conter exatamente 11 números."),
+    'telefone_treinador': (r'\d{11}', "Telefone deve conter exatamente 11 números."),
+}
+
+BATCH_SIZE = 1000
+
+TRUE_VALUES = {'true', 't', '1', 'sim', 's', 'yes', 'y', 'on', 'x', 'verdadeiro'}
+FALSE_VALUES = {'false', 'f', '0', 'não', 'nao', 'n', 'no', 'off', 'falso'}
+
+
+class InvalidImport(ValueError):
+    """O arquivo não pode ser importado (cabeçalho ou tabela inválidos)."""
+
+
+def check_field(col, value):
+    """Mensagem de erro de FIELD_RULES para ``value``, ou None se for válido."""
+    rule = FIELD_RULES.get(col)
+    if rule and (not value or not re.fullmatch(rule[0], value)):
+        return rule[1]
+    return None
+
+
+def _parse_date(value):
+    try:
+        if '/' in value:
+            return datetime.strptime(value, '%d/%m/%Y').date()
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError("data inválida (use AAAA-MM-DD ou DD/MM/AAAA)") from None
+
+
+def _parse_time(value):
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        raise ValueError("horário inválido (use HH:MM)") from None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("número inteiro inválido") from None
+
+
+def _parse_numeric(value):
+    try:
+        return Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError("número inválido") from None
+
+
+def _parse_bool(value):
+    lowered = value.lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise ValueError("use sim/não ou true/false")
+
+
+PARSERS = {
+    'int2': _parse_int, 'int4': _parse_int, 'int8': _parse_int,
+    'numeric': _parse_numeric,
+    'date': _parse_date,
+    'time': _parse_time,
+    'bool': _parse_bool,
+}
+
+
+def column_validator(column, fk_columns):
+    """Função que normaliza um valor da coluna ou levanta ValueError com o motivo"""
+    name, type_name, max_length, not_null = column
+    parse = None if name in fk_columns else PARSERS.get(type_name)
+
+    def validate(value):
+        value = value.strip() if value is not None else ''
+        if name.startswith('status_') and not value:
+            return False   # como a caixa de seleção desmarcada dos formulários
+        if name in FIELD_RULES:
+            error = check_field(name, value)
+            if error:
+                raise ValueError(error)
+        if not value:
+            if not_null:
+                raise ValueError("obrigatório")
+            return None
+        if parse:
+            return parse(value)
+        if max_length and len(value) > max_length:
+            raise ValueError(f"máximo de {max_length} caracteres")
+        return value
+
+    return validate
+
+
+def table_columns(cur, table):
+    """(nome, tipo, tamanho máximo, NOT NULL sem default) das colunas importáveis.
+
+    Colunas preenchidas por sequência (SERIAL) ficam de fora.
+    """
+    cur.execute("""
+        SELECT a.attname, t.typname,
+               CASE WHEN a.atttypmod > 4 AND t.typname IN ('varchar', 'bpchar') THEN a.atttypmod - 4 END,
+               a.attnotnull AND NOT a.atthasdef,
+               format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+          AND a.attgenerated = ''
+          AND coalesce(pg_get_expr(d.adbin, d.adrelid), '') NOT LIKE 'nextval(%%'
+        ORDER BY a.attnum
+    """, (table.lower(),))
+    return cur.fetchall()
+
+
+class _CopyStream:
+    """Arquivo somente leitura sobre um gerador de linhas, para copy_expert."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _batches(reader, batch_size):
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_csv(conn, table, stream, fk_fields, merge_keys, report=None,
+               delimiter=',', batch_size=BATCH_SIZE, dry_run=False):
+    """Importa o CSV ``stream`` para ``table`` em uma transação.
+
+    ``fk_fields`` é FK_FIELDS[table]; ``merge_keys`` são as colunas que
+    identificam uma linha já cadastrada (atualizada em vez de inserida).
+    As linhas rejeitadas são escritas em ``report`` (CSV: linha, erros e os
+    valores lidos). Com ``dry_run`` tudo é desfeito no final.
+    Retorna {'lidas', 'inseridas', 'atualizadas', 'rejeitadas'}.
+    """
+    reader = csv.reader(stream, delimiter=delimiter)
+    header = [name.strip().lower() for name in next(reader, [])]
+    cur = conn.cursor()
+    columns = {col[0]: col for col in table_columns(cur, table)}
+    unknown = [name for name in header if name not in columns]
+    if unknown:
+        raise InvalidImport(f"Colunas desconhecidas em {table}: {', '.join(unknown)}")
+    missing = [name for name, col in columns.items() if col[3] and name not in header]
+    missing += [key for key in merge_keys if key not in header and key not in missing]
+    if missing:
+        raise InvalidImport(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    if len(set(header)) != len(header):
+        raise InvalidImport("Colunas repetidas no cabeçalho")
+
+    fk_columns = [name for name in header if name in fk_fields]
+    validators = [column_validator(columns[name][:4], fk_columns) for name in header]
+    report_writer = csv.writer(report) if report else None
+    if report_writer:
+        report_writer.writerow(['linha', 'erros'] + header)
+    stats = {'lidas': 0, 'inseridas': 0, 'atualizadas': 0, 'rejeitadas': 0}
+
+    def reject(line, errors, values):
+        stats['rejeitadas'] += 1
+        if report_writer:
+            report_writer.writerow([line, '; '.join(errors)] + ['' if v is None else v for v in values])
+
+    def valid_lines():
+        """Linhas válidas no formato CSV do COPY, validadas coluna a coluna por lote"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for batch in _batches(reader, batch_size):
+            stats['lidas'] += len(batch)
+            errors = [[] for _ in batch]
+            rows = []
+            for (line, row), row_errors in zip(batch, errors):
+                if len(row) != len(header):
+                    row_errors.append(f"esperadas {len(header)} colunas, encontradas {len(row)}")
+                    row = (row + [''] * len(header))[:len(header)]
+                rows.append(list(row))
+            for j, (name, validate) in enumerate(zip(header, validators)):
+                for i, row in enumerate(rows):
+                    try:
+                        row[j] = validate(row[j])
+                    except ValueError as e:
+                        errors[i].append(f"{name}: {e}")
+            for (line, raw), row, row_errors in zip(batch, rows, errors):
+                if row_errors:
+                    reject(line, row_errors, raw)
+                else:
+                    writer.writerow([line] + row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    staging = f"importacao_{table.lower()}"
+    try:
+        cur.execute(f"""
+            CREATE TEMP TABLE {staging} (
+                linha INT,
+                {', '.join(f'{name} TEXT' for name in header)},
+                {''.join(f'{name}_id INT, ' for name in fk_columns)}
+                erros TEXT[] NOT NULL DEFAULT '{{}}'
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY {staging} (linha, {', '.join(header)}) FROM STDIN WITH (FORMAT csv)",
+            _CopyStream(valid_lines())
+        )
+
+        # Nomes das FKs -> códigos; sem nome correspondente, aceita o próprio código
+        for name in fk_columns:
+            ref_table, pk_col, name_col = fk_fields[name]
+            cur.execute(f"""
+                UPDATE {staging} s
+                SET {name}_id = CASE WHEN r.n = 1 THEN r.pk END,
+                    erros = CASE WHEN r.n > 1
+                                 THEN array_append(erros, '{name}: "' || s.{name} || '" é ambíguo em {ref_table}, use o código')
+                                 ELSE erros END
+                FROM (SELECT {name_col}::text AS nome, min({pk_col}) AS pk, count(*) AS n
+                      FROM {ref_table} GROUP BY 1) r
+                WHERE r.nome = s.{name}
+            """)
+            cur.execute(f"""
+                UPDATE {staging} s SET {name}_id = r.{pk_col}
+                FROM {ref_table} r
+                WHERE s.{name}_id IS NULL AND s.{name} ~ '^[0-9]{{1,9}}$' AND r.{pk_col} = s.{name}::int
+                  AND NOT EXISTS (SELECT 1 FROM {ref_table} x WHERE x.{name_col}::text = s.{name})
+            """)
+            cur.execute(f"""
+                UPDATE {staging} s
+                SET erros = array_append(erros, '{name}: "' || s.{name} || '" não encontrado em {ref_table}')
+                WHERE s.{name} IS NOT NULL AND s.{name}_id IS NULL
+                  AND NOT EXISTS (SELECT 1 FROM {ref_table} x WHERE x.{name_col}::text = s.{name})
+            """)
+
+        types = {name: columns[name][4] for name in header}
+        exprs = {name: f"s.{name}_id" if name in fk_columns else f"s.{name}::{types[name]}"
+                 for name in header}
+
+        # Mesma chave repetida no arquivo: vale a primeira ocorrência
+        if merge_keys:
+            cur.execute(f"""
+                UPDATE {staging} s
+                SET erros = array_append(erros, 'repetida no arquivo (linha ' || d.primeira || ')')
+                FROM (SELECT linha, first_value(linha) OVER w AS primeira, row_number() OVER w AS n
+                      FROM {staging} s
+                      WHERE erros = '{{}}'
+                      WINDOW w AS (PARTITION BY {', '.join(exprs[key] for key in merge_keys)} ORDER BY linha)) d
+                WHERE d.linha = s.linha AND d.n > 1
+            """)
+
+        cur.execute(f"SELECT linha, erros, {', '.join(header)} FROM {staging} WHERE erros <> '{{}}' ORDER BY linha")
+        for line, errors, *values in cur.fetchall():
+            reject(line, errors, values)
+
+        # Mescla: atualiza as linhas já cadastradas e insere as novas
+        cur.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        source = f"SELECT {', '.join(f'{expr} AS {name}' for name, expr in exprs.items())} FROM {staging} s WHERE s.erros = '{{}}'"
+        match = ' AND '.join(f"t.{key} = src.{key}" for key in merge_keys)
+        updates = [name for name in header if name not in merge_keys]
+        if merge_keys and updates:
+            cur.execute(f"""
+                UPDATE {table} t SET {', '.join(f'{name} = src.{name}' for name in updates)}
+                FROM ({source}) src WHERE {match}
+            """)
+            stats['atualizadas'] = cur.rowcount
+        elif merge_keys:
+            cur.execute(f"SELECT count(*) FROM {table} t JOIN ({source}) src ON {match}")
+            stats['atualizadas'] = cur.fetchone()[0]
+        cur.execute(f"""
+            INSERT INTO {table} ({', '.join(header)})
+            SELECT * FROM ({source}) src
+            {f'WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})' if merge_keys else ''}
+        """)
+        stats['inseridas'] = cur.rowcount
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    return stats
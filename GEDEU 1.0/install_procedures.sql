@@ -1,15 +1,23 @@
 -- PROCEDURE 1: RELATORIO_PRESENCA_EQUIPE
 
 -- Propósito: Gera um relatório completo de presença para uma equipe específica
---            incluindo dados de treinamentos e partidas
+--            incluindo dados de treinamentos e partidas, opcionalmente
+--            limitado a um período
 -- 
 -- Como funciona:
--- - Recebe um código de equipe como parâmetro
+-- - Recebe um código de equipe e, opcionalmente, data inicial e final
+--   (NULL = sem limite naquele lado)
 -- - Busca todos os atletas da equipe
--- - Calcula estatísticas de presença em treinamentos e partidas
+-- - Filtra os treinamentos (data_treinamento) e partidas (data_partida) do
+--   período antes de agregar, usando os índices por data: o relatório de uma
+--   temporada lê só as presenças daquela temporada
+-- - Sem período (as duas datas NULL), lê os totais já somados em
+--   Estatistica_Atleta, sem percorrer o histórico de presenças
+-- - Agrega treinamentos e partidas separadamente, por atleta (sem o produto
+--   treinamentos x partidas de um JOIN direto)
 -- - Retorna dados agregados e individuais de cada atleta
 
-CREATE OR REPLACE FUNCTION relatorio_presenca_equipe(equipe_id INTEGER)
+CREATE OR REPLACE FUNCTION relatorio_presenca_equipe(equipe_id INTEGER, data_inicio DATE, data_fim DATE)
 RETURNS TABLE(
     id_atleta INTEGER,
     nome_atleta VARCHAR(100),
@@ -21,42 +29,240 @@ RETURNS TABLE(
     percentual_partidas NUMERIC
 ) AS $$
 BEGIN
+    IF data_inicio IS NULL AND data_fim IS NULL THEN
+        RETURN QUERY
+        SELECT 
+            a.id_atleta,
+            a.nome_atleta,
+            COALESCE(s.treinamentos_convocado, 0)::BIGINT,
+            COALESCE(s.treinamentos_presente, 0)::BIGINT,
+            COALESCE(ROUND(s.treinamentos_presente * 100.0 / NULLIF(s.treinamentos_convocado, 0), 2), 0),
+            COALESCE(s.partidas_convocado, 0)::BIGINT,
+            COALESCE(s.partidas_presente, 0)::BIGINT,
+            COALESCE(ROUND(s.partidas_presente * 100.0 / NULLIF(s.partidas_convocado, 0), 2), 0)
+        FROM Atleta a
+        LEFT JOIN Estatistica_Atleta s ON s.id_atleta = a.id_atleta
+        WHERE a.cod_equipe = equipe_id
+        ORDER BY a.nome_atleta;
+        RETURN;
+    END IF;
+    
     RETURN QUERY
     SELECT 
         a.id_atleta,
         a.nome_atleta,
         
         -- Estatísticas de treinamentos
-        COUNT(DISTINCT pt.cod_treinamento) as total_treinamentos,
-        COUNT(CASE WHEN pt.presenca = true THEN 1 END) as presencas_treinamentos,
-        COALESCE(
-            ROUND(
-                (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pt.cod_treinamento), 0)), 2
-            ), 0
-        ) as percentual_treinamentos,
+        COALESCE(pt.convocacoes, 0) as total_treinamentos,
+        COALESCE(pt.presentes, 0) as presencas_treinamentos,
+        COALESCE(ROUND(pt.presentes * 100.0 / NULLIF(pt.convocacoes, 0), 2), 0) as percentual_treinamentos,
         
         -- Estatísticas de partidas
-        COUNT(DISTINCT pp.cod_partida) as total_partidas,
-        COUNT(CASE WHEN pp.presenca = true THEN 1 END) as presencas_partidas,
-        COALESCE(
-            ROUND(
-                (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pp.cod_partida), 0)), 2
-            ), 0
-        ) as percentual_partidas
+        COALESCE(pp.convocacoes, 0) as total_partidas,
+        COALESCE(pp.presentes, 0) as presencas_partidas,
+        COALESCE(ROUND(pp.presentes * 100.0 / NULLIF(pp.convocacoes, 0), 2), 0) as percentual_partidas
         
     FROM Atleta a
-    LEFT JOIN Presenca_Treinamento pt ON a.id_atleta = pt.id_atleta
-    LEFT JOIN Presenca_Partida pp ON a.id_atleta = pp.id_atleta
+    LEFT JOIN (
+        SELECT p.id_atleta,
+               COUNT(*) as convocacoes,
+               COUNT(*) FILTER (WHERE p.presenca = true) as presentes
+        FROM Treinamento t
+        JOIN Presenca_Treinamento p ON p.cod_treinamento = t.cod_treinamento
+        JOIN Atleta at2 ON at2.id_atleta = p.id_atleta AND at2.cod_equipe = equipe_id
+        WHERE t.data_treinamento >= COALESCE(data_inicio, '-infinity'::DATE)
+          AND t.data_treinamento <= COALESCE(data_fim, 'infinity'::DATE)
+        GROUP BY p.id_atleta
+    ) pt ON pt.id_atleta = a.id_atleta
+    LEFT JOIN (
+        SELECT p.id_atleta,
+               COUNT(*) as convocacoes,
+               COUNT(*) FILTER (WHERE p.presenca = true) as presentes
+        FROM Partida pa
+        JOIN Presenca_Partida p ON p.cod_partida = pa.cod_partida
+        JOIN Atleta at2 ON at2.id_atleta = p.id_atleta AND at2.cod_equipe = equipe_id
+        WHERE pa.data_partida >= COALESCE(data_inicio, '-infinity'::DATE)
+          AND pa.data_partida <= COALESCE(data_fim, 'infinity'::DATE)
+        GROUP BY p.id_atleta
+    ) pp ON pp.id_atleta = a.id_atleta
     
     WHERE a.cod_equipe = equipe_id
     
-    GROUP BY a.id_atleta, a.nome_atleta
     ORDER BY a.nome_atleta;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Versão sem período: todo o histórico da equipe
+CREATE OR REPLACE FUNCTION relatorio_presenca_equipe(equipe_id INTEGER)
+RETURNS TABLE(
+    id_atleta INTEGER,
+    nome_atleta VARCHAR(100),
+    total_treinamentos BIGINT,
+    presencas_treinamentos BIGINT,
+    percentual_treinamentos NUMERIC,
+    total_partidas BIGINT,
+    presencas_partidas BIGINT,
+    percentual_partidas NUMERIC
+) AS $$
+BEGIN
+    RETURN QUERY SELECT * FROM relatorio_presenca_equipe(equipe_id, NULL, NULL);
+END;
+$$ LANGUAGE plpgsql;
+
+-- TABELA DE APOIO: ESTATISTICA_ATLETA
+
+-- Propósito: Mantém os totais de presença de cada atleta já somados, para que
+--            estatisticas_atleta leia uma única linha em vez de percorrer
+--            todo o histórico de presenças
+-- 
+-- Como funciona:
+-- - Uma linha por atleta com convocações, presenças e faltas em treinamentos
+--   e em partidas; a pontuação geral é uma coluna gerada, calculada na escrita
+-- - Triggers por comando (FOR EACH STATEMENT) em Presenca_Treinamento e
+--   Presenca_Partida leem as linhas alteradas (tabelas de transição) e
+--   somam/subtraem as diferenças, uma atualização por atleta afetado
+-- - Pode ser executado de novo em bancos existentes: os totais são
+--   recalculados a partir das presenças já cadastradas
+
+CREATE TABLE IF NOT EXISTS Estatistica_Atleta (
+    id_atleta INT PRIMARY KEY REFERENCES Atleta(id_atleta) ON DELETE CASCADE,
+    treinamentos_convocado INT NOT NULL DEFAULT 0,
+    treinamentos_presente INT NOT NULL DEFAULT 0,
+    treinamentos_falta INT NOT NULL DEFAULT 0,
+    partidas_convocado INT NOT NULL DEFAULT 0,
+    partidas_presente INT NOT NULL DEFAULT 0,
+    partidas_falta INT NOT NULL DEFAULT 0,
+    -- Pontuação geral (média ponderada: 60% treinamentos + 40% partidas)
+    pontuacao_geral NUMERIC GENERATED ALWAYS AS (
+        ROUND(
+            COALESCE(treinamentos_presente * 100.0 / NULLIF(treinamentos_convocado, 0), 0) * 0.6 +
+            COALESCE(partidas_presente * 100.0 / NULLIF(partidas_convocado, 0), 0) * 0.4, 2
+        )
+    ) STORED
+);
+
+-- Soma uma variação aos totais de um atleta (treino = TRUE para treinamentos)
+CREATE OR REPLACE FUNCTION somar_estatistica_atleta(
+    treino BOOLEAN, atleta INTEGER, convocado BIGINT, presente BIGINT, falta BIGINT
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO Estatistica_Atleta AS e (
+        id_atleta,
+        treinamentos_convocado, treinamentos_presente, treinamentos_falta,
+        partidas_convocado, partidas_presente, partidas_falta
+    )
+    VALUES (
+        atleta,
+        CASE WHEN treino THEN convocado ELSE 0 END,
+        CASE WHEN treino THEN presente ELSE 0 END,
+        CASE WHEN treino THEN falta ELSE 0 END,
+        CASE WHEN treino THEN 0 ELSE convocado END,
+        CASE WHEN treino THEN 0 ELSE presente END,
+        CASE WHEN treino THEN 0 ELSE falta END
+    )
+    ON CONFLICT (id_atleta) DO UPDATE SET
+        treinamentos_convocado = e.treinamentos_convocado + EXCLUDED.treinamentos_convocado,
+        treinamentos_presente = e.treinamentos_presente + EXCLUDED.treinamentos_presente,
+        treinamentos_falta = e.treinamentos_falta + EXCLUDED.treinamentos_falta,
+        partidas_convocado = e.partidas_convocado + EXCLUDED.partidas_convocado,
+        partidas_presente = e.partidas_presente + EXCLUDED.partidas_presente,
+        partidas_falta = e.partidas_falta + EXCLUDED.partidas_falta;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION atualizar_estatistica_atleta()
+RETURNS TRIGGER AS $$
+DECLARE
+    treino BOOLEAN := TG_TABLE_NAME = 'presenca_treinamento';
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        IF treino THEN
+            UPDATE Estatistica_Atleta
+            SET treinamentos_convocado = 0, treinamentos_presente = 0, treinamentos_falta = 0;
+        ELSE
+            UPDATE Estatistica_Atleta
+            SET partidas_convocado = 0, partidas_presente = 0, partidas_falta = 0;
+        END IF;
+        RETURN NULL;
+    END IF;
+    -- Atletas em ordem de id, para transações concorrentes travarem as linhas na mesma ordem
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM somar_estatistica_atleta(
+            treino, id_atleta, -COUNT(*),
+            -COUNT(*) FILTER (WHERE presenca = true), -COUNT(*) FILTER (WHERE presenca = false)
+        )
+        FROM linhas_antigas GROUP BY id_atleta ORDER BY id_atleta;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM somar_estatistica_atleta(
+            treino, id_atleta, COUNT(*),
+            COUNT(*) FILTER (WHERE presenca = true), COUNT(*) FILTER (WHERE presenca = false)
+        )
+        FROM linhas_novas GROUP BY id_atleta ORDER BY id_atleta;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers com tabelas de transição aceitam um único evento cada
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOREACH tabela IN ARRAY ARRAY['presenca_treinamento', 'presenca_partida']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS estatistica_atleta_insert ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS estatistica_atleta_update ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS estatistica_atleta_delete ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS estatistica_atleta_truncate ON %I', tabela);
+        EXECUTE format('CREATE TRIGGER estatistica_atleta_insert AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS linhas_novas
+                        FOR EACH STATEMENT EXECUTE FUNCTION atualizar_estatistica_atleta()', tabela);
+        EXECUTE format('CREATE TRIGGER estatistica_atleta_update AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas
+                        FOR EACH STATEMENT EXECUTE FUNCTION atualizar_estatistica_atleta()', tabela);
+        EXECUTE format('CREATE TRIGGER estatistica_atleta_delete AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS linhas_antigas
+                        FOR EACH STATEMENT EXECUTE FUNCTION atualizar_estatistica_atleta()', tabela);
+        EXECUTE format('CREATE TRIGGER estatistica_atleta_truncate AFTER TRUNCATE ON %I
+                        FOR EACH STATEMENT EXECUTE FUNCTION atualizar_estatistica_atleta()', tabela);
+    END LOOP;
+END;
+$$;
+
+-- Recalcula os totais a partir das presenças existentes
+INSERT INTO Estatistica_Atleta (
+    id_atleta,
+    treinamentos_convocado, treinamentos_presente, treinamentos_falta,
+    partidas_convocado, partidas_presente, partidas_falta
+)
+SELECT 
+    a.id_atleta,
+    COALESCE(pt.convocado, 0), COALESCE(pt.presente, 0), COALESCE(pt.falta, 0),
+    COALESCE(pp.convocado, 0), COALESCE(pp.presente, 0), COALESCE(pp.falta, 0)
+FROM Atleta a
+LEFT JOIN (
+    SELECT id_atleta, COUNT(*) as convocado,
+           COUNT(*) FILTER (WHERE presenca = true) as presente,
+           COUNT(*) FILTER (WHERE presenca = false) as falta
+    FROM Presenca_Treinamento GROUP BY id_atleta
+) pt ON pt.id_atleta = a.id_atleta
+LEFT JOIN (
+    SELECT id_atleta, COUNT(*) as convocado,
+           COUNT(*) FILTER (WHERE presenca = true) as presente,
+           COUNT(*) FILTER (WHERE presenca = false) as falta
+    FROM Presenca_Partida GROUP BY id_atleta
+) pp ON pp.id_atleta = a.id_atleta
+ON CONFLICT (id_atleta) DO UPDATE SET
+    treinamentos_convocado = EXCLUDED.treinamentos_convocado,
+    treinamentos_presente = EXCLUDED.treinamentos_presente,
+    treinamentos_falta = EXCLUDED.treinamentos_falta,
+    partidas_convocado = EXCLUDED.partidas_convocado,
+    partidas_presente = EXCLUDED.partidas_presente,
+    partidas_falta = EXCLUDED.partidas_falta;
+
+
 -- PROCEDURE 2: ESTATISTICAS_ATLETA
 
 -- Propósito: Calcula estatísticas completas e detalhadas de um atleta específico
@@ -64,8 +270,9 @@ $$ LANGUAGE plpgsql;
 -- 
 -- Como funciona:
 -- - Recebe um ID de atleta como parâmetro
--- - Coleta dados de treinamentos, partidas e documentos
--- - Calcula médias, totais e percentuais de participação
+-- - Lê a linha do atleta em Estatistica_Atleta (totais já somados pelos
+--   triggers), sem percorrer as tabelas de presença
+-- - Calcula percentuais de participação e classifica a pontuação geral
 -- - Retorna um registro completo com todas as estatísticas
 
 CREATE OR REPLACE FUNCTION estatisticas_atleta(atleta_id INTEGER)
@@ -102,104 +309,147 @@ BEGIN
         EXTRACT(YEAR FROM AGE(CURRENT_DATE, a.data_nascimento))::INTEGER as idade,
         
         -- Estatísticas de treinamentos
-        COUNT(DISTINCT pt.cod_treinamento) as total_treinamentos_convocado,
-        COUNT(CASE WHEN pt.presenca = true THEN 1 END) as total_presencas_treinamentos,
-        COALESCE(
-            ROUND(
-                (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pt.cod_treinamento), 0)), 2
-            ), 0
-        ) as percentual_presenca_treinamentos,
+        COALESCE(s.treinamentos_convocado, 0)::BIGINT,
+        COALESCE(s.treinamentos_presente, 0)::BIGINT,
+        COALESCE(ROUND(s.treinamentos_presente * 100.0 / NULLIF(s.treinamentos_convocado, 0), 2), 0),
         
         -- Estatísticas de partidas
-        COUNT(DISTINCT pp.cod_partida) as total_partidas_convocado,
-        COUNT(CASE WHEN pp.presenca = true THEN 1 END) as total_presencas_partidas,
-        COALESCE(
-            ROUND(
-                (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pp.cod_partida), 0)), 2
-            ), 0
-        ) as percentual_presenca_partidas,
+        COALESCE(s.partidas_convocado, 0)::BIGINT,
+        COALESCE(s.partidas_presente, 0)::BIGINT,
+        COALESCE(ROUND(s.partidas_presente * 100.0 / NULLIF(s.partidas_convocado, 0), 2), 0),
         
         -- Contagem de faltas
-        COUNT(CASE WHEN pt.presenca = false THEN 1 END) as total_faltas_treinamentos,
-        COUNT(CASE WHEN pp.presenca = false THEN 1 END) as total_faltas_partidas,
+        COALESCE(s.treinamentos_falta, 0)::BIGINT,
+        COALESCE(s.partidas_falta, 0)::BIGINT,
         
-        -- Pontuação geral (média ponderada: 60% treinamentos + 40% partidas)
-        COALESCE(
-            ROUND(
-                (COALESCE(
-                    (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                     NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-                ) * 0.6 + 
-                COALESCE(
-                    (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                     NULLIF(COUNT(pp.cod_partida), 0)), 0
-                ) * 0.4), 2
-            ), 0
-        ) as pontuacao_geral,
+        -- Pontuação geral (coluna gerada de Estatistica_Atleta)
+        COALESCE(s.pontuacao_geral, 0),
         
         -- Status de participação baseado na pontuação
-        CASE 
-            WHEN COALESCE(
-                ROUND(
-                    (COALESCE(
-                        (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-                    ) * 0.6 + 
-                    COALESCE(
-                        (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pp.cod_partida), 0)), 0
-                    ) * 0.4), 2
-                ), 0
-            ) >= 90 THEN 'Excelente'
-            WHEN COALESCE(
-                ROUND(
-                    (COALESCE(
-                        (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-                    ) * 0.6 + 
-                    COALESCE(
-                        (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pp.cod_partida), 0)), 0
-                    ) * 0.4), 2
-                ), 0
-            ) >= 80 THEN 'Ótimo'
-            WHEN COALESCE(
-                ROUND(
-                    (COALESCE(
-                        (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-                    ) * 0.6 + 
-                    COALESCE(
-                        (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pp.cod_partida), 0)), 0
-                    ) * 0.4), 2
-                ), 0
-            ) >= 70 THEN 'Bom'
-            WHEN COALESCE(
-                ROUND(
-                    (COALESCE(
-                        (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-                    ) * 0.6 + 
-                    COALESCE(
-                        (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                         NULLIF(COUNT(pp.cod_partida), 0)), 0
-                    ) * 0.4), 2
-                ), 0
-            ) >= 60 THEN 'Regular'
+        (CASE 
+            WHEN COALESCE(s.pontuacao_geral, 0) >= 90 THEN 'Excelente'
+            WHEN COALESCE(s.pontuacao_geral, 0) >= 80 THEN 'Ótimo'
+            WHEN COALESCE(s.pontuacao_geral, 0) >= 70 THEN 'Bom'
+            WHEN COALESCE(s.pontuacao_geral, 0) >= 60 THEN 'Regular'
             ELSE 'Needs Improvement'
-        END as status_participacao
+        END)::VARCHAR(20)
         
     FROM Atleta a
     JOIN Equipe e ON a.cod_equipe = e.cod_equipe
-    LEFT JOIN Presenca_Treinamento pt ON a.id_atleta = pt.id_atleta
-    LEFT JOIN Presenca_Partida pp ON a.id_atleta = pp.id_atleta
-    
-    WHERE a.id_atleta = atleta_id
+    LEFT JOIN Estatistica_Atleta s ON s.id_atleta = a.id_atleta
     
-    GROUP BY a.id_atleta, a.nome_atleta, a.matricula_unb, a.curso, 
-             e.nome_equipe, a.data_nascimento;
+    WHERE a.id_atleta = atleta_id;
+END;
+$$ LANGUAGE plpgsql;
+-- TABELA DE APOIO: VERSAO_TABELA
+
+-- Propósito: Contador de alterações por tabela, usado pela API JSON do app
+--            (/api/...) para responder ETag e Last-Modified sem reler os dados
+-- 
+-- Como funciona:
+-- - A versão de uma tabela é a soma das versões das suas 16 fatias (linhas
+--   de Versao_Tabela), cada uma com o número de comandos que a alteraram;
+--   alterada_em guarda o horário do último
+-- - Triggers por comando (FOR EACH STATEMENT) em todas as tabelas do schema,
+--   um por evento: um INSERT/UPDATE/DELETE de mil linhas incrementa a versão
+--   uma vez, e um comando que não alterou nenhuma linha (tabela de transição
+--   vazia) não a incrementa
+-- - Cada comando incrementa uma fatia que nenhuma outra transação esteja
+--   travando (FOR UPDATE SKIP LOCKED): com uma única linha por tabela, travada
+--   até o COMMIT, escritas concorrentes na mesma tabela esperavam umas pelas
+--   outras
+-- - O contador faz parte da transação: um ROLLBACK também desfaz o incremento
+-- - O ranking materializado é acompanhado por Visao_Materializada, que muda
+--   a cada REFRESH; estado_visao_materializada compara as versões das tabelas
+--   de origem com as do último REFRESH
+-- - Pode ser executado de novo em bancos existentes (e deve ser, depois de
+--   criar uma tabela nova, para que ela também ganhe os triggers); bancos com
+--   a Versao_Tabela de uma linha por tabela precisam antes da migração 005
+
+CREATE TABLE IF NOT EXISTS Versao_Tabela (
+    nome_tabela VARCHAR(100) NOT NULL,
+    fatia SMALLINT NOT NULL DEFAULT 0,
+    versao BIGINT NOT NULL DEFAULT 0,
+    alterada_em TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (nome_tabela, fatia)
+);
+
+CREATE OR REPLACE FUNCTION registrar_versao_tabela()
+RETURNS TRIGGER AS $$
+DECLARE
+    escolhida SMALLINT;
+BEGIN
+    -- Nenhuma linha alterada: a versão continua a mesma
+    IF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM linhas_antigas) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP <> 'TRUNCATE' THEN
+        IF NOT EXISTS (SELECT 1 FROM linhas_novas) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    -- Primeira fatia livre a partir de uma que depende do processo; a mesma
+    -- transação volta à fatia que já travou
+    SELECT fatia INTO escolhida FROM Versao_Tabela
+    WHERE nome_tabela = TG_TABLE_NAME
+    ORDER BY (fatia + pg_backend_pid()) % 16
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+    -- Todas travadas (mais de 16 escritas simultâneas na tabela): espera pela do processo
+    INSERT INTO Versao_Tabela AS v (nome_tabela, fatia, versao)
+    VALUES (TG_TABLE_NAME, COALESCE(escolhida, pg_backend_pid() % 16), 1)
+    ON CONFLICT (nome_tabela, fatia) DO UPDATE
+        SET versao = v.versao + 1, alterada_em = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers com tabelas de transição aceitam um único evento cada
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOR tabela IN
+        SELECT tablename FROM pg_tables
+        WHERE schemaname = current_schema() AND tablename <> 'versao_tabela'
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela_insert ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela_update ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela_delete ON %I', tabela);
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela_truncate ON %I', tabela);
+        EXECUTE format('CREATE TRIGGER registrar_versao_tabela_insert AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS linhas_novas
+                        FOR EACH STATEMENT EXECUTE FUNCTION registrar_versao_tabela()', tabela);
+        EXECUTE format('CREATE TRIGGER registrar_versao_tabela_update AFTER UPDATE ON %I
+                        REFERENCING NEW TABLE AS linhas_novas
+                        FOR EACH STATEMENT EXECUTE FUNCTION registrar_versao_tabela()', tabela);
+        EXECUTE format('CREATE TRIGGER registrar_versao_tabela_delete AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS linhas_antigas
+                        FOR EACH STATEMENT EXECUTE FUNCTION registrar_versao_tabela()', tabela);
+        EXECUTE format('CREATE TRIGGER registrar_versao_tabela_truncate AFTER TRUNCATE ON %I
+                        FOR EACH STATEMENT EXECUTE FUNCTION registrar_versao_tabela()', tabela);
+        INSERT INTO Versao_Tabela (nome_tabela, fatia)
+        SELECT tabela, fatia FROM generate_series(0, 15) AS fatia
+        ON CONFLICT (nome_tabela, fatia) DO NOTHING;
+    END LOOP;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$;
+
+-- Views materializadas pendentes: as tabelas de origem mudaram desde o último
+-- REFRESH (versao_fontes, gravada pelo app ao atualizar). As escritas não
+-- tocam Visao_Materializada, que seria uma linha disputada por todas elas
+CREATE OR REPLACE VIEW estado_visao_materializada AS
+SELECT
+    m.nome_visao,
+    m.atualizada_em,
+    m.versao_fontes,
+    f.versao_atual,
+    f.versao_atual <> m.versao_fontes AS pendente
+FROM Visao_Materializada m
+CROSS JOIN LATERAL (
+    SELECT COALESCE(SUM(v.versao), 0)::BIGINT AS versao_atual
+    FROM Versao_Tabela v
+    WHERE v.nome_tabela = ANY(m.tabelas_fonte)
+) f;
@@ -0,0 +1,40 @@
+-- TRIGGER 1: NOTIFICAR_ALTERACAO
+
+-- Propósito: Avisa os caches do app (cache.py: consultas e páginas) que uma
+--            tabela mudou, inclusive quando a alteração vem de outro processo
+--            ou do psql
+-- 
+-- Como funciona:
+-- - Trigger por comando (FOR EACH STATEMENT), disparado uma vez por INSERT,
+--   UPDATE ou DELETE, independente do número de linhas
+-- - Envia NOTIFY no canal gedeu_alteracoes com o nome da tabela
+-- - Só é entregue no COMMIT; notificações iguais na mesma transação viram uma
+-- - O app escuta o canal quando LOOKUP_CACHE_LISTEN = True ou, por padrão,
+--   quando é servido por mais de um processo (SERVER_WORKERS > 1); sem estes
+--   triggers, os caches em memória desses processos ficam desligados
+
+CREATE OR REPLACE FUNCTION notificar_alteracao()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('gedeu_alteracoes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tabelas lidas pelo cache de consultas (nomes e listas dos formulários) e
+-- exibidas pelas páginas em cache (listagens e dashboard_equipes)
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOREACH tabela IN ARRAY ARRAY['modalidade', 'local', 'evento', 'campeonato', 'equipe',
+                                  'documento', 'atleta', 'treinador', 'partida', 'treinamento',
+                                  'participacao_campeonato', 'presenca_partida', 'presenca_treinamento']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS notificar_alteracao ON %I', tabela);
+        EXECUTE format('CREATE TRIGGER notificar_alteracao
+                        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                        FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracao()', tabela);
+    END LOOP;
+END;
+$$;
@@ -4,10 +4,13 @@
 --            de atletas, treinadores, participações e presenças
 -- 
 -- Como funciona:
--- - Agrega dados de múltiplas tabelas relacionadas a equipes
--- - Calcula totais de atletas ativos e treinadores por equipe
+-- - Agrega cada tabela relacionada separadamente, já agrupada por equipe
+-- - Calcula totais de atletas e treinadores ativos por equipe
 -- - Computa estatísticas de presença em treinamentos e partidas
 -- - Mostra participações em campeonatos
+-- - Junta à Equipe apenas uma linha por equipe de cada agregado: um JOIN
+--   direto de todas as tabelas multiplicaria as linhas (atletas x treinadores
+--   x campeonatos x presenças) e distorceria os percentuais de presença
 
 CREATE OR REPLACE VIEW dashboard_equipes AS
 SELECT 
@@ -16,41 +19,64 @@ SELECT
     e.ano_fundacao,
     e.status_ativa,
     
-    -- Contagem de atletas ativos na equipe
-    COUNT(DISTINCT a.id_atleta) as total_atletas,
+    -- Contagem de atletas da equipe
+    COALESCE(a.total_atletas, 0) as total_atletas,
     
     -- Contagem de treinadores ativos na equipe
-    COUNT(DISTINCT CASE WHEN t.status_ativo = true THEN t.id_treinador END) as total_treinadores,
+    COALESCE(t.total_treinadores, 0) as total_treinadores,
     
     -- Contagem de participações em campeonatos
-    COUNT(DISTINCT pc.cod_campeonato) as total_campeonatos,
+    COALESCE(pc.total_campeonatos, 0) as total_campeonatos,
     
     -- Estatísticas de presença em treinamentos
-    COUNT(DISTINCT pt.cod_treinamento) as total_treinamentos,
+    COALESCE(pt.total_treinamentos, 0) as total_treinamentos,
     COALESCE(
-        ROUND(
-            (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-             NULLIF(COUNT(pt.presenca), 0)), 2
-        ), 0
+        ROUND(pt.presentes * 100.0 / NULLIF(pt.registros, 0), 2), 0
     ) as percentual_presenca_treinamentos,
     
     -- Estatísticas de presença em partidas
-    COUNT(DISTINCT pp.cod_partida) as total_partidas,
+    COALESCE(pp.total_partidas, 0) as total_partidas,
     COALESCE(
-        ROUND(
-            (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-             NULLIF(COUNT(pp.presenca), 0)), 2
-        ), 0
+        ROUND(pp.presentes * 100.0 / NULLIF(pp.registros, 0), 2), 0
     ) as percentual_presenca_partidas
 
 FROM Equipe e
-LEFT JOIN Atleta a ON e.cod_equipe = a.cod_equipe
-LEFT JOIN Treinador t ON e.cod_equipe = t.cod_equipe
-LEFT JOIN Participacao_Campeonato pc ON e.cod_equipe = pc.cod_equipe
-LEFT JOIN Presenca_Treinamento pt ON a.id_atleta = pt.id_atleta
-LEFT JOIN Presenca_Partida pp ON a.id_atleta = pp.id_atleta
+LEFT JOIN (
+    SELECT cod_equipe, COUNT(*) as total_atletas
+    FROM Atleta
+    GROUP BY cod_equipe
+) a ON a.cod_equipe = e.cod_equipe
+LEFT JOIN (
+    SELECT cod_equipe, COUNT(*) FILTER (WHERE status_ativo = true) as total_treinadores
+    FROM Treinador
+    GROUP BY cod_equipe
+) t ON t.cod_equipe = e.cod_equipe
+LEFT JOIN (
+    SELECT cod_equipe, COUNT(*) as total_campeonatos
+    FROM Participacao_Campeonato
+    GROUP BY cod_equipe
+) pc ON pc.cod_equipe = e.cod_equipe
+LEFT JOIN (
+    SELECT 
+        atl.cod_equipe,
+        COUNT(DISTINCT p.cod_treinamento) as total_treinamentos,
+        COUNT(*) FILTER (WHERE p.presenca = true) as presentes,
+        COUNT(p.presenca) as registros
+    FROM Presenca_Treinamento p
+    JOIN Atleta atl ON atl.id_atleta = p.id_atleta
+    GROUP BY atl.cod_equipe
+) pt ON pt.cod_equipe = e.cod_equipe
+LEFT JOIN (
+    SELECT 
+        atl.cod_equipe,
+        COUNT(DISTINCT p.cod_partida) as total_partidas,
+        COUNT(*) FILTER (WHERE p.presenca = true) as presentes,
+        COUNT(p.presenca) as registros
+    FROM Presenca_Partida p
+    JOIN Atleta atl ON atl.id_atleta = p.id_atleta
+    GROUP BY atl.cod_equipe
+) pp ON pp.cod_equipe = e.cod_equipe
 
-GROUP BY e.cod_equipe, e.nome_equipe, e.ano_fundacao, e.status_ativa
 ORDER BY e.cod_equipe;
 
 
@@ -64,6 +90,8 @@ ORDER BY e.cod_equipe;
 -- - Computa percentuais de presença em treinamentos e partidas
 -- - Calcula uma pontuação geral baseada na participação
 -- - Ordena os atletas por desempenho de presença
+-- - Agrega as presenças de treinamentos e de partidas separadamente, por
+--   atleta, evitando o produto treinamentos x partidas de um JOIN direto
 
 CREATE OR REPLACE VIEW ranking_atletas AS
 SELECT 
@@ -74,44 +102,86 @@ SELECT
     e.nome_equipe,
     
     -- Estatísticas de treinamentos
-    COUNT(DISTINCT pt.cod_treinamento) as total_treinamentos_convocado,
-    COUNT(CASE WHEN pt.presenca = true THEN 1 END) as presencas_treinamentos,
+    COALESCE(pt.convocacoes, 0) as total_treinamentos_convocado,
+    COALESCE(pt.presentes, 0) as presencas_treinamentos,
     COALESCE(
-        ROUND(
-            (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-             NULLIF(COUNT(pt.cod_treinamento), 0)), 2
-        ), 0
+        ROUND(pt.presentes * 100.0 / NULLIF(pt.convocacoes, 0), 2), 0
     ) as percentual_presenca_treinamentos,
     
     -- Estatísticas de partidas
-    COUNT(DISTINCT pp.cod_partida) as total_partidas_convocado,
-    COUNT(CASE WHEN pp.presenca = true THEN 1 END) as presencas_partidas,
+    COALESCE(pp.convocacoes, 0) as total_partidas_convocado,
+    COALESCE(pp.presentes, 0) as presencas_partidas,
     COALESCE(
-        ROUND(
-            (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-             NULLIF(COUNT(pp.cod_partida), 0)), 2
-        ), 0
+        ROUND(pp.presentes * 100.0 / NULLIF(pp.convocacoes, 0), 2), 0
     ) as percentual_presenca_partidas,
     
     -- Pontuação geral (média ponderada: 60% treinamentos + 40% partidas)
-    COALESCE(
-        ROUND(
-            (COALESCE(
-                (COUNT(CASE WHEN pt.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pt.cod_treinamento), 0)), 0
-            ) * 0.6 + 
-            COALESCE(
-                (COUNT(CASE WHEN pp.presenca = true THEN 1 END) * 100.0 / 
-                 NULLIF(COUNT(pp.cod_partida), 0)), 0
-            ) * 0.4), 2
-        ), 0
+    ROUND(
+        COALESCE(pt.presentes * 100.0 / NULLIF(pt.convocacoes, 0), 0) * 0.6 +
+        COALESCE(pp.presentes * 100.0 / NULLIF(pp.convocacoes, 0), 0) * 0.4, 2
     ) as pontuacao_geral
 
 FROM Atleta a
 JOIN Equipe e ON a.cod_equipe = e.cod_equipe
-LEFT JOIN Presenca_Treinamento pt ON a.id_atleta = pt.id_atleta
-LEFT JOIN Presenca_Partida pp ON a.id_atleta = pp.id_atleta
+LEFT JOIN (
+    SELECT id_atleta,
+           COUNT(*) as convocacoes,
+           COUNT(*) FILTER (WHERE presenca = true) as presentes
+    FROM Presenca_Treinamento
+    GROUP BY id_atleta
+) pt ON pt.id_atleta = a.id_atleta
+LEFT JOIN (
+    SELECT id_atleta,
+           COUNT(*) as convocacoes,
+           COUNT(*) FILTER (WHERE presenca = true) as presentes
+    FROM Presenca_Partida
+    GROUP BY id_atleta
+) pp ON pp.id_atleta = a.id_atleta
 
-GROUP BY a.id_atleta, a.nome_atleta, a.matricula_unb, a.curso, e.nome_equipe
 -- Ordena por pontuação geral (maiores primeiro), depois por presença em treinamentos
-ORDER BY pontuacao_geral DESC, percentual_presenca_treinamentos DESC, a.nome_atleta;
\ No newline at end of file
+ORDER BY pontuacao_geral DESC, percentual_presenca_treinamentos DESC, a.nome_atleta;
+
+
+-- VIEW 3: RANKING_ATLETAS_MATERIALIZADA
+
+-- Propósito: Guarda o resultado de ranking_atletas para a página do ranking,
+--            a mais acessada durante os campeonatos
+-- 
+-- Como funciona:
+-- - Materializa ranking_atletas com a posição de cada atleta (posicao),
+--   usada pela paginação da página /view/ranking_atletas
+-- - O ranking fica pendente quando presenças, atletas ou equipes mudam: a
+--   soma das versões dessas tabelas (Versao_Tabela, install_procedures.sql)
+--   difere da gravada no último REFRESH (estado_visao_materializada). As
+--   escritas não gravam nada aqui, então não disputam a linha do ranking
+-- - "flask --app app refresh-ranking" (ou o próprio app, quando o ranking
+--   pendente fica velho demais) executa REFRESH MATERIALIZED VIEW
+--   CONCURRENTLY, que não bloqueia as leituras, e registra o horário
+-- - Pode ser executado de novo em bancos existentes (objetos IF NOT EXISTS)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ranking_atletas_materializada AS
+SELECT 
+    ROW_NUMBER() OVER (
+        ORDER BY pontuacao_geral DESC, percentual_presenca_treinamentos DESC, nome_atleta, id_atleta
+    ) as posicao,
+    r.*
+FROM ranking_atletas r;
+
+-- REFRESH ... CONCURRENTLY exige um índice único
+CREATE UNIQUE INDEX IF NOT EXISTS ranking_atletas_materializada_atleta
+    ON ranking_atletas_materializada (id_atleta);
+CREATE UNIQUE INDEX IF NOT EXISTS ranking_atletas_materializada_posicao
+    ON ranking_atletas_materializada (posicao);
+
+-- Horário da última atualização de cada view materializada, as tabelas que
+-- ela lê e a soma das versões delas no momento do REFRESH
+CREATE TABLE IF NOT EXISTS Visao_Materializada (
+    nome_visao VARCHAR(100) PRIMARY KEY,
+    atualizada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    tabelas_fonte TEXT[] NOT NULL DEFAULT '{}',
+    versao_fontes BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO Visao_Materializada (nome_visao, tabelas_fonte)
+VALUES ('ranking_atletas_materializada', ARRAY['presenca_treinamento', 'presenca_partida', 'atleta', 'equipe'])
+ON CONFLICT (nome_visao) DO UPDATE SET tabelas_fonte = EXCLUDED.tabelas_fonte;
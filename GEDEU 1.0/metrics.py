@@ -0,0 +1,353 @@
+"""Instrumentação das consultas e métricas no formato do Prometheus (/metrics).
+
+As conexões do pool usam InstrumentedCursor: cada comando soma, na
+requisição atual (``flask.g``), o número de consultas, o tempo no banco, as
+linhas lidas e uma estimativa dos bytes recebidos (tamanho dos textos e
+binários; demais valores contam 8 bytes). Ao final da requisição os totais
+vão para os histogramas do endpoint e para o cabeçalho Server-Timing.
+
+Comandos mais lentos que SLOW_QUERY_MS vão para o logger
+``gedeu.slow_query``, uma linha JSON com a rota e o comando.
+
+As métricas ficam na memória do processo. Com vários workers (serve.py),
+METRICS_DIR aponta para um diretório compartilhado: cada worker grava as
+suas a cada poucos segundos e /metrics devolve a soma de todos.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import (Response, before_render_template, current_app, g, has_app_context, has_request_context,
+                   request, template_rendered)
+from psycopg2 import extensions
+
+METRICS_DEFAULTS = {
+    'SLOW_QUERY_MS': 500,        # comandos mais lentos vão para o log (0 desativa)
+    'METRICS_DIR': None,         # diretório compartilhado pelos workers (None: métricas do processo)
+    'METRICS_DUMP_INTERVAL': 5,  # segundos entre as gravações em METRICS_DIR
+}
+
+# Limite do texto do comando no log de consultas lentas
+SLOW_QUERY_MAX_LENGTH = 2000
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TEMPLATE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# nome: (tipo, descrição, limites dos buckets dos histogramas)
+METRICS = {
+    'gedeu_requests_total': ('counter', "Requisições atendidas", None),
+    'gedeu_request_duration_seconds': ('histogram', "Duração das requisições", SECONDS_BUCKETS),
+    'gedeu_request_queries': ('histogram', "Comandos SQL por requisição", QUERY_BUCKETS),
+    'gedeu_request_db_seconds': ('histogram', "Tempo no banco por requisição", SECONDS_BUCKETS),
+    'gedeu_db_rows_total': ('counter', "Linhas lidas do banco", None),
+    'gedeu_db_bytes_total': ('counter', "Bytes lidos do banco (estimativa)", None),
+    'gedeu_slow_queries_total': ('counter', "Comandos acima de SLOW_QUERY_MS", None),
+    'gedeu_template_render_seconds': ('histogram', "Tempo de renderização dos templates Jinja", TEMPLATE_BUCKETS),
+}
+
+slow_query_log = logging.getLogger('gedeu.slow_query')
+
+
+class QueryStats:
+    """Totais das consultas de uma requisição."""
+
+    __slots__ = ('queries', 'seconds', 'rows', 'bytes', 'slow', 'template_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.slow = 0
+        self.template_seconds = 0.0
+
+
+def _request_stats():
+    return g.get('query_stats') if has_request_context() else None
+
+
+def row_bytes(rows):
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes, memoryview)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+
+def record_query(cursor, seconds):
+    """Soma um comando executado por ``cursor`` à requisição atual e registra se for lento"""
+    stats = _request_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += seconds
+    threshold = current_app.config['SLOW_QUERY_MS'] if has_app_context() else METRICS_DEFAULTS['SLOW_QUERY_MS']
+    if threshold and seconds * 1000 >= threshold:
+        query = cursor.query
+        if isinstance(query, bytes):
+            query = query.decode(cursor.connection.encoding, 'replace')
+        entry = {
+            'duracao_ms': round(seconds * 1000, 1),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'metodo': request.method if has_request_context() else None,
+            'caminho': request.full_path.rstrip('?') if has_request_context() else None,
+            'consulta': ' '.join((query or '').split())[:SLOW_QUERY_MAX_LENGTH],
+        }
+        slow_query_log.warning(json.dumps(entry, ensure_ascii=False))
+        if stats is not None:
+            stats.slow += 1
+
+
+def record_rows(rows, seconds=0.0):
+    """Soma linhas lidas (e o tempo da leitura, para cursores no servidor) à requisição atual"""
+    stats = _request_stats()
+    if stats is not None and rows:
+        stats.rows += len(rows)
+        stats.bytes += row_bytes(rows)
+        stats.seconds += seconds
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor que mede cada comando e conta as linhas lidas (ver record_query)."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(self, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(self, time.perf_counter() - start)
+
+    def callproc(self, procname, parameters=None):
+        start = time.perf_counter()
+        try:
+            return super().callproc(procname, parameters)
+        finally:
+            record_query(self, time.perf_counter() - start)
+
+    # Cursores no servidor (com nome) buscam as linhas no fetch: o tempo conta como tempo no banco
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if row is not None:
+            record_rows((row,), time.perf_counter() - start if self.name else 0.0)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        record_rows(rows, time.perf_counter() - start if self.name else 0.0)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        record_rows(rows, time.perf_counter() - start if self.name else 0.0)
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+
+def _labels_text(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Contadores e histogramas do processo, por nome e rótulos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        """Cópia serializável (JSON) dos valores"""
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(counts), total, count]
+                               for (name, labels), (counts, total, count) in self._histograms.items()],
+            }
+
+
+def render(snapshots):
+    """Texto no formato do Prometheus com a soma de ``snapshots``"""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            current = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += total
+            current[2] += count
+
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{{{_labels_text(labels)}}} {_number(value)}")
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            prefix = _labels_text(labels)
+            prefix = prefix + ',' if prefix else ''
+            cumulative = 0
+            for bound, bucket in zip(buckets, counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{prefix}le="{_number(float(bound))}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{_labels_text(labels)}}} {_number(total)}")
+            lines.append(f"{name}_count{{{_labels_text(labels)}}} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_last_dump = 0.0
+
+
+def _dump(directory):
+    """Grava as métricas do processo em ``directory``/<pid>.json (troca atômica)"""
+    global _last_dump
+    _last_dump = time.monotonic()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _snapshots(directory):
+    snapshots = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - g.pop('request_started')
+    endpoint = request.endpoint or 'nao_encontrado'
+    labels = {'endpoint': endpoint}
+    registry.inc('gedeu_requests_total', {'endpoint': endpoint, 'metodo': request.method,
+                                          'status': response.status_code})
+    registry.observe('gedeu_request_duration_seconds', labels, elapsed)
+    registry.observe('gedeu_request_queries', labels, stats.queries)
+    registry.observe('gedeu_request_db_seconds', labels, stats.seconds)
+    registry.inc('gedeu_db_rows_total', labels, stats.rows)
+    registry.inc('gedeu_db_bytes_total', labels, stats.bytes)
+    if stats.slow:
+        registry.inc('gedeu_slow_queries_total', labels, stats.slow)
+    response.headers.add(
+        'Server-Timing',
+        f'db;desc="{stats.queries} consultas, {stats.rows} linhas";dur={stats.seconds * 1000:.1f}, '
+        f'tpl;dur={stats.template_seconds * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+    directory = current_app.config['METRICS_DIR']
+    if directory and time.monotonic() - _last_dump >= current_app.config['METRICS_DUMP_INTERVAL']:
+        _dump(directory)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('templates_started', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    started = g.get('templates_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    registry.observe('gedeu_template_render_seconds', {'template': template.name}, elapsed)
+    stats = _request_stats()
+    if stats is not None:
+        stats.template_seconds += elapsed
+
+
+def metrics_view():
+    directory = current_app.config['METRICS_DIR']
+    if directory:
+        _dump(directory)
+        snapshots = _snapshots(directory)
+    else:
+        snapshots = [registry.snapshot()]
+    return Response(render(snapshots), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    for name, value in METRICS_DEFAULTS.items():
+        app.config.setdefault(name, value)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def _reset_after_fork():
+    # O worker começa com métricas próprias (e um lock novo), sem as herdadas do master
+    global registry
+    registry = Registry()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,18 @@
+-- MIGRAÇÃO 001: HASH DO CONTEÚDO DOS DOCUMENTOS
+
+-- Propósito: Guarda o SHA-256 de cada PDF para servir downloads com ETag
+--            e respostas 304 sem reler o BLOB
+-- 
+-- Como funciona:
+-- - Adiciona a coluna arquivo_hash à tabela Documento
+-- - Calcula o hash dos documentos já cadastrados
+-- - Armazena novos BLOBs sem compressão, para que substring() leia apenas
+--   as partes pedidas (downloads em partes e requisições Range)
+
+ALTER TABLE Documento ADD COLUMN IF NOT EXISTS arquivo_hash CHAR(64);
+
+UPDATE Documento
+SET arquivo_hash = encode(sha256(arquivo_conteudo), 'hex')
+WHERE arquivo_hash IS NULL;
+
+ALTER TABLE Documento ALTER COLUMN arquivo_conteudo SET STORAGE EXTERNAL;
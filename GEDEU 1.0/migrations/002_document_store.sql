@@ -0,0 +1,56 @@
+-- MIGRAÇÃO 002: ARMAZENAMENTO DE DOCUMENTOS EM DISCO
+
+-- Propósito: Permite guardar os PDFs fora do banco, em disco, endereçados
+--            pelo SHA-256 do conteúdo (uploads idênticos viram um só arquivo)
+-- 
+-- Como funciona:
+-- - arquivo_conteudo passa a aceitar NULL (documento em disco)
+-- - A tabela Arquivo conta as referências de cada arquivo em disco,
+--   mantida por trigger sobre Documento
+-- - Depois de aplicar, mova os BLOBs existentes com:
+--       flask --app app migrate-documents --batch-size 50
+-- - Pode ser executada mais de uma vez
+
+ALTER TABLE Documento ALTER COLUMN arquivo_conteudo DROP NOT NULL;
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'documento_conteudo_ou_hash' AND conrelid = 'documento'::regclass
+    ) THEN
+        ALTER TABLE Documento ADD CONSTRAINT documento_conteudo_ou_hash
+            CHECK (arquivo_conteudo IS NOT NULL OR arquivo_hash IS NOT NULL);
+    END IF;
+END;
+$$;
+
+-- Arquivos de documentos armazenados em disco, endereçados pelo SHA-256.
+-- referencias conta quantos documentos apontam para cada arquivo;
+-- arquivos com zero referências são removidos por "flask gc-documents".
+CREATE TABLE IF NOT EXISTS Arquivo (
+    arquivo_hash CHAR(64) PRIMARY KEY,
+    arquivo_tamanho BIGINT NOT NULL,
+    referencias INTEGER NOT NULL DEFAULT 0
+);
+
+-- Um documento está em disco quando arquivo_conteudo é NULL e arquivo_hash está preenchido
+CREATE OR REPLACE FUNCTION documento_contar_referencias()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.arquivo_conteudo IS NULL AND OLD.arquivo_hash IS NOT NULL THEN
+        UPDATE Arquivo SET referencias = referencias - 1
+        WHERE arquivo_hash = OLD.arquivo_hash;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.arquivo_conteudo IS NULL AND NEW.arquivo_hash IS NOT NULL THEN
+        INSERT INTO Arquivo (arquivo_hash, arquivo_tamanho, referencias)
+        VALUES (NEW.arquivo_hash, COALESCE(NEW.arquivo_tamanho, 0), 1)
+        ON CONFLICT (arquivo_hash) DO UPDATE SET referencias = Arquivo.referencias + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documento_referencias ON Documento;
+CREATE TRIGGER documento_referencias
+AFTER INSERT OR DELETE OR UPDATE OF arquivo_hash, arquivo_conteudo ON Documento
+FOR EACH ROW EXECUTE FUNCTION documento_contar_referencias();
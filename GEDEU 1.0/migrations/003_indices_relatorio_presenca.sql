@@ -0,0 +1,19 @@
+-- MIGRAÇÃO 003: ÍNDICES DOS RELATÓRIOS POR PERÍODO
+
+-- Propósito: Permite que relatorio_presenca_equipe(equipe, data_inicio, data_fim)
+--            leia apenas as presenças do período pedido
+-- 
+-- Como funciona:
+-- - Índices por data em Treinamento e Partida encontram as atividades do período
+-- - Presenca_Partida ganha um índice por partida (a chave primária começa pelo
+--   atleta) e Presenca_Treinamento um por atleta; ambos incluem a coluna presenca
+-- - Atleta ganha um índice por equipe
+-- - Depois de aplicar, execute novamente install_procedures.sql
+
+-- Índices para os relatórios de presença por período (relatorio_presenca_equipe):
+-- treinamentos/partidas do período pela data, depois as presenças de cada um
+CREATE INDEX IF NOT EXISTS treinamento_data ON Treinamento (data_treinamento, cod_treinamento);
+CREATE INDEX IF NOT EXISTS partida_data ON Partida (data_partida, cod_partida);
+CREATE INDEX IF NOT EXISTS presenca_partida_partida ON Presenca_Partida (cod_partida, id_atleta) INCLUDE (presenca);
+CREATE INDEX IF NOT EXISTS presenca_treinamento_atleta ON Presenca_Treinamento (id_atleta, cod_treinamento) INCLUDE (presenca);
+CREATE INDEX IF NOT EXISTS atleta_equipe ON Atleta (cod_equipe, id_atleta);
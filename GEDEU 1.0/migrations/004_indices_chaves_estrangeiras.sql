@@ -0,0 +1,38 @@
+-- MIGRAÇÃO 004: ÍNDICES DAS CHAVES ESTRANGEIRAS
+
+-- Propósito: Evita varreduras sequenciais nas páginas de presença, nos filtros
+--            das listagens e nas verificações de chave estrangeira ao excluir
+-- 
+-- Como funciona:
+-- - O PostgreSQL indexa as chaves primárias, mas não as colunas que as
+--   referenciam: cada exclusão de Equipe, Atleta, Partida etc. varria as
+--   tabelas filhas inteiras para conferir as referências
+-- - Cria um índice para cada chave estrangeira que ainda não é prefixo de
+--   outro índice (ver migração 003 e as chaves primárias compostas)
+-- - Treinador por equipe inclui id_treinador, para o filtro da listagem já
+--   sair na ordem da paginação
+-- - O índice parcial de Documento encontra os PDFs ainda guardados no banco
+--   (flask migrate-documents) sem ler a tabela toda
+-- - Pode ser executada mais de uma vez; confira os planos com
+--   benchmarks/query_plans.py
+-- - Depois de aplicar, execute novamente install_procedures.sql (o relatório
+--   de presença sem período passa a ler Estatistica_Atleta)
+
+-- Índices das chaves estrangeiras: verificações de FK ao excluir, filtros e JOINs
+-- (Atleta.cod_equipe, Presenca_*.id_atleta/cod_partida e as chaves primárias
+-- compostas já cobrem o restante)
+CREATE INDEX IF NOT EXISTS evento_local ON Evento (cod_local);
+CREATE INDEX IF NOT EXISTS campeonato_modalidade ON Campeonato (cod_modalidade);
+CREATE INDEX IF NOT EXISTS campeonato_evento ON Campeonato (cod_evento);
+CREATE INDEX IF NOT EXISTS participacao_campeonato_campeonato ON Participacao_Campeonato (cod_campeonato, cod_equipe);
+CREATE INDEX IF NOT EXISTS partida_equipe_a ON Partida (cod_equipe_a);
+CREATE INDEX IF NOT EXISTS partida_equipe_b ON Partida (cod_equipe_b);
+CREATE INDEX IF NOT EXISTS partida_modalidade ON Partida (cod_modalidade);
+CREATE INDEX IF NOT EXISTS partida_local ON Partida (cod_local);
+CREATE INDEX IF NOT EXISTS partida_evento ON Partida (cod_evento);
+CREATE INDEX IF NOT EXISTS atleta_documento ON Atleta (cod_documento);
+CREATE INDEX IF NOT EXISTS treinador_equipe ON Treinador (cod_equipe, id_treinador);
+CREATE INDEX IF NOT EXISTS treinador_documento ON Treinador (cod_documento);
+CREATE INDEX IF NOT EXISTS treinamento_treinador ON Treinamento (id_treinador);
+CREATE INDEX IF NOT EXISTS treinamento_local ON Treinamento (cod_local);
+CREATE INDEX IF NOT EXISTS documento_no_banco ON Documento (cod_documento) WHERE arquivo_conteudo IS NOT NULL;
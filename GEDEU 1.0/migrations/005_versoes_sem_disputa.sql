@@ -0,0 +1,52 @@
+-- MIGRAÇÃO 005: VERSÕES DAS TABELAS SEM LINHAS DISPUTADAS
+
+-- Propósito: Impede que escritas concorrentes (chamadas de presença, edições
+--            de atletas) esperem umas pelas outras por causa dos contadores
+--            de versão e da marcação do ranking pendente
+-- 
+-- Como funciona:
+-- - Versao_Tabela passa a ter várias linhas (fatias) por tabela; a versão
+--   atual fica na fatia 0, e as ETags da API continuam valendo
+-- - O trigger que marcava o ranking como pendente em Visao_Materializada
+--   (uma única linha, travada por toda escrita até o COMMIT) é removido:
+--   o ranking passa a ser pendente quando as versões das tabelas de origem
+--   mudam (estado_visao_materializada)
+-- - O ranking fica pendente até a próxima atualização
+-- - Pode ser executada mais de uma vez
+-- - Depois de aplicar, execute novamente install_views.sql e
+--   install_procedures.sql
+
+-- Os triggers antigos gravam uma linha por tabela (ON CONFLICT (nome_tabela));
+-- install_procedures.sql cria os novos
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOR tabela IN SELECT tablename FROM pg_tables WHERE schemaname = current_schema()
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS registrar_versao_tabela ON %I', tabela);
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE IF EXISTS Versao_Tabela ADD COLUMN IF NOT EXISTS fatia SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE IF EXISTS Versao_Tabela DROP CONSTRAINT IF EXISTS versao_tabela_pkey;
+ALTER TABLE IF EXISTS Versao_Tabela ADD PRIMARY KEY (nome_tabela, fatia);
+
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOREACH tabela IN ARRAY ARRAY['presenca_treinamento', 'presenca_partida', 'atleta', 'equipe']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS marcar_ranking_pendente ON %I', tabela);
+    END LOOP;
+END;
+$$;
+DROP FUNCTION IF EXISTS marcar_ranking_pendente();
+
+ALTER TABLE Visao_Materializada ADD COLUMN IF NOT EXISTS tabelas_fonte TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE Visao_Materializada ADD COLUMN IF NOT EXISTS versao_fontes BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE Visao_Materializada DROP COLUMN IF EXISTS pendente;
+-- Nenhuma soma de versões é negativa: pendente até o próximo REFRESH
+UPDATE Visao_Materializada SET versao_fontes = -1;
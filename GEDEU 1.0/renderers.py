@@ -0,0 +1,149 @@
+"""Formatação das células das listagens (/<tabela>, table.html).
+
+Cada tabela tem um plano de exibição (RenderPlan), montado uma vez por
+processo a partir de COLUMN_DISPLAY_NAMES e FK_FIELDS: para cada coluna, o
+rótulo do cabeçalho e a função que transforma o valor em uma célula HTML.
+O template recebe as células prontas, em vez de percorrer uma cadeia de
+condições por tabela e coluna a cada célula.
+"""
+from flask import url_for
+from markupsafe import Markup, escape
+
+# Cabeçalhos da listagem diferentes de COLUMN_DISPLAY_NAMES (a célula mostra o nome, não o código)
+HEADER_LABELS = {
+    "Campeonato": {"cod_modalidade": "Modalidade", "cod_evento": "Evento"},
+}
+
+STATUS_COLUMNS = ('status_ativa', 'status_ativo')
+PHONE_COLUMNS = ('telefone_atleta', 'telefone_treinador')
+YES_NO_COLUMNS = {
+    "Local": ('arquibancada', 'coberto'),
+}
+
+
+def format_phone(value):
+    """(61) 99999-9999 para telefones com 11 dígitos; os demais ficam como estão"""
+    if not value or len(value) != 11 or not value.isdigit():
+        return value
+    return f"({value[:2]}) {value[2:7]}-{value[7:]}"
+
+
+def text(value):
+    """Valor escapado para HTML; números, datas e None não têm caracteres especiais"""
+    return escape(value) if isinstance(value, str) else value
+
+
+# Formatadores: (valor, linha, nomes das FKs da página) -> célula HTML (str já
+# escapada; render_rows marca a linha inteira como Markup de uma vez).
+# Os nomes vêm de show_table (tabela referenciada -> {chave: colunas de rótulo})
+# e chegam aqui já escapados por render_rows.
+
+def plain(value, row, labels):
+    return f'<td>{text(value)}</td>'
+
+
+def fk_name(ref_table):
+    """Nome do registro referenciado, ou o próprio código se não houver"""
+    def render(value, row, labels):
+        names = labels.get(ref_table)
+        if names and value in names:
+            return f'<td>{names[value][0]}</td>'
+        return f'<td>{text(value)}</td>'
+    return render
+
+
+def document_link(value, row, labels):
+    info = labels.get("Documento", {}).get(value)
+    if info is None:
+        return '<td><span style="color: #888;">Sem documento</span></td>'
+    return (f'<td><a href="{escape(url_for("ver_documento", cod_documento=value))}" class="doc-btn" '
+            f'target="_blank" title="Clique para visualizar o PDF">'
+            f'📄 {info[0]} - {info[1]}</a></td>')
+
+
+def status(value, row, labels):
+    if value:
+        return '<td><span class="status-ativa">Ativa</span></td>'
+    return '<td><span class="status-inativa">Inativa</span></td>'
+
+
+def yes_no(value, row, labels):
+    if value:
+        return '<td><span class="bool-sim">Sim</span></td>'
+    return '<td><span class="bool-nao">Não</span></td>'
+
+
+def phone(value, row, labels):
+    return f'<td>{text(format_phone(value))}</td>'
+
+
+def score(value, row, labels):
+    return f'<td>{text(value) if value else "s/Registro"}</td>'
+
+
+def blob(value, row, labels):
+    """Conteúdo do PDF: as listagens trazem apenas o tamanho (ver listing_projection)"""
+    if value is None:
+        return '<td class="blob-cell"><span class="no-blob">Sem arquivo</span></td>'
+    if isinstance(value, int):
+        indicator = f"BLOB ({value:,} bytes)"
+    elif isinstance(value, (bytes, memoryview)):
+        indicator = f"BLOB ({len(value):,} bytes)"
+    else:
+        indicator = "BLOB (dados binários)"
+    return (f'<td class="blob-cell"><div class="blob-info"><span class="blob-indicator">🗂️ {indicator}</span>'
+            f'<a href="{escape(url_for("download_pdf", cod_documento=row[0]))}" class="doc-btn" '
+            f'target="_blank" title="Visualizar PDF">📄 Visualizar PDF</a></div></td>')
+
+
+def file_size(value, row, labels):
+    return f'<td>{value / 1024:.2f} KB</td>' if value else '<td>N/A</td>'
+
+
+# Formatadores próprios de uma coluna de uma tabela
+COLUMN_RENDERERS = {
+    ("Partida", "placar"): score,
+    ("Documento", "arquivo_conteudo"): blob,
+    ("Documento", "arquivo_tamanho"): file_size,
+}
+
+
+def column_renderer(table, col, fk_fields):
+    if (table, col) in COLUMN_RENDERERS:
+        return COLUMN_RENDERERS[(table, col)]
+    if col in STATUS_COLUMNS:
+        return status
+    if col in PHONE_COLUMNS:
+        return phone
+    if col in YES_NO_COLUMNS.get(table, ()):
+        return yes_no
+    if col in fk_fields:
+        ref_table, pk_col, name_col = fk_fields[col]
+        if ref_table == "Documento":
+            return document_link
+        if name_col != pk_col:
+            return fk_name(ref_table)
+    return plain
+
+
+class RenderPlan:
+    """Cabeçalhos e formatadores das colunas de uma tabela, na ordem do banco."""
+
+    def __init__(self, table, columns, display_names, fk_fields):
+        labels = {**display_names, **HEADER_LABELS.get(table, {})}
+        self.table = table
+        self.columns = list(columns)
+        self.headers = [labels.get(col, col) for col in self.columns]
+        self.renderers = [column_renderer(table, col, fk_fields) for col in self.columns]
+
+    def render_rows(self, rows, labels):
+        """[(linha, HTML das células)] para o template; ``labels`` são os nomes das FKs"""
+        renderers = self.renderers
+        labels = {
+            ref_table: {key: tuple(text(label) for label in values) for key, values in names.items()}
+            for ref_table, names in labels.items()
+        }
+        return [
+            (row, Markup(''.join([render(value, row, labels) for render, value in zip(renderers, row)])))
+            for row in rows
+        ]
@@ -0,0 +1,180 @@
+"""Servidor de produção do GEDEU (gunicorn, vários processos).
+
+O processo master carrega o app uma única vez (preload) e cria os workers
+por fork: o código, os módulos, os templates já compilados e o catálogo
+do schema (catalog.py) ficam em memória compartilhada (copy-on-write)
+entre os workers. Cada worker abre o próprio pool de conexões na primeira
+requisição; o master fecha as suas antes de cada fork (database.close_pool,
+aiodb.close_pool).
+
+    pip install gunicorn
+    python serve.py                                  # 2 x núcleos + 1 workers, 4 threads cada
+    python serve.py --workers 8 --threads 8 --bind 0.0.0.0:8000 --pid gedeu.pid
+    python serve.py --asgi                           # workers uvicorn (asgi.py)
+
+Sinais para o master (PID em --pid):
+
+    HUP        recria os workers aos poucos, sem recusar requisições
+    USR2       inicia um novo master com o código atualizado; depois, QUIT no antigo
+    TTIN/TTOU  adiciona/remove um worker
+    TERM       encerra após concluir as requisições em andamento (--graceful-timeout)
+
+Com preload, o HUP não relê o código: após atualizar os arquivos use USR2.
+
+Com mais de um worker, o launcher informa SERVER_WORKERS ao app e liga o
+LOOKUP_CACHE_LISTEN (a menos que ele tenha sido desligado explicitamente):
+sem o LISTEN, a escrita atendida por um worker não invalidaria os caches em
+memória dos outros (ver cache.py e install_triggers.sql).
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+
+import psycopg2
+from gunicorn.app.base import BaseApplication
+
+import aiodb
+import cache
+import catalog
+import database
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def preload_templates(app):
+    """Compila os templates no master, antes do fork, para que os workers os compartilhem"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def preload_catalog(app):
+    """Lê o catálogo do schema no master; os workers o herdam sem consultar o banco"""
+    with app.app_context():
+        try:
+            catalog.get_catalog()
+        except psycopg2.Error as e:
+            app.logger.warning("Catálogo do schema não carregado no master: %s", e)
+
+
+def configure_app(app, workers, threads, asgi=False):
+    """Ajusta a configuração do app ao número de workers, antes do fork"""
+    app.config['SERVER_WORKERS'] = workers
+    if workers > 1 and app.config['LOOKUP_CACHE_LISTEN'] is None:
+        app.config['LOOKUP_CACHE_LISTEN'] = True
+    if workers > 1 and not app.config['LOOKUP_CACHE_LISTEN']:
+        app.logger.error("LOOKUP_CACHE_LISTEN desligado com %d workers: os caches em memória (consultas%s) "
+                         "ficam ignorados em todos eles; ligue o LISTEN (com install_triggers.sql)",
+                         workers, " e PAGE_CACHE 'memory'" if app.config['PAGE_CACHE'] == 'memory' else "")
+    elif app.config['LOOKUP_CACHE_LISTEN']:
+        check_notify_triggers(app)
+    if not asgi and threads > app.config['DB_POOL_MAXCONN']:
+        app.logger.warning("%d threads por worker e DB_POOL_MAXCONN = %d: threads vão esperar por conexões",
+                           threads, app.config['DB_POOL_MAXCONN'])
+
+
+def check_notify_triggers(app):
+    """Avisa no master se os triggers que alimentam o LISTEN não estão instalados"""
+    with app.app_context():
+        try:
+            cur = database.get_db().cursor()
+            cur.execute(cache.NOTIFY_TRIGGERS)
+            installed = cur.fetchone()[0]
+            cur.close()
+        except psycopg2.Error as e:
+            app.logger.warning("Triggers de install_triggers.sql não verificados: %s", e)
+            return
+    if not installed:
+        app.logger.error("LOOKUP_CACHE_LISTEN ligado, mas install_triggers.sql não foi executado: "
+                         "os caches em memória ficam ignorados até a instalação")
+
+
+def pre_fork(server, worker):
+    # Conexões abertas no master (ex.: durante o preload) não podem ir para os workers
+    database.close_pool()
+    aiodb.close_pool()
+
+
+def post_worker_init(worker):
+    # Inicia o LISTEN do worker já no boot: até ele estar ativo, os caches em
+    # memória ficam ignorados (ver cache.coherent)
+    from app import app
+    with app.app_context():
+        cache.get_cache()
+
+
+def when_ready(server):
+    # Objetos carregados no preload saem da coleta de lixo: o GC dos workers
+    # não os percorre e as páginas de memória continuam compartilhadas
+    gc.freeze()
+
+
+class GedeuServer(BaseApplication):
+    def __init__(self, options, asgi=False):
+        self.options = options
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        configure_app(app, self.options['workers'], self.options['threads'], self.asgi)
+        preload_templates(app)
+        preload_catalog(app)
+        if self.asgi:
+            from asgi import application
+            return application
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=os.environ.get('GEDEU_BIND', '0.0.0.0:8000'),
+                        help="endereço:porta (padrão: $GEDEU_BIND ou 0.0.0.0:8000)")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('GEDEU_WORKERS', 0)) or default_workers(),
+                        help="processos (padrão: $GEDEU_WORKERS ou 2 x núcleos + 1)")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('GEDEU_THREADS', 4)),
+                        help="threads por processo (padrão: $GEDEU_THREADS ou 4)")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="segundos sem resposta até o worker ser reiniciado")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="segundos para concluir as requisições ao reiniciar/encerrar")
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help="reinicia o worker após N requisições (0 desativa)")
+    parser.add_argument('--pid', help="arquivo com o PID do master")
+    parser.add_argument('--asgi', action='store_true', help="workers uvicorn servindo asgi.py")
+    return parser.parse_args(argv)
+
+
+def server_options(args):
+    """Configuração do gunicorn a partir dos argumentos da linha de comando"""
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'uvicorn.workers.UvicornWorker' if args.asgi else 'gthread',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'pidfile': args.pid,
+        'accesslog': '-',
+        'pre_fork': pre_fork,
+        'post_worker_init': post_worker_init,
+        'when_ready': when_ready,
+    }
+
+
+def main():
+    args = parse_args()
+    GedeuServer(server_options(args), asgi=args.asgi).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""Armazenamento dos PDFs de documentos fora do banco de dados.
+
+Os arquivos são endereçados pelo SHA-256 do conteúdo: uploads idênticos
+viram um único arquivo em disco. As referências de cada arquivo ficam na
+tabela Arquivo, mantida por trigger sobre Documento (ver GEDEU.sql).
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import current_app
+
+import database
+
+CHUNK_SIZE = 256 * 1024
+PDF_MAGIC = b'%PDF-'
+
+
+class InvalidUpload(ValueError):
+    """O arquivo enviado não é um PDF."""
+
+
+class DocumentStorage:
+    """Interface dos backends de armazenamento de documentos."""
+
+    def save(self, chunks):
+        """Grava o conteúdo (iterável de bytes) e retorna (hash, tamanho)."""
+        raise NotImplementedError
+
+    def path(self, file_hash):
+        """Caminho local do arquivo, para envio com send_file."""
+        raise NotImplementedError
+
+    def exists(self, file_hash):
+        raise NotImplementedError
+
+    def delete(self, file_hash):
+        raise NotImplementedError
+
+    def list_hashes(self):
+        """Hashes de todos os arquivos armazenados, com a data de modificação."""
+        raise NotImplementedError
+
+
+class LocalDocumentStorage(DocumentStorage):
+    """Arquivos em disco, em ``<raiz>/<2 primeiros dígitos do hash>/<hash>``."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+
+    def path(self, file_hash):
+        return os.path.join(self.root, file_hash[:2], file_hash)
+
+    def exists(self, file_hash):
+        return os.path.exists(self.path(file_hash))
+
+    def save(self, chunks):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            file_hash = digest.hexdigest()
+            final_path = self.path(file_hash)
+            if os.path.exists(final_path):
+                # Conteúdo já armazenado: só renova a data para a coleta de lixo
+                os.utime(final_path)
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return file_hash, size
+
+    def delete(self, file_hash):
+        try:
+            os.remove(self.path(file_hash))
+        except FileNotFoundError:
+            pass
+
+    def list_hashes(self):
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if prefix == 'tmp' or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                yield name, os.path.getmtime(os.path.join(directory, name))
+
+
+# Backends disponíveis para app.config['DOCUMENT_STORAGE'];
+# 'database' mantém o conteúdo em Documento.arquivo_conteudo (BYTEA)
+STORAGE_BACKENDS = {
+    'local': LocalDocumentStorage,
+}
+
+_storages = {}
+
+
+def get_storage():
+    """Backend configurado, ou None quando os PDFs ficam no próprio banco."""
+    backend = current_app.config.get('DOCUMENT_STORAGE', 'local')
+    if backend == 'database':
+        return None
+    root = current_app.config.get('DOCUMENT_STORAGE_ROOT') or os.path.join(
+        current_app.config['UPLOAD_FOLDER'], 'documentos'
+    )
+    key = (backend, root)
+    if key not in _storages:
+        _storages[key] = STORAGE_BACKENDS[backend](root)
+    return _storages[key]
+
+
+def iter_pdf_upload(stream, chunk_size=CHUNK_SIZE):
+    """Lê um upload em partes, validando o cabeçalho %PDF- antes de repassá-lo.
+
+    Nunca guarda mais que um bloco em memória; levanta InvalidUpload se o
+    conteúdo não começar com o cabeçalho de PDF.
+    """
+    header = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if len(header) < len(PDF_MAGIC):
+            header += chunk[:len(PDF_MAGIC) - len(header)]
+            if not PDF_MAGIC.startswith(header):
+                raise InvalidUpload("O arquivo enviado não é um PDF")
+        yield chunk
+    if header != PDF_MAGIC:
+        raise InvalidUpload("O arquivo enviado não é um PDF")
+
+
+BLOB_CHUNK = database.prepared(
+    'documento_blob_chunk',
+    "SELECT substring(arquivo_conteudo FROM %s FOR %s) FROM Documento WHERE cod_documento = %s"
+)
+
+
+def iter_blob_chunks(cur, cod_documento, start, stop, chunk_size=CHUNK_SIZE):
+    """Lê Documento.arquivo_conteudo[start:stop] em fatias com substring()."""
+    offset = start
+    while offset < stop:
+        length = min(chunk_size, stop - offset)
+        database.execute(cur, BLOB_CHUNK, (offset + 1, length, cod_documento))
+        chunk = cur.fetchone()
+        if not chunk or not chunk[0]:
+            break
+        yield bytes(chunk[0])
+        offset += length
+
+
+def migrate_blobs(conn, storage, batch_size=50, log=print):
+    """Move os BLOBs de Documento para o armazenamento, um lote por transação.
+
+    Cada documento é copiado em fatias para o disco, e então a linha passa a
+    guardar apenas hash e tamanho (arquivo_conteudo = NULL). Pode ser
+    interrompido e executado de novo: só processa o que ainda está no banco.
+    """
+    total = 0
+    while True:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT cod_documento, octet_length(arquivo_conteudo)
+               FROM Documento
+               WHERE arquivo_conteudo IS NOT NULL
+               ORDER BY cod_documento
+               LIMIT %s
+               FOR UPDATE SKIP LOCKED""",
+            (batch_size,)
+        )
+        batch = cur.fetchall()
+        if not batch:
+            cur.close()
+            conn.commit()
+            break
+        for cod_documento, size in batch:
+            file_hash, stored = storage.save(iter_blob_chunks(cur, cod_documento, 0, size))
+            cur.execute(
+                """UPDATE Documento
+                   SET arquivo_hash = %s, arquivo_tamanho = %s, arquivo_conteudo = NULL
+                   WHERE cod_documento = %s""",
+                (file_hash, stored, cod_documento)
+            )
+        conn.commit()
+        cur.close()
+        total += len(batch)
+        log(f"{total} documentos movidos para o disco")
+    return total
+
+
+def collect_garbage(conn, storage, grace_seconds=3600, log=print):
+    """Remove arquivos sem referências (ou de uploads abortados).
+
+    Só apaga arquivos sem uso há mais de ``grace_seconds``: um upload
+    deduplicado renova a data do arquivo antes de criar a referência.
+    """
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Arquivo WHERE referencias <= 0")
+    cur.execute("SELECT arquivo_hash FROM Arquivo")
+    referenced = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    limit = time.time() - grace_seconds
+    removed = 0
+    for file_hash, mtime in list(storage.list_hashes()):
+        if file_hash not in referenced and mtime < limit:
+            storage.delete(file_hash)
+            removed += 1
+    log(f"{removed} arquivos sem referência removidos")
+    return removed
@@ -0,0 +1,47 @@
+"""Configuração dos testes (a partir de "GEDEU 1.0/": python -m pytest tests).
+
+Os testes que precisam do banco usam a configuração do app (GEDEU_DB_*) e
+são pulados se ele não estiver acessível.
+"""
+import os
+import sys
+
+import psycopg2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import DB_CONFIG  # noqa: E402
+
+
+@pytest.fixture
+def gedeu_app():
+    """O app com a configuração dos caches restaurada ao final do teste"""
+    from app import app
+    saved = dict(app.config)
+    state = app.extensions['lookup_cache']
+    saved_state = dict(state)
+    state['pid'] = None
+    yield app
+    app.config.update(saved)
+    state.update(saved_state)
+
+
+@pytest.fixture
+def connect():
+    """Abre conexões com o banco do app, fechadas ao final do teste"""
+    conns = []
+
+    def factory():
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"banco indisponível: {e}")
+        conns.append(conn)
+        return conn
+
+    yield factory
+    for conn in conns:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,90 @@
+"""Caches com mais de um processo: LISTEN por padrão e caches em memória ignorados sem ele."""
+import cache
+from cache import MISSING, DiskCache, listen_enabled
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, query):
+        self.executed.append(query)
+
+    def fetchall(self):
+        return [(1, 'Alpha')]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+
+def test_listen_enabled_by_default_with_several_workers():
+    assert not listen_enabled({'LOOKUP_CACHE_LISTEN': None, 'SERVER_WORKERS': 1})
+    assert listen_enabled({'LOOKUP_CACHE_LISTEN': None, 'SERVER_WORKERS': 4})
+    assert not listen_enabled({'LOOKUP_CACHE_LISTEN': False, 'SERVER_WORKERS': 4})
+    assert listen_enabled({'LOOKUP_CACHE_LISTEN': True, 'SERVER_WORKERS': 1})
+
+
+def test_memory_caches_ignored_without_listen(gedeu_app, monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(cache, 'get_db', lambda: conn)
+    gedeu_app.config.update(SERVER_WORKERS=4, LOOKUP_CACHE_LISTEN=False, PAGE_CACHE='memory')
+    with gedeu_app.test_request_context('/'):
+        assert not cache.coherent()
+        assert cache.get_page_cache() is None
+        cache.lookup('Equipe', ['cod_equipe', 'nome_equipe'], order_by='nome_equipe')
+        cache.lookup('Equipe', ['cod_equipe', 'nome_equipe'], order_by='nome_equipe')
+    assert len(conn.executed) == 2
+
+
+def test_memory_caches_used_with_single_worker(gedeu_app, monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(cache, 'get_db', lambda: conn)
+    gedeu_app.config.update(SERVER_WORKERS=1, LOOKUP_CACHE_LISTEN=None, PAGE_CACHE='memory')
+    with gedeu_app.test_request_context('/'):
+        cache.get_cache().clear()
+        assert cache.coherent()
+        assert cache.get_page_cache() is not None
+        cache.lookup('Equipe', ['cod_equipe', 'nome_equipe'], order_by='nome_equipe')
+        cache.lookup('Equipe', ['cod_equipe', 'nome_equipe'], order_by='nome_equipe')
+    assert len(conn.executed) == 1
+
+
+def test_disk_cache_generation_shared_between_processes(tmp_path):
+    # Duas instâncias no mesmo diretório fazem o papel de dois workers
+    worker_a, worker_b = DiskCache(str(tmp_path)), DiskCache(str(tmp_path))
+    key = ('equipe', '/Equipe', ())
+    generation = worker_a.generation('equipe')
+    worker_a.store(key, b'pagina', generation)
+    assert worker_b.lookup(key) == b'pagina'
+
+    # A invalida enquanto B carrega: a página de B já nasce velha
+    generation = worker_b.generation('equipe')
+    worker_a.invalidate('equipe')
+    worker_b.store(key, b'pagina velha', generation)
+    assert worker_a.lookup(key) is MISSING
+    assert worker_b.lookup(key) is MISSING
+
+
+def test_cached_row_discarded_by_table_notify(gedeu_app):
+    gedeu_app.config.update(SERVER_WORKERS=1, LOOKUP_CACHE_LISTEN=None)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return ('contrato.pdf', 'hash-%d' % len(loads), 100, True)
+
+    with gedeu_app.test_request_context('/'):
+        assert cache.cached_row('Documento', 7, load)[1] == 'hash-1'
+        assert cache.cached_row('Documento', 7, load)[1] == 'hash-1'
+        # Payload do NOTIFY: nome da tabela em minúsculas
+        cache.invalidate('documento')
+        assert cache.cached_row('Documento', 7, load)[1] == 'hash-2'
+        assert cache.cached_row('Documento', 8, lambda: None) is None
@@ -0,0 +1,61 @@
+"""Escritas concorrentes não esperam pelos contadores de versão (install_procedures.sql).
+
+Duas transações abertas alteram presenças e atletas diferentes, como duas
+chamadas salvas ao mesmo tempo. Os triggers de Versao_Tabela, de
+Estatistica_Atleta e do ranking materializado não podem fazer a segunda
+esperar pelo COMMIT da primeira.
+"""
+import psycopg2
+import pytest
+
+LOCK_TIMEOUT = '2s'
+
+
+def two_presences(cur):
+    """Duas presenças em treinamento de atletas diferentes"""
+    cur.execute("""
+        SELECT DISTINCT ON (id_atleta) cod_treinamento, id_atleta
+        FROM Presenca_Treinamento ORDER BY id_atleta, cod_treinamento LIMIT 2
+    """)
+    rows = cur.fetchall()
+    if len(rows) < 2:
+        pytest.skip("o banco precisa de presenças em treinamento de dois atletas")
+    return rows
+
+
+def table_version(cur, table):
+    cur.execute("SELECT COALESCE(SUM(versao), 0) FROM Versao_Tabela WHERE nome_tabela = %s", (table,))
+    return cur.fetchone()[0]
+
+
+def save_attendance(cur, cod_treinamento, id_atleta):
+    cur.execute("UPDATE Presenca_Treinamento SET presenca = NOT presenca "
+                "WHERE cod_treinamento = %s AND id_atleta = %s", (cod_treinamento, id_atleta))
+    cur.execute("UPDATE Atleta SET nome_atleta = nome_atleta WHERE id_atleta = %s", (id_atleta,))
+
+
+def test_concurrent_writers_do_not_block(connect):
+    first, second = connect(), connect()
+    presences = two_presences(first.cursor())
+    first.rollback()
+
+    save_attendance(first.cursor(), *presences[0])   # transação aberta, sem COMMIT
+    cur = second.cursor()
+    cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+    try:
+        save_attendance(cur, *presences[1])
+    except psycopg2.errors.LockNotAvailable:
+        pytest.fail(f"a segunda escrita esperou mais de {LOCK_TIMEOUT} pela primeira")
+
+    # Cada transação vê o próprio incremento
+    assert table_version(cur, 'atleta') == table_version(connect().cursor(), 'atleta') + 1
+
+
+def test_statement_without_rows_keeps_version(connect):
+    cur = connect().cursor()
+    before = table_version(cur, 'atleta')
+    cur.execute("UPDATE Atleta SET nome_atleta = nome_atleta WHERE id_atleta < 0")
+    cur.execute("DELETE FROM Atleta WHERE id_atleta < 0")
+    assert table_version(cur, 'atleta') == before
+    cur.execute("UPDATE Atleta SET nome_atleta = nome_atleta WHERE id_atleta = (SELECT min(id_atleta) FROM Atleta)")
+    assert table_version(cur, 'atleta') == before + 1
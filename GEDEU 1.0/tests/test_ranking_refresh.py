@@ -0,0 +1,59 @@
+"""Atualização do ranking em segundo plano: uma por processo, sem esgotar o pool."""
+import threading
+from datetime import timedelta
+
+import app as gedeu
+from database import PoolTimeout
+
+STALE = timedelta(hours=1)
+
+
+class FakePool:
+    def __init__(self, error=None):
+        self.error = error
+        self.taken = 0
+        self.returned = 0
+
+    def getconn(self):
+        if self.error:
+            raise self.error
+        self.taken += 1
+        return object()
+
+    def putconn(self, conn):
+        self.returned += 1
+
+
+def test_one_background_refresh_per_process(monkeypatch):
+    pool = FakePool()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_refresh(conn, matview):
+        calls.append(matview)
+        started.set()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(gedeu.database, 'get_pool', lambda: pool)
+    monkeypatch.setattr(gedeu, 'refresh_materialized_view', slow_refresh)
+    for _ in range(50):
+        gedeu.refresh_if_stale('ranking_atletas_materializada', True, STALE)
+    assert started.wait(5)
+    release.set()
+    for _ in range(100):
+        if not gedeu._refresh_running.locked():
+            break
+        threading.Event().wait(0.05)
+    assert calls == ['ranking_atletas_materializada']
+    assert pool.taken == pool.returned == 1
+    assert not gedeu._refresh_running.locked()
+
+
+def test_pool_timeout_is_logged_and_releases_the_lock(monkeypatch, caplog):
+    pool = FakePool(PoolTimeout("pool cheio"))
+    assert gedeu._refresh_running.acquire(blocking=False)
+    gedeu.refresh_in_background(pool, 'ranking_atletas_materializada')
+    assert not gedeu._refresh_running.locked()
+    assert pool.returned == 0
+    assert any("Falha ao atualizar" in r.getMessage() for r in caplog.records)
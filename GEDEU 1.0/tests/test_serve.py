@@ -0,0 +1,39 @@
+"""Configuração que o launcher (serve.py) passa ao gunicorn e ao app."""
+import logging
+
+import pytest
+
+pytest.importorskip('gunicorn')
+
+from serve import GedeuServer, parse_args, server_options  # noqa: E402
+
+
+def launch(gedeu_app, argv):
+    server = GedeuServer(server_options(parse_args(argv)))
+    assert server.load() is gedeu_app
+    return server
+
+
+def test_several_workers_turn_listen_on(gedeu_app):
+    gedeu_app.config['LOOKUP_CACHE_LISTEN'] = None
+    server = launch(gedeu_app, ['--workers', '3', '--threads', '2'])
+    assert server.cfg.workers == 3
+    assert server.cfg.preload_app
+    assert gedeu_app.config['SERVER_WORKERS'] == 3
+    assert gedeu_app.config['LOOKUP_CACHE_LISTEN'] is True
+
+
+def test_single_worker_keeps_listen_default(gedeu_app):
+    gedeu_app.config['LOOKUP_CACHE_LISTEN'] = None
+    launch(gedeu_app, ['--workers', '1'])
+    assert gedeu_app.config['SERVER_WORKERS'] == 1
+    assert gedeu_app.config['LOOKUP_CACHE_LISTEN'] is None
+
+
+def test_listen_disabled_with_memory_page_cache_is_logged(gedeu_app, caplog):
+    gedeu_app.config.update(LOOKUP_CACHE_LISTEN=False, PAGE_CACHE='memory')
+    with caplog.at_level(logging.ERROR, logger=gedeu_app.logger.name):
+        launch(gedeu_app, ['--workers', '2'])
+    assert gedeu_app.config['LOOKUP_CACHE_LISTEN'] is False
+    assert any("LOOKUP_CACHE_LISTEN desligado com 2 workers" in r.getMessage()
+               and "PAGE_CACHE 'memory'" in r.getMessage() for r in caplog.records)